@@ -11,8 +11,11 @@ from pathlib import Path
 # 添加src目录到Python路径
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'src'))
 
-def batch_process_douyin_videos():
-    """批量处理抖音视频的示例"""
+def batch_process_douyin_videos(share_file=None):
+    """
+    批量处理抖音视频的示例
+    :param share_file: 粘贴的聊天记录/分享口令文本文件（'-' 表示标准输入），不指定时使用下面的示例链接
+    """
     print("=" * 60)
     print("批量处理抖音视频示例")
     print("=" * 60)
@@ -45,6 +48,9 @@ def batch_process_douyin_videos():
         "https://www.tiktok.com/@username/video/1234567890123456789",
         # 添加更多示例链接...
     ]
+    if share_file:
+        from src.douyin_handler import extract_douyin_share_urls
+        douyin_urls = extract_douyin_share_urls(share_file)
     
     print(f"\n准备处理 {len(douyin_urls)} 个视频链接...")
     
@@ -114,7 +120,8 @@ def setup_environment_variables():
     """)
 
 if __name__ == "__main__":
-    success = batch_process_douyin_videos()
+    # 用法: python batch_process_douyin.py [聊天记录.txt | -]
+    success = batch_process_douyin_videos(sys.argv[1] if len(sys.argv) > 1 else None)
     
     if not success:
         setup_environment_variables()
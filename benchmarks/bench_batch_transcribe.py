@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+bench_batch_transcribe.py
+短音频转录吞吐基准：逐个 transcribe_audio_segments vs transcribe_clips_batched（多窗口合并为一个编码器批次）。
+
+生成时长在 --min-seconds 与 --max-seconds 之间的合成短音频（模拟抖音/TikTok片段），
+比较每秒处理的片段数与实时率。需要安装 openai-whisper。
+
+用法:
+    python benchmarks/bench_batch_transcribe.py --clips 32 --model tiny --output benchmarks/results/batch.json
+    python benchmarks/bench_batch_transcribe.py --clips 32 --model tiny --batch-size 8,16,32
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+from pathlib import Path
+
+from common import measure_stage, write_synthetic_wav, save_json, compare_results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="短音频批量转录吞吐基准测试")
+    parser.add_argument("--clips", type=int, default=32, help="合成片段数量，默认32")
+    parser.add_argument("--min-seconds", type=int, default=15, help="片段最短时长，默认15秒")
+    parser.add_argument("--max-seconds", type=int, default=90, help="片段最长时长，默认90秒")
+    parser.add_argument("--model", default="tiny", help="whisper模型，默认tiny")
+    parser.add_argument("--language", default="en", help="固定语言，跳过语言检测，默认en")
+    parser.add_argument("--batch-size", default="16", help="批大小，逗号分隔可测试多个，默认16")
+    parser.add_argument("--skip-sequential", action="store_true", help="不运行逐个转录")
+    parser.add_argument("--output", help="结果JSON输出路径")
+    parser.add_argument("--compare", help="与之前的结果JSON比较")
+    parser.add_argument("--threshold", type=float, default=0.10, help="判定回归的相对阈值，默认0.10")
+    args = parser.parse_args()
+
+    output = Path(args.output).resolve() if args.output else None
+    compare = Path(args.compare).resolve() if args.compare else None
+    work_dir = Path(tempfile.mkdtemp(prefix="sum4u_batch_"))
+    os.chdir(work_dir)
+
+    from src.transcribe import transcribe_audio_segments, load_whisper_model
+    from src.batch_transcribe import transcribe_clips_batched
+
+    rng = random.Random(0)
+    lengths = [rng.randint(args.min_seconds, args.max_seconds) for _ in range(args.clips)]
+    clips = [write_synthetic_wav(str(work_dir / "clips" / f"clip_{i}.wav"), seconds, seed=i)
+             for i, seconds in enumerate(lengths)]
+    audio_seconds = sum(lengths)
+    print(f"生成 {args.clips} 个片段，共 {audio_seconds} 秒音频")
+
+    # 预先加载模型，避免把加载时间计入第一种方式
+    load_whisper_model(args.model)
+    results = {}
+
+    if not args.skip_sequential:
+        with measure_stage(results, "sequential", audio_seconds=audio_seconds):
+            for path in clips:
+                transcribe_audio_segments(path, model=args.model, language=args.language)
+        results["sequential"]["clips_per_s"] = round(args.clips / results["sequential"]["wall_s"], 3)
+
+    for batch_size in (int(b) for b in args.batch_size.split(",")):
+        name = f"batched_{batch_size}"
+        with measure_stage(results, name, audio_seconds=audio_seconds):
+            outcome = transcribe_clips_batched(clips, model=args.model, language=args.language, batch_size=batch_size)
+        results[name]["clips_per_s"] = round(args.clips / results[name]["wall_s"], 3)
+        errors = [r["error"] for r in outcome if "error" in r]
+        if errors:
+            print(f"{name}: {len(errors)} 个片段失败: {errors[0]}")
+        if "sequential" in results:
+            results[name]["speedup"] = round(results["sequential"]["wall_s"] / results[name]["wall_s"], 2)
+
+    report = {
+        "meta": {"clips": args.clips, "audio_seconds": audio_seconds, "model": args.model},
+        "results": results,
+    }
+    if output:
+        save_json(report, str(output))
+        print(f"结果已保存到: {output}")
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+
+    if compare:
+        with open(compare, encoding="utf-8") as f:
+            return 1 if compare_results(json.load(f), report, args.threshold) else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
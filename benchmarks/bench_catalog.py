@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+bench_catalog.py
+结果目录查询基准：在 --rows 条记录（默认10万）上测量 /api/results 常用查询的延迟，
+并与旧实现（glob + 逐个stat）对比。
+
+用法:
+    python benchmarks/bench_catalog.py --rows 100000 --output benchmarks/results/catalog.json
+"""
+
+import argparse
+import glob
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from common import save_json, compare_results
+
+PLATFORMS = ("youtube", "bilibili", "douyin", "tiktok", "local")
+TEMPLATES = ("default课堂笔记", "youtube_英文笔记", "youtube_视频总结", "custom")
+
+
+def timed(func, repeat: int) -> float:
+    """多次执行取中位数（毫秒）"""
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    return round(samples[len(samples) // 2], 3)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="结果目录查询基准测试")
+    parser.add_argument("--rows", type=int, default=100000, help="记录数，默认100000")
+    parser.add_argument("--files", type=int, default=5000, help="旧实现对比用的真实文件数，默认5000（0表示跳过）")
+    parser.add_argument("--repeat", type=int, default=20, help="每个查询重复次数，默认20")
+    parser.add_argument("--output", help="结果JSON输出路径")
+    parser.add_argument("--compare", help="与之前的结果JSON比较")
+    parser.add_argument("--threshold", type=float, default=0.25, help="判定回归的相对阈值，默认0.25")
+    args = parser.parse_args()
+
+    output = Path(args.output).resolve() if args.output else None
+    compare = Path(args.compare).resolve() if args.compare else None
+    work_dir = Path(tempfile.mkdtemp(prefix="sum4u_catalog_"))
+    os.chdir(work_dir)
+
+    from src.results_catalog import ResultsCatalog
+
+    catalog = ResultsCatalog(db_path=work_dir / "catalog.db", summary_dir="summaries")
+    conn = catalog._connect()
+    rng = random.Random(0)
+    now = time.time()
+    rows = []
+    for i in range(args.rows):
+        platform = PLATFORMS[i % len(PLATFORMS)]
+        mtime = now - rng.random() * 365 * 86400
+        stamp = time.strftime("%Y%m%d_%H%M%S", time.localtime(mtime))
+        filename = f"{platform}_{i:010d}_{stamp}_总结.md"
+        rows.append((f"summaries/{filename}", filename, platform, f"{i:010d}", rng.choice(TEMPLATES),
+                     "small", None, rng.randint(1000, 50000), mtime, mtime))
+    start = time.perf_counter()
+    with conn:
+        conn.executemany("INSERT INTO results VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+    print(f"写入 {args.rows} 条记录: {time.perf_counter() - start:.2f} 秒")
+
+    month_ago = now - 30 * 86400
+    queries = {
+        "first_page": lambda: catalog.query(),
+        "deep_page": lambda: catalog.query(page=1000),
+        "platform": lambda: catalog.query(platform="bilibili"),
+        "template_last_month": lambda: catalog.query(template="custom", date_from=month_ago),
+        "sort_size_asc": lambda: catalog.query(sort="size", order="asc"),
+    }
+    results = {name: {"latency_ms": timed(func, args.repeat)} for name, func in queries.items()}
+
+    if args.files:
+        Path("legacy").mkdir()
+        for i in range(args.files):
+            Path("legacy", f"local_{i}_总结.md").write_text("x", encoding="utf-8")
+
+        def legacy():
+            return [(p, os.path.getmtime(p), os.path.getsize(p)) for p in glob.glob("legacy/*.md")]
+        results[f"legacy_glob_{args.files}_files"] = {"latency_ms": timed(legacy, max(3, args.repeat // 4))}
+
+    for name, value in results.items():
+        print(f"{name:<32} {value['latency_ms']:>10.3f} ms")
+
+    report = {"meta": {"rows": args.rows}, "results": results}
+    if output:
+        save_json(report, str(output))
+        print(f"结果已保存到: {output}")
+    if compare:
+        with open(compare, encoding="utf-8") as f:
+            return 1 if compare_results(json.load(f), report, args.threshold) else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+bench_cleanup.py
+转录后处理基准：在 --segments 个合成 Whisper 分段（默认2万，约6小时音频；含语气词、静音处的"谢谢观看"循环、
+段内重复短语与多余空白）上测量清理吞吐与估算节省的 token；
+安装了 requests 时再用本地LLM桩服务比较开启/关闭后处理时 summarize_text 的耗时、调用次数与输入token。
+
+用法:
+    python benchmarks/bench_cleanup.py --segments 20000 --llm-latency 0.2 --output benchmarks/results/cleanup.json
+"""
+
+import argparse
+import importlib.util
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from common import save_json, compare_results
+
+SENTENCES = ["我们今天来讲一下神经网络的基本结构", "这个问题其实大家在期末考试里经常会遇到", "首先看一下损失函数的定义",
+             "然后我们把梯度带进去", "所以这里的学习率不能设得太大", "the gradient flows back through every layer",
+             "接下来举一个具体的例子", "大家可以先自己想一想", "这就是反向传播的核心思想"]
+FILLERS = ["嗯，", "呃，", "啊，", "um, ", "uh "]
+
+
+def synthetic_segments(count: int, seed: int = 0):
+    """合成转录分段：约15%带语气词，约5%段内重复，每200段插入一次静音循环"""
+    rng = random.Random(seed)
+    segments = []
+    t = 0.0
+    while len(segments) < count:
+        if len(segments) % 200 == 199:
+            # 静音处的幻觉循环：同一句话连续出现若干段
+            for _ in range(rng.randint(3, 8)):
+                segments.append({"start": round(t, 2), "end": round(t + 2, 2), "text": "谢谢观看"})
+                t += 2
+            continue
+        text = rng.choice(SENTENCES)
+        if rng.random() < 0.15:
+            text = rng.choice(FILLERS) + text
+        if rng.random() < 0.05:
+            text = "  ".join([text] * rng.randint(3, 6))
+        duration = rng.uniform(2, 6)
+        segments.append({"start": round(t, 2), "end": round(t + duration, 2), "text": text})
+        t += duration
+    return segments[:count]
+
+
+def bench_summarize(segments, enabled: bool, latency: float):
+    """用桩服务跑一次 summarize_text，返回耗时、调用次数与输入token"""
+    from src.config import config_manager
+    from src.instrumentation import JobTrace
+    from src.summarize import summarize_text
+
+    config_manager.update_section("transcript_cleanup", {"enabled": enabled})
+    text = " ".join(seg["text"] for seg in segments)
+    start = time.perf_counter()
+    with JobTrace() as trace:
+        summarize_text(text, model="local-model", provider="local", segments=segments, language="zh")
+    wall_s = time.perf_counter() - start
+    llm = trace.summary()["stages"].get("llm_call", {})
+    return {"wall_s": round(wall_s, 3), "llm_calls": llm.get("count", 0), "tokens_in": llm.get("tokens_in", 0),
+            "tokens_cached": llm.get("tokens_cached", 0)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="转录后处理基准测试")
+    parser.add_argument("--segments", type=int, default=20000, help="合成分段数量，默认20000")
+    parser.add_argument("--repeat", type=int, default=3, help="清理重复次数，取中位数，默认3")
+    parser.add_argument("--llm-latency", type=float, default=0.2, help="桩服务每次请求模拟的耗时（秒），默认0.2")
+    parser.add_argument("--output", help="结果JSON输出路径")
+    parser.add_argument("--compare", help="与之前的结果JSON比较")
+    parser.add_argument("--threshold", type=float, default=0.25, help="判定回归的相对阈值，默认0.25")
+    args = parser.parse_args()
+
+    output = Path(args.output).resolve() if args.output else None
+    compare = Path(args.compare).resolve() if args.compare else None
+    os.chdir(tempfile.mkdtemp(prefix="sum4u_cleanup_"))
+
+    from src.transcript_cleanup import clean_segments, get_cleanup_settings, estimate_tokens
+
+    segments = synthetic_segments(args.segments)
+    raw_text = " ".join(seg["text"] for seg in segments)
+    settings = get_cleanup_settings()
+    settings["to_simplified"] = False  # 繁简转换的耗时取决于是否安装 opencc，不计入
+
+    samples = []
+    cleaned = segments
+    for _ in range(args.repeat):
+        start = time.perf_counter()
+        cleaned = clean_segments(segments, settings, "zh")
+        samples.append(time.perf_counter() - start)
+    samples.sort()
+    wall_s = samples[len(samples) // 2]
+    tokens_before = estimate_tokens(raw_text)
+    tokens_after = estimate_tokens(" ".join(seg["text"] for seg in cleaned))
+    results = {"cleanup": {
+        "wall_s": round(wall_s, 4),
+        "segments_per_s": round(len(segments) / wall_s),
+        "mb_per_s": round(len(raw_text.encode()) / wall_s / 1024 / 1024, 2),
+        "segments_out": len(cleaned),
+        "tokens_before": tokens_before,
+        "tokens_after": tokens_after,
+        "tokens_saved_pct": round((tokens_before - tokens_after) / tokens_before * 100, 1),
+    }}
+    c = results["cleanup"]
+    print(f"清理 {len(segments)} 段: {wall_s * 1000:.1f} ms，{c['segments_per_s']:,} 段/秒，{c['mb_per_s']} MB/s")
+    print(f"分段 {len(segments)} → {len(cleaned)}，估算 token {tokens_before} → {tokens_after}"
+          f"（节省 {c['tokens_saved_pct']}%）")
+
+    # summarize_text 依赖 requests
+    if importlib.util.find_spec("requests") is None:
+        print("未安装 requests，跳过摘要阶段对比")
+    else:
+        from src.llm_stub import start_stub_server_in_thread
+        server = start_stub_server_in_thread(port=0, latency=args.llm_latency)
+        os.environ["LOCAL_LLM_BASE_URL"] = f"http://127.0.0.1:{server.server_port}/v1"
+        for name, enabled in (("summarize_raw", False), ("summarize_cleaned", True)):
+            results[name] = bench_summarize(segments, enabled, args.llm_latency)
+            r = results[name]
+            print(f"{name:<18} {r['wall_s']:>7.2f} 秒  {r['llm_calls']} 次调用  输入 {r['tokens_in']} tokens"
+                  f"（缓存命中 {r['tokens_cached']}）")
+        server.shutdown()
+
+    report = {"meta": {"segments": args.segments, "llm_latency_s": args.llm_latency}, "results": results}
+    if output:
+        save_json(report, str(output))
+        print(f"结果已保存到: {output}")
+    if compare:
+        with open(compare, encoding="utf-8") as f:
+            return 1 if compare_results(json.load(f), report, args.threshold) else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
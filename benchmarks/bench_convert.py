@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+bench_convert.py
+音频转换引擎基准：旧的 moviepy 路径 vs ffmpeg 子进程引擎（单个/进程池）。
+
+用法:
+    python benchmarks/bench_convert.py --files 8 --seconds 120 --output benchmarks/results/convert.json
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+from common import measure_stage, write_synthetic_wav, save_json, compare_results
+
+
+def moviepy_convert(input_path: str, output_path: str):
+    """旧实现：AudioFileClip 读入numpy帧再交给ffmpeg写出"""
+    try:
+        from moviepy import AudioFileClip
+    except ImportError:
+        from moviepy.editor import AudioFileClip
+    clip = AudioFileClip(input_path)
+    clip.write_audiofile(output_path, logger=None)
+    clip.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="音频转换引擎基准测试")
+    parser.add_argument("--files", type=int, default=4, help="合成文件数量，默认4")
+    parser.add_argument("--seconds", type=int, default=120, help="每个文件时长（秒），默认120")
+    parser.add_argument("--workers", type=int, default=None, help="进程池并发数，默认取配置")
+    parser.add_argument("--skip-moviepy", action="store_true", help="不测试 moviepy 路径")
+    parser.add_argument("--output", help="结果JSON输出路径")
+    parser.add_argument("--compare", help="与之前的结果JSON比较")
+    parser.add_argument("--threshold", type=float, default=0.10, help="判定回归的相对阈值，默认0.10")
+    args = parser.parse_args()
+
+    output = Path(args.output).resolve() if args.output else None
+    compare = Path(args.compare).resolve() if args.compare else None
+    work_dir = Path(tempfile.mkdtemp(prefix="sum4u_convert_"))
+    os.chdir(work_dir)
+
+    from src import ffmpeg_engine
+
+    inputs = [write_synthetic_wav(str(work_dir / "in" / f"clip_{i}.wav"), args.seconds, seed=i)
+              for i in range(args.files)]
+    audio_seconds = args.seconds * args.files
+    results = {}
+
+    if not args.skip_moviepy:
+        with measure_stage(results, "moviepy_mp3", audio_seconds=audio_seconds):
+            for i, path in enumerate(inputs):
+                moviepy_convert(path, str(work_dir / "moviepy" / f"clip_{i}.mp3"))
+
+    with measure_stage(results, "ffmpeg_mp3", audio_seconds=audio_seconds):
+        for i, path in enumerate(inputs):
+            ffmpeg_engine.convert(path, str(work_dir / "ffmpeg" / f"clip_{i}.mp3"))
+
+    with measure_stage(results, "ffmpeg_16k_mono_wav", audio_seconds=audio_seconds):
+        for i, path in enumerate(inputs):
+            ffmpeg_engine.convert(path, str(work_dir / "ffmpeg16k" / f"clip_{i}.wav"), sample_rate=16000, channels=1)
+
+    with measure_stage(results, "ffmpeg_pool_mp3", audio_seconds=audio_seconds):
+        outcome = ffmpeg_engine.convert_many(
+            [{"input_path": p, "output_path": str(work_dir / "pool" / f"clip_{i}.mp3")} for i, p in enumerate(inputs)],
+            max_workers=args.workers
+        )
+    errors = [r["error"] for r in outcome if r["error"]]
+    if errors:
+        print(f"进程池转换失败: {errors[0]}")
+
+    with measure_stage(results, "ffmpeg_stream_copy", audio_seconds=audio_seconds):
+        for i in range(args.files):
+            src = str(work_dir / "ffmpeg" / f"clip_{i}.mp3")
+            ffmpeg_engine.convert(src, str(work_dir / "copy" / f"clip_{i}.mp3"), source_codec="mp3")
+
+    report = {"meta": {"files": args.files, "seconds": args.seconds}, "results": results}
+    if output:
+        save_json(report, str(output))
+        print(f"结果已保存到: {output}")
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+
+    if compare:
+        with open(compare, encoding="utf-8") as f:
+            previous = json.load(f)
+        return 1 if compare_results(previous, report, args.threshold) else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""
+bench_download.py
+CDN下载基准：本地HTTP服务模拟抖音CDN（支持Range，每个连接限速并带固定延迟），
+比较单连接与多连接分段下载的吞吐（MB/s），并验证连接中断后的续传。
+
+用法:
+    python benchmarks/bench_download.py --size-mb 64 --per-connection-mbps 8 --output benchmarks/results/download.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import re
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+from common import save_json, compare_results
+
+BLOCK = 64 * 1024
+
+
+class ThrottledRangeHandler(BaseHTTPRequestHandler):
+    """按Range返回内存中的样本数据；每个连接限速，可在第一次请求发送一定字节后断开连接"""
+    payload = b""
+    bytes_per_second = 0.0
+    latency = 0.0
+    reset_after = 0
+    reset_done = threading.Event()
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        time.sleep(self.latency)
+        total = len(self.payload)
+        start, end = 0, total - 1
+        match = re.match(r"bytes=(\d+)-(\d*)", self.headers.get("Range", ""))
+        if match:
+            start = int(match.group(1))
+            end = min(int(match.group(2)) if match.group(2) else total - 1, total - 1)
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {start}-{end}/{total}")
+        else:
+            self.send_response(200)
+        self.send_header("Content-Length", str(end - start + 1))
+        self.send_header("ETag", '"bench"')
+        self.send_header("Accept-Ranges", "bytes")
+        self.end_headers()
+
+        sent = 0
+        pos = start
+        while pos <= end:
+            block = self.payload[pos:min(pos + BLOCK, end + 1)]
+            if self.reset_after and sent >= self.reset_after and not self.reset_done.is_set():
+                self.reset_done.set()
+                self.close_connection = True
+                self.connection.shutdown(2)
+                return
+            try:
+                self.wfile.write(block)
+            except (BrokenPipeError, ConnectionResetError):
+                return
+            pos += len(block)
+            sent += len(block)
+            if self.bytes_per_second:
+                time.sleep(len(block) / self.bytes_per_second)
+
+
+def start_server(payload: bytes, mbps: float, latency: float, reset_after: int = 0) -> ThreadingHTTPServer:
+    handler = type("Handler", (ThrottledRangeHandler,), {
+        "payload": payload, "bytes_per_second": mbps * 1024 * 1024, "latency": latency,
+        "reset_after": reset_after, "reset_done": threading.Event(),
+    })
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="CDN分段下载基准测试")
+    parser.add_argument("--size-mb", type=int, default=64, help="样本文件大小（MB），默认64")
+    parser.add_argument("--per-connection-mbps", type=float, default=8.0, help="每个连接的限速（MB/s），默认8")
+    parser.add_argument("--latency", type=float, default=0.05, help="每个请求的首字节延迟（秒），默认0.05")
+    parser.add_argument("--connections", default="1,4,8", help="要比较的并发分段数，逗号分隔")
+    parser.add_argument("--output", help="结果JSON输出路径")
+    parser.add_argument("--compare", help="与之前的结果JSON比较")
+    parser.add_argument("--threshold", type=float, default=0.25, help="判定回归的相对阈值，默认0.25")
+    args = parser.parse_args()
+
+    output = Path(args.output).resolve() if args.output else None
+    compare = Path(args.compare).resolve() if args.compare else None
+    work_dir = Path(tempfile.mkdtemp(prefix="sum4u_download_"))
+    os.chdir(work_dir)
+
+    from src.async_io import download_file
+
+    payload = os.urandom(args.size_mb * 1024 * 1024)
+    results = {}
+    failures = []
+
+    server = start_server(payload, args.per_connection_mbps, args.latency)
+    url = f"http://127.0.0.1:{server.server_port}/video.mp4"
+    for connections in [int(c) for c in args.connections.split(",") if c.strip()]:
+        dest = str(work_dir / f"video_{connections}.mp4")
+        stats = asyncio.run(download_file(url, dest, connections=connections))
+        if Path(dest).read_bytes() != payload:
+            failures.append(f"{connections} 路下载的文件内容不一致")
+        results[f"connections_{connections}"] = {"throughput_mb_s": stats["mb_per_s"], "wall_s": stats["seconds"],
+                                                 "segments": stats["connections"]}
+        print(f"{connections} 路并发: {stats['mb_per_s']:>7.2f} MB/s  {stats['seconds']:.2f} 秒  "
+              f"{stats['connections']} 个分段")
+    server.shutdown()
+
+    # 连接在传输一半时被重置，分段应从断点续传
+    server = start_server(payload, 0, 0, reset_after=len(payload) // 8)
+    url = f"http://127.0.0.1:{server.server_port}/video.mp4"
+    dest = str(work_dir / "video_reset.mp4")
+    stats = asyncio.run(download_file(url, dest, connections=4))
+    intact = Path(dest).read_bytes() == payload
+    results["reset_resume"] = {"wall_s": stats["seconds"]}
+    print(f"连接重置后续传: {'成功' if intact else '文件不一致'}  {stats['seconds']:.2f} 秒")
+    if not intact:
+        failures.append("连接重置后续传的文件内容不一致")
+    server.shutdown()
+
+    report = {"meta": {"size_mb": args.size_mb, "per_connection_mbps": args.per_connection_mbps,
+                       "latency_s": args.latency}, "results": results}
+    if output:
+        save_json(report, str(output))
+        print(f"结果已保存到: {output}")
+    if compare:
+        with open(compare, encoding="utf-8") as f:
+            if compare_results(json.load(f), report, args.threshold):
+                failures.append("与基线相比存在下载吞吐回归")
+    for failure in failures:
+        print(f"❌ {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
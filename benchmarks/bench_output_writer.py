@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+bench_output_writer.py
+结果写入基准：对一个任务的典型输出（约 --hours 小时音频的转录文本、分段JSON与一份总结）重复写入 --jobs 次，
+比较直接 open 覆盖写、原子替换（不 fsync / fsync）以及分段JSON gzip 压缩的耗时与磁盘占用，
+用于判断 output_settings.fsync 与 compress_segments_min_mb 的取舍。
+
+用法:
+    python benchmarks/bench_output_writer.py --hours 3 --jobs 50 --output benchmarks/results/output_writer.json
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from common import save_json, compare_results
+
+SENTENCES = ["我们今天来讲一下神经网络的基本结构", "首先看一下损失函数的定义", "然后我们把梯度带进去",
+             "所以这里的学习率不能设得太大", "the gradient flows back through every layer", "这就是反向传播的核心思想"]
+
+
+def synthetic_outputs(hours: float, seed: int = 0):
+    """合成一个任务的输出：每段约4秒"""
+    rng = random.Random(seed)
+    segments = []
+    t = 0.0
+    while t < hours * 3600:
+        duration = rng.uniform(2, 6)
+        segments.append({"start": round(t, 2), "end": round(t + duration, 2), "text": rng.choice(SENTENCES),
+                         "avg_logprob": round(rng.uniform(-1, 0), 3)})
+        t += duration
+    text = " ".join(seg["text"] for seg in segments)
+    payload = json.dumps({"language": "zh", "duration": t, "segments": segments}, ensure_ascii=False,
+                         separators=(",", ":"))
+    summary = "\n".join(f"## 第{i}部分\n- " + rng.choice(SENTENCES) for i in range(200))
+    return text, payload, summary
+
+
+def plain_write(path: str, data: str):
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(data)
+
+
+def run(name: str, write_job, jobs: int, workdir: Path):
+    """写入 jobs 个任务的输出，返回耗时与每个任务的磁盘占用"""
+    job_dir = workdir / name
+    job_dir.mkdir()
+    start = time.perf_counter()
+    for i in range(jobs):
+        write_job(job_dir, i)
+    wall_s = time.perf_counter() - start
+    size = sum(f.stat().st_size for f in job_dir.iterdir())
+    return {"wall_s": round(wall_s, 4), "ms_per_job": round(wall_s / jobs * 1000, 2),
+            "kb_per_job": round(size / jobs / 1024, 1)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="结果写入基准测试")
+    parser.add_argument("--hours", type=float, default=3, help="每个任务的音频时长（小时），默认3")
+    parser.add_argument("--jobs", type=int, default=50, help="写入的任务数，默认50")
+    parser.add_argument("--output", help="结果JSON输出路径")
+    parser.add_argument("--compare", help="与之前的结果JSON比较")
+    parser.add_argument("--threshold", type=float, default=0.25, help="判定回归的相对阈值，默认0.25")
+    args = parser.parse_args()
+
+    output = Path(args.output).resolve() if args.output else None
+    compare = Path(args.compare).resolve() if args.compare else None
+    workdir = Path(tempfile.mkdtemp(prefix="sum4u_writer_"))
+    os.chdir(workdir)
+
+    from src.output_writer import atomic_write
+
+    text, payload, summary = synthetic_outputs(args.hours)
+    print(f"每个任务: 转录 {len(text.encode()) / 1024:.0f} KB，分段JSON {len(payload.encode()) / 1024:.0f} KB，"
+          f"总结 {len(summary.encode()) / 1024:.0f} KB")
+
+    def outputs(job_dir, i):
+        return [(job_dir / f"{i}_转录.txt", text), (job_dir / f"{i}_转录.segments.json", payload),
+                (job_dir / f"{i}_总结.md", summary)]
+
+    variants = {
+        "plain": lambda d, i: [plain_write(str(p), data) for p, data in outputs(d, i)],
+        "atomic": lambda d, i: [atomic_write(p, data, fsync=False) for p, data in outputs(d, i)],
+        "atomic_fsync": lambda d, i: [atomic_write(p, data, fsync=True) for p, data in outputs(d, i)],
+        "atomic_fsync_gzip": lambda d, i: [atomic_write(p, data, fsync=True, compress=str(p).endswith(".json"))
+                                           for p, data in outputs(d, i)],
+    }
+    results = {}
+    for name, write_job in variants.items():
+        results[name] = run(name, write_job, args.jobs, workdir)
+        r = results[name]
+        print(f"{name:<18} {r['wall_s']:>8.3f} 秒  {r['ms_per_job']:>8.2f} ms/任务  {r['kb_per_job']:>8.1f} KB/任务")
+
+    report = {"meta": {"hours": args.hours, "jobs": args.jobs}, "results": results}
+    if output:
+        save_json(report, str(output))
+        print(f"结果已保存到: {output}")
+    if compare:
+        with open(compare, encoding="utf-8") as f:
+            return 1 if compare_results(json.load(f), report, args.threshold) else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+"""
+bench_pipeline.py
+端到端流水线基准测试：download → handle_audio_upload → transcribe → summarize_text。
+
+- 合成音频 + benchmarks/fixtures/ 下的录音样本
+- 本地LLM桩服务（src/llm_stub.py）替代托管API
+- 伪造的 yt-dlp 可执行文件与 TikHub 响应，全程无需外网
+- 每个阶段记录墙钟时间、CPU时间（含子进程）、峰值RSS，转录阶段按模型记录实时率
+
+用法:
+    python benchmarks/bench_pipeline.py --models tiny,base --output benchmarks/results/run.json
+    python benchmarks/bench_pipeline.py --models tiny --compare benchmarks/results/run.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import stat
+import sys
+import tempfile
+import threading
+from datetime import datetime
+from functools import partial
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+from common import (REPO_ROOT, measure_stage, write_synthetic_wav, probe_duration,
+                    save_json, compare_results)
+
+AUDIO_SUFFIXES = {'.mp3', '.wav', '.m4a', '.mp4', '.aac', '.flac', '.wma', '.amr'}
+
+FAKE_YT_DLP = """#!{python}
+# 伪造的 yt-dlp：把 SUM4U_BENCH_FIXTURE 指向的样本复制到 -o 指定的位置
+import os, shutil, sys
+args = sys.argv[1:]
+output = args[args.index("-o") + 1]
+os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+shutil.copyfile(os.environ["SUM4U_BENCH_FIXTURE"], output)
+"""
+
+
+def install_fake_yt_dlp(bin_dir: Path):
+    """在临时目录写入伪造的 yt-dlp 并加入 PATH 最前面"""
+    bin_dir.mkdir(parents=True, exist_ok=True)
+    script = bin_dir / "yt-dlp"
+    script.write_text(FAKE_YT_DLP.format(python=sys.executable), encoding="utf-8")
+    script.chmod(script.stat().st_mode | stat.S_IXUSR | stat.S_IXGRP | stat.S_IXOTH)
+    os.environ["PATH"] = f"{bin_dir}{os.pathsep}{os.environ.get('PATH', '')}"
+
+
+class QuietFileHandler(SimpleHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+def start_fixture_cdn(fixture_dir: Path) -> ThreadingHTTPServer:
+    """用本地HTTP服务模拟抖音CDN，直接提供样本文件"""
+    handler = partial(QuietFileHandler, directory=str(fixture_dir))
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def install_fake_tikhub(cdn_port: int):
+    """替换 TikHub 元数据接口，返回指向本地CDN的播放地址"""
+    from src import douyin_handler
+
+    async def fake_video_data(video_url, api_key=None):
+        fixture_name = os.path.basename(os.environ["SUM4U_BENCH_FIXTURE"])
+        return {"code": 200, "data": {"aweme_detail": {"video": {"play_addr": {
+            "url_list": [f"http://127.0.0.1:{cdn_port}/{fixture_name}"]
+        }}}}}
+
+    douyin_handler.fetch_douyin_video_data = fake_video_data
+
+
+def collect_fixtures(fixtures_dir: Path, synthetic_seconds, work_dir: Path):
+    """返回 (名称, 路径) 列表：先合成音频，再加上录音样本"""
+    fixtures = []
+    for seconds in synthetic_seconds:
+        path = write_synthetic_wav(str(work_dir / "fixtures" / f"synthetic_{seconds}s.wav"), seconds)
+        fixtures.append((f"synthetic_{seconds}s", path))
+    if fixtures_dir.exists():
+        for path in sorted(fixtures_dir.iterdir()):
+            if path.suffix.lower() in AUDIO_SUFFIXES:
+                fixtures.append((path.stem, str(path)))
+    return fixtures
+
+
+def bench_fixture(name: str, fixture_path: str, models, work_dir: Path, skip_download: bool):
+    from src.audio import download_audio
+    from src.audio_handler import handle_audio_upload
+    from src.transcribe import transcribe_audio
+    from src.summarize import summarize_text
+
+    stages = {}
+    audio_seconds = probe_duration(fixture_path)
+    downloads = str(work_dir / "downloads")
+    os.environ["SUM4U_BENCH_FIXTURE"] = fixture_path
+    source_path = fixture_path
+
+    if not skip_download:
+        with measure_stage(stages, "download_youtube"):
+            source_path = download_audio("https://www.youtube.com/watch?v=benchmark01", downloads)
+        with measure_stage(stages, "download_douyin"):
+            download_audio("https://www.douyin.com/video/7000000000000000000", downloads)
+
+    with measure_stage(stages, "handle_audio_upload"):
+        prepared_path = handle_audio_upload(source_path, output_dir=downloads)
+
+    transcript = ""
+    for model in models:
+        with measure_stage(stages, f"transcribe.{model}", audio_seconds=audio_seconds):
+            transcript = transcribe_audio(prepared_path, model=model)
+
+    with measure_stage(stages, "summarize"):
+        summarize_text(transcript or "(空转录)", model="local-model", provider="local")
+
+    stages["audio_s"] = round(audio_seconds, 2)
+    print(f"  {name}: " + ", ".join(
+        f"{stage}={data['wall_s']:.2f}s" for stage, data in stages.items() if isinstance(data, dict)))
+    return stages
+
+
+def main():
+    parser = argparse.ArgumentParser(description="端到端流水线基准测试")
+    parser.add_argument("--models", default="tiny", help="逗号分隔的Whisper模型大小，默认tiny")
+    parser.add_argument("--synthetic-seconds", default="30,120", help="合成音频时长列表（秒），逗号分隔，留空则不生成")
+    parser.add_argument("--fixtures-dir", default=str(REPO_ROOT / "benchmarks" / "fixtures"), help="录音样本目录")
+    parser.add_argument("--llm-latency", type=float, default=0.0, help="桩服务每次请求模拟的耗时（秒）")
+    parser.add_argument("--skip-download", action="store_true", help="跳过下载阶段，直接从样本开始")
+    parser.add_argument("--output", help="结果JSON输出路径")
+    parser.add_argument("--compare", help="与之前的结果JSON比较")
+    parser.add_argument("--threshold", type=float, default=0.10, help="判定回归的相对阈值，默认0.10")
+    args = parser.parse_args()
+
+    models = [m.strip() for m in args.models.split(",") if m.strip()]
+    synthetic_seconds = [int(s) for s in args.synthetic_seconds.split(",") if s.strip()]
+
+    fixtures_dir = Path(args.fixtures_dir).resolve()
+    output = Path(args.output).resolve() if args.output else None
+    compare = Path(args.compare).resolve() if args.compare else None
+
+    work_dir = Path(tempfile.mkdtemp(prefix="sum4u_bench_"))
+    # 在临时目录中运行，避免 downloads/ config.json 等污染仓库
+    os.chdir(work_dir)
+    sys.path.insert(0, str(REPO_ROOT / "src"))
+
+    from src.llm_stub import start_stub_server_in_thread
+    llm_server = start_stub_server_in_thread(port=0, latency=args.llm_latency)
+    os.environ["LOCAL_LLM_BASE_URL"] = f"http://127.0.0.1:{llm_server.server_port}/v1"
+
+    fixtures = collect_fixtures(fixtures_dir, synthetic_seconds, work_dir)
+    if not fixtures:
+        print("没有可用的样本，请通过 --synthetic-seconds 生成或在 fixtures 目录放入音频")
+        return 1
+
+    install_fake_yt_dlp(work_dir / "bin")
+    cdn_servers = {}
+
+    results = {}
+    print(f"工作目录: {work_dir}")
+    for name, path in fixtures:
+        fixture_dir = Path(path).parent
+        if fixture_dir not in cdn_servers:
+            cdn_servers[fixture_dir] = start_fixture_cdn(fixture_dir)
+        install_fake_tikhub(cdn_servers[fixture_dir].server_port)
+        results[name] = bench_fixture(name, path, models, work_dir, args.skip_download)
+
+    report = {
+        "meta": {
+            "timestamp": datetime.now().isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "models": models,
+        },
+        "results": results,
+    }
+
+    llm_server.shutdown()
+    for server in cdn_servers.values():
+        server.shutdown()
+
+    if output:
+        save_json(report, str(output))
+        print(f"结果已保存到: {output}")
+    else:
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+
+    if compare:
+        with open(compare, encoding="utf-8") as f:
+            previous = json.load(f)
+        return 1 if compare_results(previous, report, args.threshold) else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
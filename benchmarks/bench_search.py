@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+bench_search.py
+全文检索基准：向索引写入 --segments 个合成转录分段（默认100万，中英混合），测量常见查询的延迟。
+
+用法:
+    python benchmarks/bench_search.py --segments 1000000 --output benchmarks/results/search.json
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from common import save_json, compare_results
+
+# 合成文本用的词表：常见词命中大量分段，罕见词只出现在少数分段
+COMMON_WORDS = ["我们", "今天", "这个", "问题", "大家", "然后", "就是", "一个", "所以", "可以", "the", "and", "model"]
+TOPIC_WORDS = ["语音识别", "机器学习", "神经网络", "数据结构", "操作系统", "量子力学", "宏观经济", "期末考试",
+               "transformer", "gradient", "database", "kernel"]
+RARE_WORDS = ["拉格朗日乘子", "傅里叶变换", "贝叶斯推断", "hyperparameter"]
+
+QUERIES = {
+    "rare_cjk": "拉格朗日乘子",
+    "topic_cjk": "语音识别",
+    "common_cjk": "我们",
+    "single_char": "量",
+    "two_terms": "神经网络 我们",
+    "english": "gradient",
+    "no_hit": "不存在的词组",
+}
+
+
+def synthetic_segment(rng: random.Random) -> str:
+    words = [rng.choice(COMMON_WORDS) for _ in range(rng.randint(4, 10))]
+    words.insert(rng.randrange(len(words)), rng.choice(TOPIC_WORDS))
+    if rng.random() < 0.001:
+        words.insert(rng.randrange(len(words)), rng.choice(RARE_WORDS))
+    return "".join(w if not w.isascii() else f" {w} " for w in words).strip()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="全文检索延迟基准测试")
+    parser.add_argument("--segments", type=int, default=1000000, help="分段数量，默认1000000")
+    parser.add_argument("--segments-per-doc", type=int, default=500, help="每个文档的分段数，默认500")
+    parser.add_argument("--repeat", type=int, default=10, help="每个查询重复次数，取中位数，默认10")
+    parser.add_argument("--limit-ms", type=float, default=100, help="单次查询延迟上限（毫秒），默认100")
+    parser.add_argument("--output", help="结果JSON输出路径")
+    parser.add_argument("--compare", help="与之前的结果JSON比较")
+    parser.add_argument("--threshold", type=float, default=0.25, help="判定回归的相对阈值，默认0.25")
+    args = parser.parse_args()
+
+    output = Path(args.output).resolve() if args.output else None
+    compare = Path(args.compare).resolve() if args.compare else None
+    work_dir = Path(tempfile.mkdtemp(prefix="sum4u_search_"))
+    os.chdir(work_dir)
+
+    from src.search_index import SearchIndex, cjk_bigrams
+
+    index = SearchIndex(db_path=work_dir / "search.db")
+    conn = index._connect()
+    rng = random.Random(0)
+    start = time.perf_counter()
+    with conn:
+        for doc in range(0, args.segments, args.segments_per_doc):
+            doc_id = conn.execute("INSERT INTO documents (path, kind, size, mtime) VALUES (?, 'transcript', 0, 0)",
+                                  (f"transcriptions/doc_{doc}_转录.txt",)).lastrowid
+            texts = [synthetic_segment(rng) for _ in range(min(args.segments_per_doc, args.segments - doc))]
+            first = conn.execute("SELECT COALESCE(MAX(id), 0) FROM passages").fetchone()[0] + 1
+            conn.executemany("INSERT INTO passages (id, doc_id, start, end, text) VALUES (?, ?, ?, ?, ?)",
+                             [(first + i, doc_id, i * 5.0, i * 5.0 + 5, t) for i, t in enumerate(texts)])
+            conn.executemany("INSERT INTO passages_fts (rowid, body) VALUES (?, ?)",
+                             [(first + i, cjk_bigrams(t)) for i, t in enumerate(texts)])
+    build_s = time.perf_counter() - start
+    conn.execute("INSERT INTO passages_fts (passages_fts) VALUES ('optimize')")
+    conn.commit()
+    print(f"写入 {args.segments} 个分段: {build_s:.1f} 秒，索引大小 {os.path.getsize(work_dir / 'search.db') / 1024 / 1024:.0f} MB")
+
+    results = {"build": {"wall_s": round(build_s, 2)}}
+    failures = []
+    for name, query in QUERIES.items():
+        samples, hits = [], []
+        for _ in range(args.repeat):
+            t0 = time.perf_counter()
+            hits = index.search(query, limit=20)
+            samples.append((time.perf_counter() - t0) * 1000)
+        samples.sort()
+        latency = round(samples[len(samples) // 2], 3)
+        results[name] = {"latency_ms": latency, "hits": len(hits)}
+        print(f"{name:<12} {query:<16} {latency:>9.2f} ms  {len(hits)} 条")
+        if latency > args.limit_ms:
+            failures.append(f"{name} 查询 {latency:.1f} ms 超出上限 {args.limit_ms:.0f} ms")
+
+    report = {"meta": {"segments": args.segments}, "results": results}
+    if output:
+        save_json(report, str(output))
+        print(f"结果已保存到: {output}")
+    if compare:
+        with open(compare, encoding="utf-8") as f:
+            if compare_results(json.load(f), report, args.threshold):
+                failures.append("与基线相比存在检索延迟回归")
+    for failure in failures:
+        print(f"❌ {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+bench_startup.py
+启动耗时基准：用 `python -X importtime` 测量 CLI 与 Web UI 的导入耗时，并检查重依赖是否被提前导入。
+
+超出预算或导入了被禁止的模块时以非0状态退出，可直接用于CI。
+
+用法:
+    python benchmarks/bench_startup.py
+    python benchmarks/bench_startup.py --budget src.main=300 --output benchmarks/results/startup.json
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from common import REPO_ROOT, save_json, compare_results
+
+# 默认导入预算（毫秒，累计耗时）
+DEFAULT_BUDGETS = {
+    "src.main": 300,
+    "src.webui": 2000,
+}
+
+# 这些依赖只允许在首次使用时导入
+HEAVY_MODULES = ("whisper", "torch", "numpy", "moviepy", "yt_dlp", "requests")
+
+
+def run_importtime(module: str, cwd: str):
+    """在子进程中导入模块，返回 (累计耗时ms, {模块: 累计耗时ms})"""
+    env = dict(os.environ, PYTHONPATH=str(REPO_ROOT))
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True, text=True, cwd=cwd, env=env
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"导入 {module} 失败:\n{result.stderr[-2000:]}")
+
+    modules = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        parts = line[len("import time:"):].split("|")
+        try:
+            cumulative_us = int(parts[1].strip())
+        except ValueError:
+            continue  # 表头
+        modules[parts[2].strip()] = cumulative_us / 1000
+    return modules.get(module, 0.0), modules
+
+
+def run_cli_help(cwd: str) -> float:
+    """测量 `main.py --help` 的墙钟耗时（毫秒）"""
+    start = time.perf_counter()
+    subprocess.run([sys.executable, str(REPO_ROOT / "src" / "main.py"), "--help"],
+                   capture_output=True, cwd=cwd, check=True)
+    return (time.perf_counter() - start) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="启动导入耗时基准测试")
+    parser.add_argument("--budget", action="append", default=[],
+                        help="模块预算，格式 模块=毫秒，可多次指定；预算为0表示只测量不检查")
+    parser.add_argument("--repeat", type=int, default=3, help="重复次数，取最小值，默认3")
+    parser.add_argument("--skip-webui", action="store_true", help="不测量 src.webui（未安装fastapi时使用）")
+    parser.add_argument("--output", help="结果JSON输出路径")
+    parser.add_argument("--compare", help="与之前的结果JSON比较")
+    parser.add_argument("--threshold", type=float, default=0.25, help="判定回归的相对阈值，默认0.25")
+    args = parser.parse_args()
+
+    budgets = dict(DEFAULT_BUDGETS)
+    if args.skip_webui:
+        budgets.pop("src.webui")
+    for item in args.budget:
+        name, _, value = item.partition("=")
+        budgets[name] = float(value)
+
+    failures = []
+    results = {}
+    # 在临时目录运行，避免 config.json、downloads/ 等写入仓库
+    work_dir = tempfile.mkdtemp(prefix="sum4u_startup_")
+    for module, budget in budgets.items():
+        best_total, best_modules = None, {}
+        for _ in range(max(1, args.repeat)):
+            total, modules = run_importtime(module, work_dir)
+            if best_total is None or total < best_total:
+                best_total, best_modules = total, modules
+        heavy = sorted(m for m in best_modules if m.split(".")[0] in HEAVY_MODULES)
+        slowest = sorted(best_modules.items(), key=lambda kv: kv[1], reverse=True)[:10]
+        results[module] = {"import_ms": round(best_total, 1), "budget_ms": budget}
+
+        print(f"{module}: {best_total:.1f} ms（预算 {budget:.0f} ms）")
+        for name, ms in slowest:
+            print(f"    {ms:8.1f} ms  {name}")
+        if budget and best_total > budget:
+            failures.append(f"{module} 导入耗时 {best_total:.1f} ms 超出预算 {budget:.0f} ms")
+        if heavy:
+            failures.append(f"{module} 在导入时加载了重依赖: {', '.join(heavy[:5])}")
+
+    help_ms = min(run_cli_help(work_dir) for _ in range(max(1, args.repeat)))
+    results["cli_help"] = {"import_ms": round(help_ms, 1)}
+    print(f"main.py --help: {help_ms:.1f} ms")
+
+    report = {"meta": {"python": sys.version.split()[0]}, "results": results}
+    if args.output:
+        save_json(report, args.output)
+        print(f"结果已保存到: {args.output}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            if compare_results(json.load(f), report, args.threshold):
+                failures.append("与基线相比存在启动耗时回归")
+
+    for failure in failures:
+        print(f"❌ {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
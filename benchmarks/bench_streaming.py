@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+bench_streaming.py
+长音频转录内存基准：在合成的6小时音频上比较整段解码（whisper默认行为）与流式窗口转录的峰值RSS。
+
+每种模式在独立子进程中运行，峰值RSS取子进程的 ru_maxrss，互不影响。
+未指定 --whisper-model 时使用空模型（只分配与whisper相当的梅尔频谱缓冲），
+可在没有GPU/模型的机器上验证解码与窗口管理本身的内存上限。
+流式模式峰值超过 --limit-mb 时以非0状态退出。
+
+用法:
+    python benchmarks/bench_streaming.py --hours 6 --limit-mb 400
+    python benchmarks/bench_streaming.py --hours 6 --whisper-model tiny --limit-mb 1500 --skip-full
+"""
+
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from common import REPO_ROOT, write_synthetic_wav, save_json, compare_results
+
+# ru_maxrss 在 macOS 上单位为字节，Linux 上为KB
+_MAXRSS_DIVISOR = 1024 * 1024 if sys.platform == "darwin" else 1024
+
+
+class NullModel:
+    """模拟 whisper 模型的内存占用：为输入波形分配同样大小的80维梅尔频谱，不做识别"""
+
+    def transcribe(self, audio, **kwargs):
+        import numpy as np
+        if isinstance(audio, str):
+            audio = decode_full(audio)
+        mel = np.empty((80, len(audio) // 160 + 3000), dtype=np.float32)
+        mel.fill(0)
+        return {"text": "", "language": kwargs.get("language") or "zh", "segments": []}
+
+
+def decode_full(audio_path: str):
+    """与 whisper.load_audio 相同：ffmpeg 一次性解码整段音频为 float32"""
+    import numpy as np
+    cmd = ["ffmpeg", "-nostdin", "-threads", "0", "-i", audio_path,
+           "-f", "s16le", "-ac", "1", "-acodec", "pcm_s16le", "-ar", "16000", "-"]
+    out = subprocess.run(cmd, capture_output=True, check=True).stdout
+    return np.frombuffer(out, np.int16).flatten().astype(np.float32) / 32768.0
+
+
+def run_worker(mode: str, audio_path: str, whisper_model: str, window: float) -> int:
+    """子进程：执行一种模式并输出JSON结果"""
+    os.chdir(tempfile.mkdtemp(prefix="sum4u_stream_worker_"))
+    from src import transcribe
+
+    if whisper_model:
+        model = transcribe.load_whisper_model(whisper_model)
+    else:
+        model = NullModel()
+    baseline_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / _MAXRSS_DIVISOR
+
+    start = time.perf_counter()
+    if mode == "full":
+        result = model.transcribe(audio_path, verbose=False)
+    else:
+        result = transcribe.stream_transcription(model, audio_path, whisper_model or "null", window_seconds=window)
+    wall = time.perf_counter() - start
+
+    print(json.dumps({
+        "wall_s": round(wall, 2),
+        "baseline_rss_mb": round(baseline_mb, 1),
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / _MAXRSS_DIVISOR, 1),
+        "segments": len(result.get("segments") or []),
+        "chars": len(result.get("text", "")),
+    }))
+    return 0
+
+
+def run_mode(mode: str, audio_path: str, args):
+    cmd = [sys.executable, __file__, "--worker", mode, "--audio", audio_path, "--window", str(args.window)]
+    if args.whisper_model:
+        cmd += ["--whisper-model", args.whisper_model]
+    env = dict(os.environ, PYTHONPATH=str(REPO_ROOT))
+    result = subprocess.run(cmd, capture_output=True, text=True, env=env)
+    if result.returncode != 0:
+        raise RuntimeError(f"{mode} 模式运行失败:\n{result.stderr[-2000:]}")
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="长音频流式转录峰值内存基准")
+    parser.add_argument("--hours", type=float, default=6, help="合成音频时长（小时），默认6")
+    parser.add_argument("--audio", help="使用已有音频文件代替合成音频")
+    parser.add_argument("--window", type=float, default=600, help="流式窗口时长（秒），默认600")
+    parser.add_argument("--whisper-model", help="使用真实whisper模型（如 tiny），默认使用空模型")
+    parser.add_argument("--limit-mb", type=float, default=400, help="流式模式峰值RSS上限（MB），默认400（空模型）")
+    parser.add_argument("--skip-full", action="store_true", help="不运行整段解码模式（内存不足时使用）")
+    parser.add_argument("--output", help="结果JSON输出路径")
+    parser.add_argument("--compare", help="与之前的结果JSON比较")
+    parser.add_argument("--threshold", type=float, default=0.10, help="判定回归的相对阈值，默认0.10")
+    parser.add_argument("--worker", choices=("full", "stream"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        return run_worker(args.worker, args.audio, args.whisper_model, args.window)
+
+    audio_path = str(Path(args.audio).resolve()) if args.audio else None
+    if not audio_path:
+        audio_path = str(Path(tempfile.mkdtemp(prefix="sum4u_stream_")) / "synthetic.wav")
+        print(f"生成 {args.hours:g} 小时合成音频: {audio_path}")
+        write_synthetic_wav(audio_path, args.hours * 3600)
+
+    results = {}
+    modes = ("stream",) if args.skip_full else ("full", "stream")
+    for mode in modes:
+        print(f"运行 {mode} 模式...")
+        results[mode] = run_mode(mode, audio_path, args)
+        print(f"  峰值RSS {results[mode]['peak_rss_mb']:.1f} MB，耗时 {results[mode]['wall_s']:.1f} 秒")
+
+    report = {
+        "meta": {"hours": args.hours, "window_s": args.window, "whisper_model": args.whisper_model or "null",
+                 "limit_mb": args.limit_mb},
+        "results": results,
+    }
+    if args.output:
+        save_json(report, args.output)
+        print(f"结果已保存到: {args.output}")
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+
+    failed = False
+    if results["stream"]["peak_rss_mb"] > args.limit_mb:
+        print(f"❌ 流式模式峰值RSS {results['stream']['peak_rss_mb']:.1f} MB 超出上限 {args.limit_mb:.0f} MB")
+        failed = True
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            failed = compare_results(json.load(f), report, args.threshold) or failed
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
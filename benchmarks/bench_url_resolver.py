@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""
+bench_url_resolver.py
+链接解析基准：在 --texts 条合成分享文本（默认20万，混合抖音口令、B站/YouTube链接与普通文本）上，
+比较统一解析器与旧实现（get_platform 子串判断 + 五个正则逐个尝试的 clean_douyin_url + canonical_video_id）的耗时；
+并把语料拼成一整段聊天记录，比较流式批量提取抖音/TikTok链接（一次扫描 + 去重）与逐行调用旧 clean_douyin_url 的耗时。
+
+用法:
+    python benchmarks/bench_url_resolver.py --texts 200000 --output benchmarks/results/url_resolver.json
+"""
+
+import argparse
+import io
+import json
+import os
+import random
+import re
+import string
+import sys
+import tempfile
+import time
+from pathlib import Path
+from urllib.parse import urlparse
+
+from common import save_json, compare_results
+
+TEMPLATES = (
+    "{n} 复制打开抖音，看看【{name}的作品】{title} https://v.douyin.com/{short}/ {d}/{m} xFu:/ Q@k.Ok",
+    "https://www.douyin.com/video/{aweme}?previous_page=app_code_link",
+    "{title} https://www.tiktok.com/@{name}/video/{aweme}?is_from_webapp=1",
+    "【{title}-哔哩哔哩】 https://b23.tv/{short}",
+    "https://www.bilibili.com/video/BV{bv}/?spm_id_from=333.788&vd_source={short}",
+    "https://www.youtube.com/watch?v={yt}&list=PL{short}&index=3",
+    "看这个 https://youtu.be/{yt}?si={short}，讲得很好",
+    "{title} 没有链接的普通文本 {name}",
+)
+
+
+def legacy_get_platform(url: str) -> str:
+    url = url.lower()
+    for needle, platform in (("bilibili.com", "bilibili"), ("youtube.com", "youtube"), ("youtu.be", "youtube"),
+                             ("qq.com", "tencent"), ("iqiyi.com", "iqiyi"), ("youku.com", "youku"),
+                             ("douyin.com", "douyin"), ("tiktok.com", "tiktok")):
+        if needle in url:
+            return platform
+    return "other"
+
+
+_LEGACY_DOUYIN = [re.compile(p) for p in (
+    r'(https?://[^\s\'\"]*douyin\.com[^\s\'\"]*)', r'(https?://[^\s\'\"]*v\.douyin\.com[^\s\'\"]*)',
+    r'(https?://[^\s\'\"]*tiktok\.com[^\s\'\"]*)', r'(https?://[^\s\'\"]*vm\.tiktok\.com[^\s\'\"]*)',
+    r'(https?://[^\s\'\"]*vt\.tiktok\.com[^\s\'\"]*)')]
+_LEGACY_IDS = (
+    ("youtube", re.compile(r'(?:youtube\.com/(?:watch\?(?:.*&)?v=|shorts/|embed/|live/)|youtu\.be/)([\w-]{11})')),
+    ("bilibili", re.compile(r'bilibili\.com/video/(BV[0-9A-Za-z]{10}|av\d+)', re.IGNORECASE)),
+    ("douyin", re.compile(r'douyin\.com/(?:video|note)/(\d+)')),
+    ("tiktok", re.compile(r'tiktok\.com/(?:@[^/]+/)?video/(\d+)')),
+)
+
+
+def legacy_key(text: str) -> str:
+    """旧流程：clean_douyin_url 逐个尝试五个正则，再由 canonical_video_id 逐个尝试各平台正则"""
+    url = text
+    for pattern in _LEGACY_DOUYIN:
+        match = pattern.search(text)
+        if match:
+            url = match.group(1).split()[0].split('|')[0].strip()
+            break
+    url = url.strip()
+    for platform, pattern in _LEGACY_IDS:
+        match = pattern.search(url)
+        if match:
+            return f"{platform}:{match.group(1)}"
+    parsed = urlparse(url)
+    return f"{legacy_get_platform(url)}:{parsed.netloc.lower()}{parsed.path.rstrip('/')}"
+
+
+def legacy_bulk_douyin(blob: str):
+    """旧做法：逐行调用 clean_douyin_url（每行只取第一个链接），再按 canonical_video_id 去重"""
+    seen = {}
+    for line in blob.splitlines():
+        for pattern in _LEGACY_DOUYIN:
+            match = pattern.search(line)
+            if match:
+                url = match.group(1).split()[0].split('|')[0].strip()
+                seen.setdefault(legacy_key(url), url)
+                break
+    return list(seen.values())
+
+
+def make_corpus(count: int, seed: int = 0):
+    rng = random.Random(seed)
+    alnum = string.ascii_letters + string.digits
+
+    def token(n):
+        return "".join(rng.choice(alnum) for _ in range(n))
+
+    return [rng.choice(TEMPLATES).format(
+        n=f"{rng.randint(1, 9)}.{rng.randint(10, 99)}", name=f"用户{rng.randint(1, 99999)}",
+        title="".join(rng.choice("今天学习数学物理英语视频教程分享笔记") for _ in range(rng.randint(4, 20))),
+        short=token(8), d=rng.randint(1, 28), m=rng.randint(1, 12), aweme=str(rng.randint(7 * 10 ** 18, 8 * 10 ** 18)),
+        bv=token(10), yt=token(11),
+    ) for _ in range(count)]
+
+
+def timed(func, corpus, repeat: int) -> float:
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for text in corpus:
+            func(text)
+        samples.append(time.perf_counter() - start)
+    samples.sort()
+    return samples[len(samples) // 2]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="链接解析基准测试")
+    parser.add_argument("--texts", type=int, default=200000, help="合成分享文本数量，默认200000")
+    parser.add_argument("--repeat", type=int, default=3, help="重复次数，取中位数，默认3")
+    parser.add_argument("--output", help="结果JSON输出路径")
+    parser.add_argument("--compare", help="与之前的结果JSON比较")
+    parser.add_argument("--threshold", type=float, default=0.25, help="判定回归的相对阈值，默认0.25")
+    args = parser.parse_args()
+
+    output = Path(args.output).resolve() if args.output else None
+    compare = Path(args.compare).resolve() if args.compare else None
+    os.chdir(tempfile.mkdtemp(prefix="sum4u_urls_"))
+
+    from src.url_resolver import resolve_url, iter_share_urls, unique_share_urls
+
+    corpus = make_corpus(args.texts)
+    results = {}
+    for name, func in (("resolve_url", lambda text: resolve_url(text)["key"]), ("legacy", legacy_key)):
+        wall_s = timed(func, corpus, args.repeat)
+        results[name] = {"wall_s": round(wall_s, 4), "texts_per_s": round(len(corpus) / wall_s)}
+        print(f"{name:<12} {wall_s:>8.3f} 秒  {len(corpus) / wall_s:>12,.0f} 条/秒")
+
+    # 两种实现得到的规范键应一致（旧实现会把 b23.tv 等短链接的平台识别为 other）
+    differences = sum(1 for text in corpus if resolve_url(text)["key"] != legacy_key(text))
+    results["key_differences"] = differences
+    print(f"规范键不一致: {differences} / {len(corpus)}")
+
+    # 批量提取：整段聊天记录流式扫描一次
+    blob = "\n".join(corpus)
+    for name, func in (
+            ("bulk_extract", lambda _: unique_share_urls(iter_share_urls(io.StringIO(blob), ("douyin", "tiktok")))[0]),
+            ("bulk_legacy", legacy_bulk_douyin)):
+        wall_s = timed(lambda _: func(blob), [None], args.repeat)
+        found = len(func(blob))
+        results[name] = {"wall_s": round(wall_s, 4), "mb_per_s": round(len(blob.encode()) / wall_s / 1024 / 1024, 2),
+                         "urls": found}
+        print(f"{name:<12} {wall_s:>8.3f} 秒  {results[name]['mb_per_s']:>8.2f} MB/s  {found} 个链接")
+
+    report = {"meta": {"texts": args.texts}, "results": results}
+    if output:
+        save_json(report, str(output))
+        print(f"结果已保存到: {output}")
+    if compare:
+        with open(compare, encoding="utf-8") as f:
+            return 1 if compare_results(json.load(f), report, args.threshold) else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
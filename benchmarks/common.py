@@ -0,0 +1,174 @@
+"""
+common.py
+基准测试公共工具：阶段计时、峰值内存采样、合成音频生成、结果比较。
+"""
+
+import json
+import math
+import os
+import resource
+import struct
+import subprocess
+import sys
+import threading
+import time
+import wave
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Any, Optional
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+if str(REPO_ROOT) not in sys.path:
+    sys.path.insert(0, str(REPO_ROOT))
+
+
+def current_rss_mb() -> float:
+    """读取当前进程常驻内存（MB），非Linux平台退化为 ru_maxrss"""
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+class PeakRSSSampler:
+    """后台线程周期采样RSS，记录区间内的峰值"""
+
+    def __init__(self, interval: float = 0.05):
+        self.interval = interval
+        self.peak_mb = 0.0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def __enter__(self):
+        self.peak_mb = current_rss_mb()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.peak_mb = max(self.peak_mb, current_rss_mb())
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak_mb = max(self.peak_mb, current_rss_mb())
+        return False
+
+
+@contextmanager
+def measure_stage(results: Dict[str, Any], name: str, audio_seconds: Optional[float] = None):
+    """
+    测量一个阶段的墙钟时间、CPU时间（含子进程，如ffmpeg/yt-dlp）和峰值RSS
+    :param results: 结果字典，阶段数据写入 results[name]
+    :param audio_seconds: 音频时长，提供时计算实时率（real-time factor）
+    """
+    self_start = resource.getrusage(resource.RUSAGE_SELF)
+    child_start = resource.getrusage(resource.RUSAGE_CHILDREN)
+    wall_start = time.perf_counter()
+    with PeakRSSSampler() as sampler:
+        yield
+    wall = time.perf_counter() - wall_start
+    self_end = resource.getrusage(resource.RUSAGE_SELF)
+    child_end = resource.getrusage(resource.RUSAGE_CHILDREN)
+    cpu = ((self_end.ru_utime + self_end.ru_stime) - (self_start.ru_utime + self_start.ru_stime)
+           + (child_end.ru_utime + child_end.ru_stime) - (child_start.ru_utime + child_start.ru_stime))
+    stage = {
+        "wall_s": round(wall, 4),
+        "cpu_s": round(cpu, 4),
+        "peak_rss_mb": round(sampler.peak_mb, 1),
+    }
+    if audio_seconds:
+        stage["audio_s"] = round(audio_seconds, 2)
+        stage["rtf"] = round(wall / audio_seconds, 4)
+    results[name] = stage
+
+
+def write_synthetic_wav(path: str, seconds: float, sample_rate: int = 16000, seed: int = 0) -> str:
+    """
+    生成合成测试音频（16-bit单声道WAV）：逐秒变频正弦波并穿插静音，模拟语音的起伏与停顿。
+    按秒写入并缓存每种频率的波形块，生成数小时的音频也只占用常量内存。
+    :return: 文件路径
+    """
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    total = int(seconds * sample_rate)
+    silence = struct.pack(f"<{sample_rate}h", *([0] * sample_rate))
+    blocks = {}
+    with wave.open(path, "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(sample_rate)
+        written = 0
+        while written < total:
+            n = min(sample_rate, total - written)
+            second = written // sample_rate + seed
+            if second % 7 == 6:
+                block = silence
+            else:
+                # 整数频率在整秒边界相位连续，可直接复用缓存块
+                freq = 180 + (second * 37) % 220
+                if freq not in blocks:
+                    blocks[freq] = struct.pack(
+                        f"<{sample_rate}h",
+                        *(int(8000 * math.sin(2 * math.pi * freq * i / sample_rate)) for i in range(sample_rate))
+                    )
+                block = blocks[freq]
+            wav.writeframes(block[:n * 2])
+            written += n
+    return path
+
+
+def probe_duration(path: str) -> float:
+    """获取音频时长（秒），优先ffprobe，WAV可退化为标准库读取"""
+    try:
+        output = subprocess.run(
+            ["ffprobe", "-v", "error", "-show_entries", "format=duration", "-of", "csv=p=0", path],
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+        return float(output)
+    except (OSError, subprocess.CalledProcessError, ValueError):
+        with wave.open(path, "rb") as wav:
+            return wav.getnframes() / float(wav.getframerate())
+
+
+def save_json(data: Dict[str, Any], path: str):
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+
+
+def _flatten(data: Any, prefix: str = "") -> Dict[str, float]:
+    flat = {}
+    if isinstance(data, dict):
+        for key, value in data.items():
+            flat.update(_flatten(value, f"{prefix}.{key}" if prefix else str(key)))
+    elif isinstance(data, (int, float)) and not isinstance(data, bool):
+        flat[prefix] = float(data)
+    return flat
+
+
+# 越小越好的指标；其余数值仅展示变化
+LOWER_IS_BETTER = ("wall_s", "cpu_s", "peak_rss_mb", "rtf", "import_ms", "latency_ms")
+
+
+def compare_results(previous: Dict[str, Any], current: Dict[str, Any], threshold: float = 0.10) -> int:
+    """
+    对比两次基准结果，打印变化并返回回归项数量
+    :param threshold: 相对变化超过该比例且变差时判定为回归
+    """
+    prev_flat = _flatten(previous.get("results", previous))
+    cur_flat = _flatten(current.get("results", current))
+    regressions = 0
+    print(f"{'指标':<60} {'上次':>12} {'本次':>12} {'变化':>9}")
+    for key in sorted(set(prev_flat) & set(cur_flat)):
+        before, after = prev_flat[key], cur_flat[key]
+        change = (after - before) / before if before else 0.0
+        flag = ""
+        if key.rsplit(".", 1)[-1] in LOWER_IS_BETTER and change > threshold:
+            flag = "  <-- 回归"
+            regressions += 1
+        print(f"{key:<60} {before:>12.4f} {after:>12.4f} {change:>+8.1%}{flag}")
+    print(f"\n共 {regressions} 项回归（阈值 {threshold:.0%}）")
+    return regressions
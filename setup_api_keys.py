@@ -5,8 +5,12 @@ API密钥配置向导
 
 import json
 import os
+import sys
 from pathlib import Path
 
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from src.output_writer import atomic_write_json
+
 def setup_api_keys():
     """设置API密钥的交互式向导"""
     print("=" * 60)
@@ -88,9 +92,8 @@ def setup_api_keys():
     # 更新配置
     config["api_keys"] = api_keys
     
-    # 保存配置
-    with open(config_file, 'w', encoding='utf-8') as f:
-        json.dump(config, f, ensure_ascii=False, indent=2)
+    # 保存配置（原子替换，Web 界面同时读取时不会读到半个文件）
+    atomic_write_json(config_file, config, fsync=True, file_mode=0o600, indent=2)
     
     print("\n" + "=" * 60)
     print("配置完成！")
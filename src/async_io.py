@@ -0,0 +1,278 @@
+"""
+async_io.py
+异步下载层的基础设施 - 子进程（yt-dlp/ffmpeg）与HTTP请求（TikHub/CDN）都不阻塞事件循环，
+支持超时与取消：任务被取消或超时时会结束仍在运行的子进程、关闭HTTP连接。
+
+HTTP 使用 httpx（按需导入）；未安装 httpx 时退回在线程中执行 requests（不分段、不续传）。
+"""
+
+import asyncio
+import json
+import os
+import re
+import subprocess
+import time
+from typing import Optional, List, Dict, Any
+
+from .config import config_manager
+from .output_writer import atomic_write_json
+
+# 与原 requests 调用保持一致：TikHub 接口30秒，CDN下载每次读取60秒
+API_TIMEOUT = 30
+DOWNLOAD_TIMEOUT = 60
+CHUNK_SIZE = 1024 * 1024
+
+
+def get_download_settings() -> Dict[str, Any]:
+    """
+    读取下载设置：timeout_seconds 为单个下载任务的总超时（0表示不限制），max_concurrent 为批量下载的并发数，
+    connections 为单个文件的最大并发分段数，min_segment_mb 为每个分段的最小大小，retries 为分段断线重试次数
+    """
+    settings = {"timeout_seconds": 1800, "max_concurrent": 4, "connections": 4, "min_segment_mb": 4, "retries": 3}
+    settings.update(config_manager.config.get("download", {}))
+    return settings
+
+
+class RequestFailed(RuntimeError):
+    """HTTP请求失败（连接错误、超时或非2xx状态码）"""
+
+
+async def run_process(cmd: List[str], timeout: Optional[float] = None, check: bool = False) -> subprocess.CompletedProcess:
+    """
+    异步执行子进程并收集输出
+    :param timeout: 超时秒数，None表示不限制
+    :param check: 返回码非0时抛出 subprocess.CalledProcessError（与 subprocess.run 一致）
+    :raises FileNotFoundError: 可执行文件不存在
+    :raises asyncio.TimeoutError: 超时（子进程已被结束）
+    """
+    proc = await asyncio.create_subprocess_exec(*cmd, stdin=asyncio.subprocess.DEVNULL,
+                                                stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE)
+    try:
+        stdout, stderr = await asyncio.wait_for(proc.communicate(), timeout)
+    except BaseException:
+        # 超时或任务被取消：结束子进程，避免留下孤儿进程
+        if proc.returncode is None:
+            proc.kill()
+            await asyncio.shield(proc.wait())
+        raise
+    result = subprocess.CompletedProcess(cmd, proc.returncode, stdout.decode("utf-8", errors="replace"),
+                                         stderr.decode("utf-8", errors="replace"))
+    if check and result.returncode != 0:
+        raise subprocess.CalledProcessError(result.returncode, cmd, result.stdout, result.stderr)
+    return result
+
+
+def _httpx():
+    try:
+        import httpx
+        return httpx
+    except ImportError:
+        return None
+
+
+async def get_json(url: str, params: Optional[Dict[str, Any]] = None, headers: Optional[Dict[str, str]] = None,
+                   timeout: float = API_TIMEOUT) -> Dict[str, Any]:
+    """
+    GET 请求并解析JSON
+    :raises RequestFailed: 请求失败或状态码非2xx
+    """
+    httpx = _httpx()
+    if httpx is None:
+        return await asyncio.to_thread(_get_json_blocking, url, params, headers, timeout)
+    try:
+        async with httpx.AsyncClient(timeout=timeout, follow_redirects=True) as client:
+            response = await client.get(url, params=params, headers=headers)
+            response.raise_for_status()
+            return response.json()
+    except httpx.HTTPError as e:
+        raise RequestFailed(str(e)) from e
+
+
+def _segments(total: int, connections: int, min_segment: int) -> List[List[int]]:
+    """把 [0, total) 切成若干分段 [start, end, 已完成字节]"""
+    count = max(1, min(connections, total // max(1, min_segment)))
+    size = -(-total // count)
+    return [[start, min(start + size, total), 0] for start in range(0, total, size)]
+
+
+def _load_resume_state(state_path: str, total: int, validator: Optional[str]) -> Optional[List[List[int]]]:
+    """读取上次中断时保存的分段进度；文件大小或校验值（ETag/Last-Modified）变化时作废"""
+    try:
+        with open(state_path, "r", encoding="utf-8") as f:
+            state = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if state.get("total") != total or state.get("validator") != validator:
+        return None
+    return state.get("segments")
+
+
+def _stats(written: int, resumed: int, start: float, connections: int) -> Dict[str, Any]:
+    seconds = max(time.perf_counter() - start, 1e-6)
+    return {
+        "bytes": written,
+        "resumed_bytes": resumed,
+        "seconds": round(seconds, 3),
+        "mb_per_s": round((written - resumed) / seconds / 1024 / 1024, 2),
+        "connections": connections,
+    }
+
+
+async def download_file(url: str, dest: str, headers: Optional[Dict[str, str]] = None,
+                        timeout: float = DOWNLOAD_TIMEOUT, connections: Optional[int] = None) -> Dict[str, Any]:
+    """
+    下载到文件。服务器支持 Range 时按分段并发下载（大文件在高延迟链路上不再受单个TCP连接限制），
+    连接中断后从断点续传；中途失败时保留 dest.part 与进度文件，下次下载同一文件时继续。
+    写入完成后校验文件长度与 Content-Length 一致，再原子地重命名为 dest
+    :param timeout: 连接与每次读取的超时秒数
+    :param connections: 最大并发分段数，默认取配置 download.connections
+    :return: {'bytes', 'resumed_bytes', 'seconds', 'mb_per_s', 'connections'}
+    :raises RequestFailed: 请求失败、重试耗尽或长度校验失败
+    """
+    settings = get_download_settings()
+    if connections is None:
+        connections = settings["connections"]
+    httpx = _httpx()
+    if httpx is None:
+        return await asyncio.to_thread(_download_file_blocking, url, dest, headers, timeout)
+
+    headers = dict(headers or {})
+    part_path, state_path = f"{dest}.part", f"{dest}.part.json"
+    start = time.perf_counter()
+    limits = httpx.Limits(max_connections=max(1, connections) + 1)
+    try:
+        async with httpx.AsyncClient(timeout=timeout, follow_redirects=True, limits=limits) as client:
+            # 用 bytes=0-0 探测长度与 Range 支持；服务器忽略 Range（200）时直接把这次响应作为整体下载
+            async with client.stream("GET", url, headers={**headers, "Range": "bytes=0-0"}) as probe:
+                probe.raise_for_status()
+                if probe.status_code != 206:
+                    return await _download_whole(probe, part_path, dest, start)
+                content_range = probe.headers.get("content-range", "")
+                total = int(content_range.rsplit("/", 1)[1]) if re.search(r"/[1-9]\d*$", content_range) else None
+                validator = probe.headers.get("etag") or probe.headers.get("last-modified")
+
+            if total is None:
+                # 返回了分段但总长度未知（如 bytes 0-0/*），无法切分：不带 Range 重新请求整个文件
+                async with client.stream("GET", url, headers=headers) as response:
+                    response.raise_for_status()
+                    return await _download_whole(response, part_path, dest, start)
+
+            segments = None
+            if os.path.exists(part_path) and os.path.getsize(part_path) == total:
+                segments = _load_resume_state(state_path, total, validator)
+            if segments is None:
+                segments = _segments(total, connections, settings["min_segment_mb"] * 1024 * 1024)
+                with open(part_path, "wb") as f:
+                    f.truncate(total)
+            resumed = sum(done for _, _, done in segments)
+            if resumed:
+                print(f"从断点续传: 已完成 {resumed / 1024 / 1024:.1f} / {total / 1024 / 1024:.1f} MB")
+            if validator:
+                headers["If-Range"] = validator
+
+            tasks = [asyncio.ensure_future(_fetch_segment(client, url, headers, part_path, segment, settings["retries"]))
+                     for segment in segments if segment[0] + segment[2] < segment[1]]
+            try:
+                await asyncio.gather(*tasks)
+            except BaseException:
+                # 一个分段失败（或任务被取消、超时）时先取消并等待其余分段结束，
+                # 它们不再写入 .part、不再更新进度后再保存进度以便续传
+                for task in tasks:
+                    task.cancel()
+                await asyncio.gather(*tasks, return_exceptions=True)
+                atomic_write_json(state_path, {"total": total, "validator": validator, "segments": segments})
+                raise
+    except httpx.HTTPError as e:
+        raise RequestFailed(str(e)) from e
+
+    written = os.path.getsize(part_path)
+    if written != total or sum(done for _, _, done in segments) != total:
+        raise RequestFailed(f"下载长度校验失败: 期望 {total} 字节，实际 {written} 字节")
+    os.replace(part_path, dest)
+    if os.path.exists(state_path):
+        os.remove(state_path)
+    return _stats(total, resumed, start, len(segments))
+
+
+async def _write_chunk(f, chunk: bytes):
+    """
+    在线程中写入（慢盘不阻塞事件循环上的其他下载）；
+    任务被取消时等本次写入完成后再抛出，取消返回后不会再有写入落到文件上
+    """
+    write = asyncio.ensure_future(asyncio.to_thread(f.write, chunk))
+    try:
+        await asyncio.shield(write)
+    except asyncio.CancelledError:
+        await write
+        raise
+
+
+async def _fetch_segment(client, url: str, headers: Dict[str, str], part_path: str, segment: List[int], retries: int):
+    """下载一个分段并写入文件对应位置；连接中断时从已完成的位置重新请求，最多重试 retries 次"""
+    import httpx
+    start, end, _ = segment
+    attempts = 0
+    with open(part_path, "r+b") as f:
+        while start + segment[2] < end:
+            offset = start + segment[2]
+            try:
+                async with client.stream("GET", url, headers={**headers, "Range": f"bytes={offset}-{end - 1}"}) as response:
+                    response.raise_for_status()
+                    if response.status_code != 206:
+                        raise RequestFailed("服务器未按 Range 返回分段（文件可能已变化），请重新下载")
+                    f.seek(offset)
+                    async for chunk in response.aiter_bytes(CHUNK_SIZE):
+                        chunk = chunk[:end - start - segment[2]]
+                        await _write_chunk(f, chunk)
+                        segment[2] += len(chunk)
+            except httpx.TransportError as e:
+                attempts += 1
+                if attempts > retries:
+                    raise
+                print(f"分段 {start}-{end - 1} 连接中断（{e.__class__.__name__}），{attempts}/{retries} 次重试，"
+                      f"从 {start + segment[2]} 字节继续")
+                await asyncio.sleep(min(2 ** attempts, 10))
+
+
+async def _download_whole(response, part_path: str, dest: str, start: float) -> Dict[str, Any]:
+    """服务器不支持 Range（或无法得知总长度）时整体下载，并按 Content-Length 校验长度"""
+    written = 0
+    with open(part_path, "wb") as f:
+        async for chunk in response.aiter_bytes(CHUNK_SIZE):
+            await _write_chunk(f, chunk)
+            written += len(chunk)
+    expected = response.headers.get("content-length")
+    if expected is not None and int(expected) != written and "content-encoding" not in response.headers:
+        raise RequestFailed(f"下载长度校验失败: 期望 {expected} 字节，实际 {written} 字节")
+    os.replace(part_path, dest)
+    return _stats(written, 0, start, 1)
+
+
+def _get_json_blocking(url, params, headers, timeout):
+    import requests
+    try:
+        response = requests.get(url, params=params, headers=headers, timeout=timeout)
+        response.raise_for_status()
+        return response.json()
+    except requests.exceptions.RequestException as e:
+        raise RequestFailed(str(e)) from e
+
+
+def _download_file_blocking(url, dest, headers, timeout):
+    import requests
+    written = 0
+    start = time.perf_counter()
+    try:
+        with requests.get(url, headers=headers, stream=True, timeout=timeout) as response:
+            response.raise_for_status()
+            with open(f"{dest}.part", "wb") as f:
+                for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+                    f.write(chunk)
+                    written += len(chunk)
+            expected = response.headers.get("content-length")
+    except requests.exceptions.RequestException as e:
+        raise RequestFailed(str(e)) from e
+    if expected is not None and int(expected) != written and "content-encoding" not in response.headers:
+        raise RequestFailed(f"下载长度校验失败: 期望 {expected} 字节，实际 {written} 字节")
+    os.replace(f"{dest}.part", dest)
+    return _stats(written, 0, start, 1)
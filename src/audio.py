@@ -4,22 +4,40 @@ audio.py
 """
 
 import asyncio
+import glob
 import os
 from pathlib import Path
-try:
-    from moviepy.audio.io.AudioFileClip import AudioFileClip
-except ImportError:
-    raise ImportError("未找到 moviepy，请先运行 pip install moviepy 安装依赖。")
 import subprocess
-from .utils import get_platform
-from .douyin_handler import is_douyin_url, process_douyin_url
+from typing import Optional
+from .utils import get_platform, canonical_video_id, safe_filename
+from .instrumentation import span, file_size
+from .async_io import run_process, get_download_settings
+from .douyin_handler import DOUYIN_PLATFORMS, process_douyin_url_async
+
+
+def output_audio_path(url: str, output_dir: str) -> Path:
+    """按规范化视频ID命名下载文件，并发下载不同视频时互不覆盖"""
+    return Path(output_dir) / safe_filename(canonical_video_id(url).replace(":", "_"), ".mp3")
+
+
+def _find_downloaded_audio(audio_path: Path) -> Path:
+    """
+    yt-dlp 未按指定名称输出时（如追加了扩展名 xxx.mp3.mp3），只在本视频的文件名下查找，
+    不能取目录中任意 mp3：并发下载时那可能是其他视频的文件
+    """
+    if audio_path.exists():
+        return audio_path
+    candidates = sorted(audio_path.parent.glob(glob.escape(audio_path.name) + ".*"))
+    candidates = [p for p in candidates if p.suffix == ".mp3"]
+    if not candidates:
+        raise RuntimeError("未找到下载的音频文件")
+    return candidates[0]
 
-# 仅在需要时导入 bilix
 
 async def download_bilibili_audio(url: str, output_dir: str = "downloads") -> str:
     """使用 yt-dlp 下载 Bilibili 视频音频"""
     os.makedirs(output_dir, exist_ok=True)
-    audio_path = Path(output_dir) / "bilibili_output.mp3"
+    audio_path = output_audio_path(url, output_dir)
 
     try:
         # 使用 yt-dlp 下载 Bilibili 视频并提取音频
@@ -44,19 +62,11 @@ async def download_bilibili_audio(url: str, output_dir: str = "downloads") -> st
         ]
 
         print(f"正在下载Bilibili视频: {decoded_url}")
-        result = subprocess.run(cmd, capture_output=True, text=True, check=True)
+        result = await run_process(cmd, check=True)
         print("Bilibili下载完成")
 
         # 检查文件是否存在
-        if not audio_path.exists():
-            # 如果指定名称不存在，查找下载的文件
-            downloaded_files = list(Path(output_dir).glob("*.mp3"))
-            if downloaded_files:
-                audio_path = downloaded_files[0]
-            else:
-                raise RuntimeError("未找到下载的音频文件")
-
-        return str(audio_path)
+        return str(_find_downloaded_audio(audio_path))
 
     except subprocess.CalledProcessError as e:
         print(f"yt-dlp 下载失败: {e}")
@@ -80,18 +90,11 @@ async def download_bilibili_audio(url: str, output_dir: str = "downloads") -> st
                 "-o", str(audio_path),  # 输出文件
                 decoded_url
             ]
-            result = subprocess.run(cmd, capture_output=True, text=True, check=True)
+            result = await run_process(cmd, check=True)
             print("Bilibili下载完成（无cookies）")
 
             # 检查文件是否存在
-            if not audio_path.exists():
-                downloaded_files = list(Path(output_dir).glob("*.mp3"))
-                if downloaded_files:
-                    audio_path = downloaded_files[0]
-                else:
-                    raise RuntimeError("未找到下载的音频文件")
-
-            return str(audio_path)
+            return str(_find_downloaded_audio(audio_path))
         except subprocess.CalledProcessError as e2:
             print(f"yt-dlp 下载失败（无cookies）: {e2}")
             print(f"错误输出: {e2.stderr}")
@@ -102,7 +105,7 @@ async def download_bilibili_audio(url: str, output_dir: str = "downloads") -> st
 
 async def download_youtube_audio(url: str, output_dir: str = "downloads") -> str:
     os.makedirs(output_dir, exist_ok=True)
-    audio_path = Path(output_dir) / "youtube_output.mp3"
+    audio_path = output_audio_path(url, output_dir)
 
     # 修复URL中的转义字符
     import urllib.parse
@@ -122,7 +125,7 @@ async def download_youtube_audio(url: str, output_dir: str = "downloads") -> str
         "-o", str(audio_path),
         decoded_url
     ]
-    subprocess.run(cmd, check=True)
+    await run_process(cmd, check=True)
     return str(audio_path)
 
 async def download_douyin_audio(url: str, output_dir: str = "downloads") -> str:
@@ -136,21 +139,36 @@ async def download_douyin_audio(url: str, output_dir: str = "downloads") -> str:
         api_key = config_manager.config.get("api_keys", {}).get("tikhub")
 
     # 使用抖音处理器下载音频
-    from .douyin_handler import process_douyin_url
-    audio_path = process_douyin_url(url, output_dir, api_key)
-    return audio_path
+    return await process_douyin_url_async(url, output_dir, api_key)
 
 async def download_audio_from_url(url: str, output_dir: str = "downloads") -> str:
-    if is_douyin_url(url):
+    platform = get_platform(url)
+    if platform in DOUYIN_PLATFORMS:
         return await download_douyin_audio(url, output_dir)
+    elif platform == 'bilibili':
+        return await download_bilibili_audio(url, output_dir)
+    elif platform == 'youtube':
+        return await download_youtube_audio(url, output_dir)
     else:
-        platform = get_platform(url)
-        if platform == 'bilibili':
-            return await download_bilibili_audio(url, output_dir)
-        elif platform == 'youtube':
-            return await download_youtube_audio(url, output_dir)
-        else:
-            raise ValueError(f"暂不支持该平台: {url}")
+        raise ValueError(f"暂不支持该平台: {url}")
+
+async def download_audio_async(url: str, output_dir: str = "downloads", timeout: Optional[float] = None) -> str:
+    """
+    异步下载音频，可在事件循环上与其他下载并发执行；任务被取消或超时时结束 yt-dlp/ffmpeg 子进程
+    :param timeout: 总超时秒数，默认取配置 download.timeout_seconds（0表示不限制）
+    :raises RuntimeError: 下载超时
+    """
+    if timeout is None:
+        timeout = get_download_settings()["timeout_seconds"]
+    with span("download", platform=get_platform(url)) as record:
+        try:
+            audio_path = await asyncio.wait_for(download_audio_from_url(url, output_dir), timeout or None)
+        except asyncio.TimeoutError:
+            raise RuntimeError(f"下载超时（超过 {timeout} 秒）: {url}")
+        record["bytes"] = file_size(audio_path)
+    return audio_path
+
 
 def download_audio(url: str, output_dir: str = "downloads") -> str:
-    return asyncio.run(download_audio_from_url(url, output_dir)) 
\ No newline at end of file
+    """同步下载音频（命令行使用）"""
+    return asyncio.run(download_audio_async(url, output_dir))
@@ -4,10 +4,15 @@ audio_handler.py
 """
 
 import os
+import errno
+import json
 import shutil
+import subprocess
 from pathlib import Path
-from typing import Optional
-from utils import safe_filename
+from typing import Optional, Tuple, Dict, Any
+from .utils import safe_filename
+from .instrumentation import span, file_size
+from . import ffmpeg_engine
 
 
 def validate_audio_file(file_path: str) -> bool:
@@ -21,25 +26,24 @@ def validate_audio_file(file_path: str) -> bool:
     return file_ext in supported_formats
 
 
-def copy_audio_to_downloads(file_path: str, output_dir: str = "downloads") -> str:
-    """
-    将音频文件复制到downloads目录并返回新的路径
-    :param file_path: 原始音频文件路径
-    :param output_dir: 输出目录
-    :return: 复制后的音频文件路径
-    """
-    os.makedirs(output_dir, exist_ok=True)
-    
-    # 获取原始文件信息
-    original_path = Path(file_path)
-    filename = original_path.name
-    
-    # 创建安全的文件名
-    safe_name = safe_filename(filename)
-    
-    # 确保输出路径在downloads目录中
+# Whisper 通过 ffmpeg 直接解码的音频编码，这些格式无需预先转码
+WHISPER_DIRECT_CODECS = {
+    'mp3', 'aac', 'flac', 'alac', 'opus', 'vorbis', 'wmav1', 'wmav2', 'amr_nb', 'amr_wb', 'mp2',
+}
+
+# Whisper 内部统一使用的采样率和声道数，需要转码时直接输出该格式
+WHISPER_SAMPLE_RATE = 16000
+WHISPER_CHANNELS = 1
+
+# Linux FICLONE ioctl，用于在 btrfs/xfs 等文件系统上做写时复制（reflink）
+_FICLONE = 0x40049409
+
+
+def _unique_output_path(file_path: str, output_dir: str) -> Path:
+    """在输出目录中生成不冲突的安全文件名"""
+    safe_name = safe_filename(Path(file_path).name)
     output_path = Path(output_dir) / safe_name
-    
+
     # 如果目标文件已存在，则添加序号
     counter = 1
     original_output_path = output_path
@@ -48,85 +52,156 @@ def copy_audio_to_downloads(file_path: str, output_dir: str = "downloads") -> st
         suffix = original_output_path.suffix
         output_path = Path(output_dir) / f"{stem}_{counter}{suffix}"
         counter += 1
-    
+    return output_path
+
+
+def copy_audio_to_downloads(file_path: str, output_dir: str = "downloads") -> str:
+    """
+    将音频文件复制到downloads目录并返回新的路径
+    :param file_path: 原始音频文件路径
+    :param output_dir: 输出目录
+    :return: 复制后的音频文件路径
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    output_path = _unique_output_path(file_path, output_dir)
+
     # 复制文件
     shutil.copy2(file_path, output_path)
     
     return str(output_path)
 
 
-def convert_audio_format(input_path: str, output_path: str, target_format: str = ".mp3") -> str:
+def _reflink(src: str, dst: str) -> bool:
     """
-    转换音频文件格式
-    :param input_path: 输入音频文件路径
-    :param output_path: 输出音频文件路径
-    :param target_format: 目标格式
-    :return: 转换后的音频文件路径
+    尝试写时复制克隆文件，不支持时返回False且不留下目标文件
+    :raises FileExistsError: dst 已存在（以独占方式创建，绝不截断已有文件）
     """
     try:
-        # 尝试导入moviepy 2.x版本的模块
-        try:
-            from moviepy import AudioFileClip
-        except ImportError:
-            from moviepy.editor import AudioFileClip
-
-        # 检查输入文件是否存在
-        if not os.path.exists(input_path):
-            raise FileNotFoundError(f"输入音频文件不存在: {input_path}")
-
-        # 使用moviepy进行格式转换
-        audio_clip = AudioFileClip(input_path)
-
-        # 确保输出目录存在
-        output_dir = os.path.dirname(output_path)
-        os.makedirs(output_dir, exist_ok=True)
-
-        # 导出为指定格式
-        if target_format.lower() == ".mp3":
-            audio_clip.write_audiofile(output_path, logger=None)
-        elif target_format.lower() == ".wav":
-            audio_clip.write_audiofile(output_path, logger=None)
-        else:
-            # 默认转换为mp3
-            output_path = output_path.rsplit('.', 1)[0] + ".mp3"
-            audio_clip.write_audiofile(output_path, logger=None)
+        import fcntl
+    except ImportError:
+        return False
+    try:
+        fdst = open(dst, 'xb')
+    except FileExistsError:
+        raise
+    except OSError:
+        return False
+    try:
+        with open(src, 'rb') as fsrc, fdst:
+            fcntl.ioctl(fdst.fileno(), _FICLONE, fsrc.fileno())
+        return True
+    except OSError:
+        # 目标文件是本次独占创建的，可以安全删除
+        os.remove(dst)
+        return False
 
-        # 关闭音频剪辑
-        audio_clip.close()
 
-        return output_path
-    except ImportError:
-        # 检查moviepy是否已安装
+# 硬链接不可用（跨文件系统、文件系统不支持、链接数达到上限）时才退回 reflink/直接引用
+_LINK_FALLBACK_ERRNOS = {errno.EXDEV, errno.EPERM, errno.EMLINK}
+# 并发上传得到相同文件名时换一个名字重试的次数
+_LINK_ATTEMPTS = 10
+
+
+def link_audio_to_downloads(file_path: str, output_dir: str = "downloads") -> Tuple[str, str]:
+    """
+    零拷贝地把音频文件放入downloads目录：已在目录中则直接引用，否则依次尝试硬链接、reflink，
+    都不可用时直接引用原文件（不再整份复制）。
+    目标文件只以独占方式创建，并发任务选中同一文件名时换名重试，不会覆盖其他任务的文件
+    :param file_path: 原始音频文件路径
+    :param output_dir: 输出目录
+    :return: (可用于后续处理的路径, 方式: reference/hardlink/reflink)
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    if Path(file_path).resolve().parent == Path(output_dir).resolve():
+        return file_path, "reference"
+
+    can_link = True
+    for _ in range(_LINK_ATTEMPTS):
+        output_path = _unique_output_path(file_path, output_dir)
         try:
-            import subprocess
-            import sys
-            subprocess.check_call([sys.executable, "-m", "pip", "show", "moviepy"])
-        except subprocess.CalledProcessError:
-            print("检测到moviepy未安装，正在尝试安装...")
-            try:
-                subprocess.check_call([sys.executable, "-m", "pip", "install", "moviepy"])
-                print("moviepy安装成功！")
-                # 重新导入并执行 - 兼容不同版本的moviepy
+            if can_link:
                 try:
-                    from moviepy import AudioFileClip
-                except ImportError:
-                    from moviepy.editor import AudioFileClip
-                audio_clip = AudioFileClip(input_path)
-                output_dir = os.path.dirname(output_path)
-                os.makedirs(output_dir, exist_ok=True)
-                if target_format.lower() == ".mp3":
-                    audio_clip.write_audiofile(output_path, logger=None)
-                elif target_format.lower() == ".wav":
-                    audio_clip.write_audiofile(output_path, logger=None)
-                else:
-                    output_path = output_path.rsplit('.', 1)[0] + ".mp3"
-                    audio_clip.write_audiofile(output_path, logger=None)
-                audio_clip.close()
-                return output_path
-            except Exception as install_error:
-                raise ImportError("自动安装moviepy失败，请手动运行 'pip install moviepy' 安装依赖。") from install_error
-        else:
-            raise ImportError("moviepy已安装但无法导入，可能存在版本兼容性问题。请尝试重新安装：'pip install --force-reinstall moviepy'。")
+                    os.link(file_path, output_path)
+                    return str(output_path), "hardlink"
+                except OSError as e:
+                    # FileExistsError（EEXIST）也在这里重新抛出，由外层换名重试
+                    if e.errno not in _LINK_FALLBACK_ERRNOS:
+                        raise
+                    can_link = False
+            if _reflink(file_path, str(output_path)):
+                return str(output_path), "reflink"
+            return file_path, "reference"
+        except FileExistsError:
+            continue
+    return file_path, "reference"
+
+
+def probe_audio(file_path: str) -> Optional[Dict[str, Any]]:
+    """
+    使用 ffprobe 探测音频流信息
+    :param file_path: 音频文件路径
+    :return: {'codec', 'sample_rate', 'channels', 'duration', 'format'}；未安装ffprobe时返回None
+    :raises ValueError: 文件无法识别或不含音频流
+    """
+    cmd = [
+        "ffprobe", "-v", "error",
+        "-select_streams", "a:0",
+        "-show_entries", "stream=codec_name,sample_rate,channels:format=format_name,duration",
+        "-of", "json",
+        file_path
+    ]
+    try:
+        result = subprocess.run(cmd, capture_output=True, text=True, timeout=60)
+    except FileNotFoundError:
+        return None
+    if result.returncode != 0:
+        raise ValueError(f"无法识别的音频文件: {result.stderr.strip()}")
+
+    info = json.loads(result.stdout or "{}")
+    streams = info.get("streams") or []
+    if not streams:
+        raise ValueError(f"文件中没有音频流: {file_path}")
+    stream = streams[0]
+    fmt = info.get("format") or {}
+    return {
+        "codec": stream.get("codec_name"),
+        "sample_rate": int(stream["sample_rate"]) if stream.get("sample_rate") else None,
+        "channels": stream.get("channels"),
+        "duration": float(fmt["duration"]) if fmt.get("duration") else None,
+        "format": fmt.get("format_name"),
+    }
+
+
+def whisper_can_decode(probe: Optional[Dict[str, Any]]) -> bool:
+    """
+    判断 Whisper 能否直接解码（未安装ffprobe时按扩展名信任，Whisper本身也依赖ffmpeg解码）
+    """
+    if probe is None:
+        return True
+    codec = probe.get("codec") or ""
+    return codec in WHISPER_DIRECT_CODECS or codec.startswith("pcm_")
+
+
+def convert_audio_format(input_path: str, output_path: str, target_format: str = ".mp3",
+                         sample_rate: Optional[int] = None, channels: Optional[int] = None,
+                         source_codec: Optional[str] = None) -> str:
+    """
+    转换音频文件格式（ffmpeg子进程，一条命令完成；源编码与目标一致时直接流复制）
+    :param input_path: 输入音频文件路径
+    :param output_path: 输出音频文件路径
+    :param target_format: 目标格式
+    :param sample_rate: 输出采样率（None表示保持原样）
+    :param channels: 输出声道数（None表示保持原样）
+    :param source_codec: 源音频编码（来自ffprobe），用于判断能否流复制
+    :return: 转换后的音频文件路径
+    """
+    if target_format.lower() not in ffmpeg_engine.TARGET_CODECS:
+        # 默认转换为mp3
+        target_format = ".mp3"
+    output_path = output_path.rsplit('.', 1)[0] + target_format.lower()
+    try:
+        return ffmpeg_engine.convert(input_path, output_path, source_codec=source_codec,
+                                     sample_rate=sample_rate, channels=channels)
     except Exception as e:
         raise RuntimeError(f"音频格式转换失败: {e}")
 
@@ -134,6 +209,7 @@ def convert_audio_format(input_path: str, output_path: str, target_format: str =
 def handle_audio_upload(file_path: str, output_dir: str = "downloads", force_convert: bool = False) -> str:
     """
     处理音频文件上传流程
+    Whisper 能直接解码的格式零拷贝引用原文件，只有编码确实无法解码时才转码为16kHz单声道WAV
     :param file_path: 上传的音频文件路径
     :param output_dir: 输出目录
     :param force_convert: 是否强制转换为MP3格式
@@ -143,14 +219,25 @@ def handle_audio_upload(file_path: str, output_dir: str = "downloads", force_con
     if not validate_audio_file(file_path):
         supported_formats = ['.mp3', '.wav', '.m4a', '.mp4', '.aac', '.flac', '.wma', '.amr']
         raise ValueError(f"不支持的音频格式。支持的格式: {', '.join(supported_formats)}")
-    
-    # 复制文件到downloads目录
-    copied_path = copy_audio_to_downloads(file_path, output_dir)
-    
-    # 检查是否需要转换格式
-    if force_convert or Path(copied_path).suffix.lower() != ".mp3":
-        converted_path = copied_path.rsplit('.', 1)[0] + ".mp3"
-        converted_path = convert_audio_format(copied_path, converted_path)
-        return converted_path
-    else:
-        return copied_path
\ No newline at end of file
+
+    with span("convert", source_format=Path(file_path).suffix.lower()) as record:
+        probe = probe_audio(file_path)
+        if probe:
+            record["codec"] = probe["codec"]
+            record["audio_seconds"] = probe["duration"]
+
+        if force_convert:
+            converted_path = str(_unique_output_path(Path(file_path).stem + ".mp3", output_dir))
+            result_path = convert_audio_format(file_path, converted_path,
+                                               source_codec=probe["codec"] if probe else None)
+            record["mode"] = "stream_copy" if probe and probe["codec"] == "mp3" else "transcode"
+        elif whisper_can_decode(probe):
+            result_path, record["mode"] = link_audio_to_downloads(file_path, output_dir)
+        else:
+            print(f"音频编码 {probe['codec']} 无法直接解码，转码为16kHz单声道WAV...")
+            converted_path = str(_unique_output_path(Path(file_path).stem + ".wav", output_dir))
+            result_path = convert_audio_format(file_path, converted_path, target_format=".wav",
+                                               sample_rate=WHISPER_SAMPLE_RATE, channels=WHISPER_CHANNELS)
+            record["mode"] = "transcode"
+        record["bytes"] = file_size(result_path)
+    return result_path
@@ -4,17 +4,33 @@ batch_processor.py
 """
 
 import os
+import csv
 import glob
+import sys
+import queue
+import asyncio
+import threading
 from pathlib import Path
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 from datetime import datetime
-import json
+import time
+from concurrent.futures import ThreadPoolExecutor, Future, wait, FIRST_COMPLETED
 
 from .audio_handler import handle_audio_upload
-from .transcribe import transcribe_local_audio
-from .summarize import summarize_text
-from .utils import safe_filename
+from .transcribe import transcribe_local_audio_segments, transcribe_audio_segments, identify_language, probe_duration
+from .audio import download_audio_async
+from .async_io import get_download_settings
+from .model_policy import AUTO_MODEL, select_model
+from .segments import save_transcript
+from .results_catalog import save_summaries
+from .summarize import summarize_many
+from .prompts import select_prompts
+from .utils import safe_filename, canonical_video_id
+from .url_resolver import iter_share_urls, unique_share_urls, generate_filename
 from .config import config_manager
+from .instrumentation import JobTrace, span, rollup
+from .ffmpeg_engine import get_conversion_settings
+from .output_writer import atomic_open, atomic_write_json
 
 
 def get_audio_files_from_dir(upload_dir: str) -> List[str]:
@@ -31,33 +47,76 @@ def get_audio_files_from_dir(upload_dir: str) -> List[str]:
     return sorted(unique_files)
 
 
-def process_single_audio(audio_file: str, model: str, prompt_to_use: str, language: str = None, provider: str = "deepseek") -> Dict[str, Any]:
-    """处理单个音频文件"""
+def process_single_audio(audio_file: str, model: str, prompts: Dict[str, str], language: str = None, provider: str = "deepseek",
+                         processed_audio_path: str = None) -> Dict[str, Any]:
+    """
+    处理单个音频文件（processed_audio_path 为已准备好的音频时跳过导入/转换）
+    :param prompts: {模板名: 提示词}，每个模板各生成一份总结
+    """
     # 处理音频文件
-    processed_audio_path = handle_audio_upload(audio_file, output_dir="downloads")
+    if processed_audio_path is None:
+        processed_audio_path = handle_audio_upload(audio_file, output_dir="downloads")
 
     # 转录音频
-    transcript = transcribe_local_audio(processed_audio_path, model=model, language=language)
+    transcription = transcribe_local_audio_segments(processed_audio_path, model=model, language=language)
 
-    # 生成总结
-    summary = summarize_text(transcript, prompt=prompt_to_use, model=config_manager.get_default_model(), provider=provider)
+    # 生成总结（按时间窗口分段，摘要可以引用时间点）
+    summaries = summarize_many(transcription["text"], prompts, model=config_manager.get_default_model(), provider=provider,
+                               segments=transcription["segments"],
+                               language=transcription.get("language"))
 
     return {
-        "transcript": transcript,
-        "summary": summary,
-        "processed_audio_path": processed_audio_path
+        "transcript": transcription["text"],
+        "transcription": transcription,
+        "summaries": summaries,
+        "processed_audio_path": processed_audio_path,
+        "model_choice": transcription["model_choice"]
     }
 
 
+def prepare_audio(audio_file: str, detect_language: bool = True) -> Dict[str, Any]:
+    """
+    导入/转换单个文件，需要时接着识别语言（在转换线程池中执行，与前一个文件的转录重叠）
+    :return: {'processed_audio_path', 'language', 'language_id', 'duration'}
+    """
+    processed_audio_path = handle_audio_upload(audio_file, "downloads")
+    plan = {"processed_audio_path": processed_audio_path, "language": None, "language_id": None, "duration": None}
+    if detect_language:
+        duration = probe_duration(processed_audio_path)
+        info = identify_language(processed_audio_path, duration)
+        plan.update(language=info["language"] if info else None, language_id=info, duration=duration)
+    return plan
+
+
+def next_ready_file(pending: Dict[str, Future], last_language: Optional[str] = None) -> str:
+    """
+    从尚未处理的文件中选出下一个：只在已准备好的文件中挑选，有与上一个文件同语言的优先（连续使用同一个已加载的模型），
+    否则按原顺序取第一个；都未准备好时等待最先完成的一个，不必等全部文件转换完
+    :param pending: {文件: prepare_audio 的Future}
+    """
+    ready = [f for f, future in pending.items() if future.done()]
+    if not ready:
+        wait(pending.values(), return_when=FIRST_COMPLETED)
+        ready = [f for f, future in pending.items() if future.done()]
+
+    def language_of(audio_file):
+        future = pending[audio_file]
+        return None if future.exception() else future.result()["language"]
+
+    same_language = [f for f in ready if last_language and language_of(f) == last_language]
+    return (same_language or ready)[0]
+
+
 def process_batch(upload_dir: str = "uploads", model: str = "small",
                  prompt_to_use: str = None, prompt_template: str = "default课堂笔记",
-                 language: str = None, provider: str = "deepseek") -> List[Dict[str, Any]]:
-    """批量处理音频文件"""
-    from .prompts import prompt_templates
-
+                 language: str = None, provider: str = "deepseek", report_format: str = "json") -> List[Dict[str, Any]]:
+    """
+    批量处理音频文件
+    :param prompt_to_use: 自定义提示词，为空时使用 prompt_template（可用逗号分隔多个模板）
+    :param report_format: 报告格式 json 或 csv
+    """
     # 获取实际使用的提示词
-    if prompt_to_use is None:
-        prompt_to_use = prompt_templates.get(prompt_template, prompt_templates["default课堂笔记"])
+    prompts = select_prompts(prompt_template, prompt_to_use)
 
     # 确保上传目录存在
     Path(upload_dir).mkdir(exist_ok=True)
@@ -73,39 +132,73 @@ def process_batch(upload_dir: str = "uploads", model: str = "small",
     print(f"📁 找到 {total_files} 个音频文件")
 
     results = []
-    for i, audio_file in enumerate(audio_files, 1):
-        print(f"🎵 处理第 {i}/{total_files} 个文件: {os.path.basename(audio_file)}")
+    batch_start = time.perf_counter()
+
+    # 转换在ffmpeg子进程中进行，先并发提交全部文件的导入/转换（未指定语言时接着识别语言），与逐个转录形成流水线
+    conversion_pool = ThreadPoolExecutor(max_workers=get_conversion_settings()["max_workers"])
+    pending = {f: conversion_pool.submit(prepare_audio, f, not language) for f in audio_files}
 
+    # 按准备完成的顺序处理，同一语言的文件尽量连续处理；model 为 auto 时每种语言首个文件选定的模型由该语言的后续文件共用
+    language_models: Dict[str, Dict[str, Any]] = {}
+    last_language = None
+    for i in range(1, total_files + 1):
+        audio_file = None
+        trace = JobTrace()
         try:
-            # 处理单个文件
-            result = process_single_audio(audio_file, model, prompt_to_use, language, provider)
+            with trace:
+                with span("convert_wait"):
+                    audio_file = next_ready_file(pending, last_language)
+                    trace.job_id = os.path.basename(audio_file)
+                    print(f"🎵 处理第 {i}/{total_files} 个文件: {os.path.basename(audio_file)}")
+                    plan = pending.pop(audio_file).result()
+                file_language = language or plan["language"]
+                last_language = file_language
 
-            # 生成安全的文件名
-            file_stem = Path(audio_file).stem
-            safe_stem = safe_filename(file_stem)
+                choice = None
+                if model == AUTO_MODEL and not language:
+                    key = file_language or ""
+                    if key not in language_models:
+                        choice = select_model(plan["duration"], file_language)
+                        choice["reason"] += f"（{file_language or '未知语言'}的文件共用）"
+                        language_models[key] = choice
+                        print(f"🌐 语言 {file_language or '未知'}: 使用模型 {choice['model']}")
+                    choice = language_models[key]
 
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+                # 处理单个文件
+                result = process_single_audio(audio_file, choice["model"] if choice else model, prompts,
+                                              file_language, provider,
+                                              processed_audio_path=plan["processed_audio_path"])
+                if choice:
+                    result["model_choice"] = choice
 
-            # 保存转录文本到transcriptions文件夹
-            transcriptions_dir = Path("transcriptions")
-            transcriptions_dir.mkdir(exist_ok=True)
-            transcript_path = transcriptions_dir / f"local_{safe_stem}_{timestamp}_转录.txt"
-            with open(transcript_path, "w", encoding="utf-8") as f:
-                f.write(result["transcript"])
+                # 生成安全的文件名
+                file_stem = Path(audio_file).stem
+                safe_stem = safe_filename(file_stem)
 
-            # 保存总结到summaries文件夹
-            summaries_dir = Path("summaries")
-            summaries_dir.mkdir(exist_ok=True)
-            summary_path = summaries_dir / f"local_{safe_stem}_{timestamp}_总结.md"
-            with open(summary_path, "w", encoding="utf-8") as f:
-                f.write(result["summary"])
+                timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+
+                with span("write") as record:
+                    # 保存转录文本及分段时间戳到transcriptions文件夹
+                    transcript_path = Path("transcriptions") / f"local_{safe_stem}_{timestamp}_转录.txt"
+                    segments_path = Path(save_transcript(result["transcription"], str(transcript_path)))
+                    record["bytes"] = transcript_path.stat().st_size + segments_path.stat().st_size
+
+                # 保存总结到summaries文件夹
+                summary_paths = list(save_summaries(
+                    result["summaries"], str(Path("summaries") / f"local_{safe_stem}_{timestamp}_总结.md"),
+                    model=result["transcription"]["model"], transcript_path=str(transcript_path)).values())
 
             results.append({
                 "file": audio_file,
                 "status": "success",
                 "transcript_path": str(transcript_path),
-                "summary_path": str(summary_path),
-                "error": None
+                "segments_path": str(segments_path),
+                "summary_path": summary_paths[0],
+                "summary_paths": summary_paths,
+                "model_choice": result["model_choice"],
+                "language_id": plan["language_id"],
+                "error": None,
+                **trace.to_dict()
             })
             print(f"✅ 第 {i} 个文件处理完成")
 
@@ -116,22 +209,131 @@ def process_batch(upload_dir: str = "uploads", model: str = "small",
                 "status": "error",
                 "transcript_path": None,
                 "summary_path": None,
-                "error": error_msg
+                "error": error_msg,
+                **trace.to_dict()
             })
             print(f"❌ 第 {i} 个文件处理失败: {error_msg}")
 
+    conversion_pool.shutdown()
+
     # 生成批量处理报告
-    generate_batch_report(results, upload_dir, model, prompt_template, language)
+    generate_batch_report(results, upload_dir, model, prompt_template, language,
+                          wall_s=time.perf_counter() - batch_start, report_format=report_format)
+
+    return results
+
+
+def read_url_inputs(url_file: str, platforms: Optional[List[str]] = None) -> List[str]:
+    """
+    流式读取链接列表或聊天记录文件（'-' 表示标准输入），内容可以是链接、分享口令或任意混杂文本，# 开头的行忽略
+    :param platforms: 只提取这些平台的链接，None表示任意链接
+    :return: 按出现顺序提取出的链接（未去重）
+    """
+    if url_file == "-":
+        return list(iter_share_urls(sys.stdin, platforms, skip_comments=True))
+    with open(url_file, "r", encoding="utf-8") as f:
+        return list(iter_share_urls(f, platforms, skip_comments=True))
 
+
+def _start_downloads(urls: List[str], traces: Dict[str, JobTrace], done: "queue.Queue") -> threading.Thread:
+    """
+    在后台线程的事件循环上并发下载（并发数取 download.max_concurrent），
+    每完成一个就把 (url, 音频路径, 错误) 放入队列，主线程按完成顺序转录
+    """
+    async def download_all():
+        semaphore = asyncio.Semaphore(max(1, get_download_settings()["max_concurrent"]))
+
+        async def download_one(url):
+            async with semaphore:
+                try:
+                    with traces[url]:
+                        audio_path = await download_audio_async(url)
+                    done.put((url, audio_path, None))
+                except Exception as e:
+                    done.put((url, None, str(e)))
+
+        await asyncio.gather(*(download_one(url) for url in urls))
+
+    thread = threading.Thread(target=asyncio.run, args=(download_all(),), daemon=True)
+    thread.start()
+    return thread
+
+
+def process_url_batch(urls: List[str], model: str = "small", prompt_to_use: str = None,
+                      prompt_template: str = "default课堂笔记", language: str = None, provider: str = "deepseek",
+                      source: str = "-", report_format: str = "json") -> List[Dict[str, Any]]:
+    """
+    批量处理视频链接：去重后并发下载，下载完成的音频依次在同一进程中转录（模型只加载一次）、总结并保存
+    :param prompt_to_use: 自定义提示词，为空时使用 prompt_template（可用逗号分隔多个模板）
+    :param source: 链接来源（文件路径或 '-'），写入报告
+    :param report_format: 报告格式 json 或 csv（均另附可读的 txt 报告）
+    """
+    prompts = select_prompts(prompt_template, prompt_to_use)
+
+    urls, duplicates = unique_share_urls(urls)
+    if not urls:
+        print("⚠️  没有找到可处理的链接")
+        return []
+    print(f"🔗 共 {len(urls)} 个链接" + (f"（已去除 {duplicates} 个重复）" if duplicates else ""))
+
+    batch_start = time.perf_counter()
+    traces = {url: JobTrace(job_id=canonical_video_id(url)) for url in urls}
+    done = queue.Queue()
+    downloader = _start_downloads(urls, traces, done)
+    summaries_dir = Path("summaries")
+    summaries_dir.mkdir(exist_ok=True)
+
+    results = []
+    for i in range(1, len(urls) + 1):
+        url, audio_path, error = done.get()
+        trace = traces[url]
+        result = {"file": url, "url": url, "video_id": canonical_video_id(url), "status": "error",
+                  "transcript_path": None, "summary_path": None, "error": error}
+        if audio_path:
+            print(f"🎵 处理第 {i}/{len(urls)} 个链接: {url}")
+            try:
+                with trace:
+                    transcription = transcribe_audio_segments(audio_path, model=model, language=language)
+                    summaries = summarize_many(transcription["text"], prompts,
+                                               model=config_manager.get_default_model(), provider=provider,
+                                               segments=transcription["segments"],
+                                               language=transcription.get("language"))
+                    summary_path = summaries_dir / generate_filename(url)
+                    transcript_path = Path("transcriptions") / summary_path.name.replace("_总结.md", "_转录.txt")
+                    with span("write") as record:
+                        segments_path = Path(save_transcript(transcription, str(transcript_path)))
+                        record["bytes"] = transcript_path.stat().st_size + segments_path.stat().st_size
+                    summary_paths = list(save_summaries(summaries, str(summary_path), model=transcription["model"],
+                                                        transcript_path=str(transcript_path)).values())
+                result.update(status="success", transcript_path=str(transcript_path), segments_path=str(segments_path),
+                              summary_path=summary_paths[0], summary_paths=summary_paths,
+                              model_choice=transcription["model_choice"])
+                print(f"✅ 完成: {', '.join(summary_paths)}")
+            except Exception as e:
+                result["error"] = str(e)
+        if result["error"]:
+            print(f"❌ 处理失败 {url}: {result['error']}")
+        result.update(trace.to_dict())
+        results.append(result)
+
+    downloader.join()
+    generate_batch_report(results, source, model, prompt_template, language,
+                          wall_s=time.perf_counter() - batch_start, source_label="链接列表", report_format=report_format)
     return results
 
 
 def generate_batch_report(results: List[Dict[str, Any]], upload_dir: str, 
-                         model: str, prompt_template: str, language: str):
-    """生成批量处理报告"""
+                         model: str, prompt_template: str, language: str, wall_s: float = None,
+                         source_label: str = "上传目录", report_format: str = "json"):
+    """
+    生成批量处理报告（JSON 或 CSV，另附可读的 txt 报告）
+    :param source_label: 报告中输入来源的名称（上传目录 / 链接列表）
+    :param report_format: json 或 csv
+    """
     total = len(results)
     success_count = len([r for r in results if r["status"] == "success"])
     error_count = total - success_count
+    performance = rollup([r["timing"] for r in results if r.get("timing")], wall_s)
     
     report = {
         "batch_info": {
@@ -144,6 +346,7 @@ def generate_batch_report(results: List[Dict[str, Any]], upload_dir: str,
             "language": language,
             "timestamp": datetime.now().isoformat()
         },
+        "performance": performance,
         "results": results
     }
     
@@ -152,34 +355,63 @@ def generate_batch_report(results: List[Dict[str, Any]], upload_dir: str,
     reports_dir.mkdir(exist_ok=True)
     report_path = reports_dir / f"batch_report_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
     
-    with open(report_path, "w", encoding="utf-8") as f:
-        json.dump(report, f, ensure_ascii=False, indent=2)
+    if report_format == "csv":
+        report_path = report_path.with_suffix(".csv")
+        write_csv_report(results, report_path)
+    else:
+        atomic_write_json(report_path, report, indent=2)
     
     # 生成人类可读的报告
     readable_report_path = reports_dir / f"batch_report_{datetime.now().strftime('%Y%m%d_%H%M%S')}.txt"
-    with open(readable_report_path, "w", encoding="utf-8") as f:
+    with atomic_open(readable_report_path) as f:
         f.write("批量处理报告\n")
         f.write("="*50 + "\n")
-        f.write(f"上传目录: {upload_dir}\n")
+        f.write(f"{source_label}: {upload_dir}\n")
         f.write(f"处理时间: {report['batch_info']['timestamp']}\n")
         f.write(f"使用模型: {report['batch_info']['model']}\n")
         f.write(f"使用模板: {report['batch_info']['prompt_template']}\n")
         f.write(f"音频语言: {report['batch_info']['language'] if report['batch_info']['language'] else '自动检测'}\n")
         f.write(f"总文件数: {total}\n")
         f.write(f"成功处理: {success_count}\n")
-        f.write(f"处理失败: {error_count}\n\n")
+        f.write(f"处理失败: {error_count}\n")
+        f.write(f"总耗时: {performance['wall_s']:.1f} 秒，音频总时长: {performance['audio_seconds']:.1f} 秒\n")
+        if performance.get("rtf") is not None:
+            f.write(f"批量实时率: {performance['rtf']:.3f}（转录 {performance['transcribe_rtf']:.3f}）\n")
+        for stage_name, stage in performance["stages"].items():
+            f.write(f"  {stage_name}: {stage['duration_s']:.1f} 秒 / {stage['count']} 次\n")
+        f.write("\n")
         
         f.write("详细结果:\n")
         f.write("-"*30 + "\n")
         for result in results:
             status = "✓" if result["status"] == "success" else "✗"
-            f.write(f"{status} {os.path.basename(result['file'])}\n")
+            f.write(f"{status} {result.get('url') or os.path.basename(result['file'])}\n")
+            choice = result.get("model_choice")
+            if choice:
+                f.write(f"  模型: {choice['model']}（{choice['reason']}）\n")
+            timing = result.get("timing")
+            if timing:
+                f.write(f"   耗时: {timing['wall_s']:.1f} 秒，瓶颈阶段: {timing.get('bottleneck', '-')}\n")
             if result["status"] == "error":
                 f.write(f"   错误: {result['error']}\n")
             f.write("\n")
     
-    print(f"\n📊 批量处理完成!")
+    print("\n📊 批量处理完成!")
     print(f"📈 成功: {success_count}/{total} 个文件")
     if error_count > 0:
         print(f"⚠️  失败: {error_count} 个文件")
-    print(f"📋 报告已保存至: {readable_report_path}")
\ No newline at end of file
+    print(f"📋 报告已保存至: {readable_report_path}（{report_format.upper()}: {report_path}）")
+
+
+def write_csv_report(results: List[Dict[str, Any]], path: Path):
+    """每个输入一行：输入、状态、模型、耗时、输出路径与错误信息"""
+    with atomic_open(path, encoding="utf-8-sig", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["input", "status", "model", "wall_s", "bottleneck", "summary_path", "transcript_path", "error"])
+        for result in results:
+            timing = result.get("timing") or {}
+            choice = result.get("model_choice") or {}
+            writer.writerow([result.get("url") or result["file"], result["status"], choice.get("model", ""),
+                             timing.get("wall_s", ""), timing.get("bottleneck", ""),
+                             "; ".join(result.get("summary_paths") or filter(None, [result.get("summary_path")])),
+                             result.get("transcript_path") or "", result.get("error") or ""])
@@ -0,0 +1,145 @@
+"""
+batch_transcribe.py
+短音频批量转录 - 把多个短视频音频（抖音/TikTok 常见15-90秒）切成30秒梅尔窗口，
+拼成一个批次送入编码器并一起解码，省去逐个调用 transcribe 的固定开销和大量填充。
+
+每个窗口独立解码（不以前一窗口文本为提示、没有温度回退），适合短片段；
+超过 max_clip_seconds 的音频仍走 transcribe_audio_segments。
+"""
+
+import os
+from typing import List, Dict, Any, Optional
+
+from .instrumentation import span
+from .model_policy import AUTO_MODEL, resolve_model, observe_rtf
+from .segments import compact_segments
+from .transcribe import whisper_model_slot, transcribe_audio_segments, probe_duration
+
+# whisper 时间戳token的精度（秒）
+TIME_PRECISION = 0.02
+DEFAULT_BATCH_SIZE = 16
+# 超过该时长的音频不参与批量转录
+DEFAULT_MAX_CLIP_SECONDS = 120
+# 词之间不用空格分隔的语言，拼接各窗口文本时不加空格
+_NO_SPACE_LANGUAGES = {"zh", "yue", "ja", "th", "lo", "my", "km", "bo"}
+
+
+def _tokens_to_segments(tokens: List[int], tokenizer, window_seconds: float, avg_logprob: Optional[float]) -> List[Dict[str, Any]]:
+    """
+    按时间戳token把解码结果切成分段：<|0.00|> 文本 <|2.40|><|2.40|> 文本 <|5.00|>
+    :param window_seconds: 窗口内实际音频时长，用于补齐没有结束时间戳的最后一段
+    """
+    segments = []
+    start = None
+    last_end = 0.0
+    text_tokens: List[int] = []
+    for token in tokens:
+        if token >= tokenizer.timestamp_begin:
+            timestamp = (token - tokenizer.timestamp_begin) * TIME_PRECISION
+            if start is not None and text_tokens:
+                segments.append({"start": start, "end": timestamp, "text": tokenizer.decode(text_tokens),
+                                 "avg_logprob": avg_logprob})
+                start, last_end, text_tokens = None, timestamp, []
+            else:
+                start = timestamp
+        elif token < tokenizer.eot:
+            text_tokens.append(token)
+    if text_tokens:
+        segments.append({"start": last_end if start is None else start, "end": window_seconds, "text": tokenizer.decode(text_tokens),
+                         "avg_logprob": avg_logprob})
+    return segments
+
+
+def transcribe_clips_batched(audio_paths: List[str], model: str = "small", language: Optional[str] = None,
+                             batch_size: int = DEFAULT_BATCH_SIZE,
+                             max_clip_seconds: float = DEFAULT_MAX_CLIP_SECONDS) -> List[Dict[str, Any]]:
+    """
+    批量转录多个短音频
+    :param audio_paths: 音频文件路径列表
+    :param model: whisper模型大小，auto表示按短音频的平均时长为批次自动选择（逐个转录的音频各自按时长选择）
+    :param language: 指定语言，None表示每个窗口各自检测
+    :param batch_size: 每批送入编码器的30秒窗口数
+    :param max_clip_seconds: 超过该时长的音频逐个转录
+    :return: 与 audio_paths 顺序一致的结果，格式同 transcribe_audio_segments；失败的项为 {'error': 错误信息}
+    """
+    try:
+        import torch
+        import whisper
+        from whisper.audio import N_SAMPLES, SAMPLE_RATE
+        from whisper.tokenizer import get_tokenizer
+    except ImportError:
+        raise RuntimeError("未安装 whisper 库，请运行: pip install openai-whisper")
+
+    results: List[Optional[Dict[str, Any]]] = [None] * len(audio_paths)
+    durations = {}
+    short = []
+    for i, path in enumerate(audio_paths):
+        durations[i] = probe_duration(path)
+        if durations[i] is not None and durations[i] <= max_clip_seconds:
+            short.append(i)
+
+    known = [durations[i] for i in short]
+    model_choice = resolve_model(model, sum(known) / len(known) if known else None, language)
+    batch_model = model_choice["model"]
+    if short and model_choice["requested"] == AUTO_MODEL:
+        print(f"自动选择模型 {batch_model}: {model_choice['reason']}")
+
+    if short:
+        print(f"批量转录 {len(short)} 个短音频（模型 {batch_model}，每批 {batch_size} 个窗口）...")
+        with whisper_model_slot(batch_model) as whisper_model:
+            n_mels = whisper_model.dims.n_mels
+            windows = []  # (结果下标, 窗口起点秒数, 窗口时长, 梅尔频谱)
+            for i in short:
+                try:
+                    audio = whisper.load_audio(audio_paths[i])
+                except Exception as e:
+                    results[i] = {"error": f"音频解码失败: {e}"}
+                    continue
+                durations[i] = len(audio) / SAMPLE_RATE
+                for offset in range(0, max(len(audio), 1), N_SAMPLES):
+                    chunk = audio[offset:offset + N_SAMPLES]
+                    mel = whisper.log_mel_spectrogram(whisper.pad_or_trim(chunk), n_mels=n_mels)
+                    windows.append((i, offset / SAMPLE_RATE, len(chunk) / SAMPLE_RATE, mel))
+
+            options = whisper.DecodingOptions(language=language, without_timestamps=False,
+                                              fp16=whisper_model.device.type == "cuda")
+            decoded = {}
+            audio_seconds = sum(durations[i] for i in short if results[i] is None)
+            with span("transcribe", model=batch_model, batched=True, clips=len(short),
+                      bytes=sum(os.path.getsize(audio_paths[i]) for i in short)) as record:
+                for start in range(0, len(windows), batch_size):
+                    batch = windows[start:start + batch_size]
+                    mels = torch.stack([w[3] for w in batch]).to(whisper_model.device)
+                    for window, result in zip(batch, whisper.decode(whisper_model, mels, options)):
+                        decoded.setdefault(window[0], []).append((window, result))
+                record["audio_seconds"] = round(audio_seconds, 2)
+            observe_rtf(batch_model, record["audio_seconds"], record["duration_s"])
+
+            for i, parts in decoded.items():
+                segments = []
+                detected = language or parts[0][1].language
+                tokenizer = get_tokenizer(whisper_model.is_multilingual, num_languages=whisper_model.num_languages,
+                                          language=detected, task="transcribe")
+                for (_, offset, length, _), result in parts:
+                    raw = _tokens_to_segments(result.tokens, tokenizer, length, result.avg_logprob)
+                    segments.extend(compact_segments(raw, offset=offset))
+                separator = "" if detected in _NO_SPACE_LANGUAGES else " "
+                results[i] = {
+                    "text": separator.join(result.text.strip() for _, result in parts if result.text.strip()),
+                    "language": detected,
+                    "duration": round(durations[i], 2),
+                    "segments": segments,
+                    "model": batch_model,
+                    "model_choice": model_choice,
+                    "language_id": None,
+                }
+        print("批量转录完成！")
+
+    # 时长未知或较长的音频逐个转录，按调用方传入的模型（auto 时按各自时长选择）
+    for i, path in enumerate(audio_paths):
+        if results[i] is None:
+            try:
+                results[i] = transcribe_audio_segments(path, model=model, language=language)
+            except Exception as e:
+                results[i] = {"error": str(e)}
+    return results
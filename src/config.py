@@ -5,8 +5,34 @@ config.py
 
 import json
 import os
+import threading
+import time
 from pathlib import Path
-from typing import Optional, Dict, Any
+from types import MappingProxyType
+from typing import Optional, Dict, Any, Mapping, Callable
+
+from .output_writer import atomic_write_json
+
+# config.json 保存API密钥，只允许文件所有者读写
+CONFIG_FILE_MODE = 0o600
+
+
+def freeze(value: Any) -> Any:
+    """把配置转换为只读结构：字典 -> 只读映射，列表 -> 元组"""
+    if isinstance(value, Mapping):
+        return MappingProxyType({key: freeze(item) for key, item in value.items()})
+    if isinstance(value, (list, tuple)):
+        return tuple(freeze(item) for item in value)
+    return value
+
+
+def thaw(value: Any) -> Any:
+    """freeze 的逆过程，得到可修改、可序列化为JSON的副本"""
+    if isinstance(value, Mapping):
+        return {key: thaw(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [thaw(item) for item in value]
+    return value
 
 
 class ConfigManager:
@@ -14,6 +40,8 @@ class ConfigManager:
 
     def __init__(self, config_file: str = "config.json"):
         self.config_file = Path(config_file)
+        # 写入方（Web 界面的多个请求线程、文件监视线程）串行修改；读取方直接使用不可变快照，不加锁
+        self._lock = threading.RLock()
         self.default_config = {
             "api_keys": {
                 "deepseek": "",
@@ -22,32 +50,107 @@ class ConfigManager:
                 "tikhub": "i5gnAt0P/Gu6rzahD7Cm+hGNa2SpcsVk6gaAknuFDOLmi3iiO22pehKWNw=="  # TikHub API密钥
             },
             "default_model": "deepseek-chat",
+            "default_provider": "deepseek",
             "default_language": "auto",
+            "local_llm": {
+                "base_url": "http://127.0.0.1:8080/v1",  # 任意OpenAI兼容服务（llama.cpp server、vLLM、Ollama）
+                "model": "local-model",
+                "api_key": "",
+                "max_concurrency": 2,
+                "context_length": 8192,
+                "timeout": 600
+            },
+            "audio_conversion": {
+                "threads": 0,  # 每个ffmpeg进程的线程数，0表示由ffmpeg自动决定
+                "max_workers": 2  # 批量转换时并发的ffmpeg进程数
+            },
+            "download": {
+                "timeout_seconds": 1800,  # 单个下载任务（含音频提取）的总超时，0表示不限制
+                "max_concurrent": 4,  # 批量下载时同时进行的下载数
+                "connections": 4,  # 单个文件按 Range 分段并发下载的最大连接数
+                "min_segment_mb": 4,  # 每个分段的最小大小（MB），小文件不拆分
+                "retries": 3  # 分段连接中断后的续传重试次数
+            },
+            "transcription": {
+                "stream_threshold_seconds": 1800,  # 超过该时长的音频使用流式转录（0表示始终流式）
+                "stream_window_seconds": 600  # 流式转录每个窗口的时长，决定峰值内存
+            },
+            "summarize": {
+                "max_concurrency": 1  # 托管API（deepseek/openai/anthropic）同时进行的请求数（分段与多模板共享），默认串行，账号限额允许时可调大
+            },
+            "transcript_cleanup": {
+                "enabled": True,  # 摘要前清理转录文本（不影响保存的转录与字幕）
+                "collapse_repeats": True,  # 折叠静音处幻觉出的重复循环
+                "min_repeats": 3,  # 同一短语连续出现至少几次才折叠
+                "remove_fillers": True,  # 删除独立出现的语气词（嗯、呃、um 等）
+                "to_simplified": True  # 中文繁体转简体（需安装 opencc）
+            },
+            "language_id": {
+                "enabled": True,  # 未指定语言时先做语言识别预检
+                "model": "tiny",
+                "windows": 3  # 在音频中均匀抽取的30秒窗口数
+            },
+            "model_policy": {
+                "base_model": "small",  # 正常负载下使用的模型（--model auto 时生效）
+                "min_model": "tiny",  # 高负载时最多降级到
+                "max_model": "medium",  # 空闲时最多升级到
+                "min_model_non_english": "base",  # 非英语音频不低于该模型
+                "sla_seconds": 1800,  # 目标周转时间（秒）
+                "idle_upgrade": True
+            },
             "external_apis": {
                 "douyin_api_endpoint": "https://api.douyin.wtf"
             },
             "output_settings": {
                 "transcription_folder": "transcriptions",
                 "summary_folder": "summaries",
-                "download_folder": "downloads"
+                "download_folder": "downloads",
+                "fsync": True,  # 原子替换前把数据刷到磁盘，断电后也不会留下半个文件
+                "compress_segments_min_mb": 0  # 分段JSON超过该大小（MB）时gzip压缩保存，0表示不压缩
+            },
+            "config_reload": {
+                "enabled": True,  # Web 界面运行时监视 config.json，修改后自动生效，无需重启
+                "interval_seconds": 2  # 检查文件修改时间的间隔
             }
         }
-        self.config = self.load_config()
+        self._file_stamp = None
+        self._snapshot = freeze(self.load_config())
+        self._watcher = None
+
+    @property
+    def config(self) -> Mapping[str, Any]:
+        """
+        当前配置快照（只读，嵌套字典为只读映射、列表为元组）。
+        修改配置会整体替换为新的快照，读取方无需加锁：同一个快照在使用期间不会变化
+        """
+        return self._snapshot
+
+    def _file_state(self):
+        """配置文件的 (mtime, 大小)，用于判断文件是否被外部修改；不存在时为 None"""
+        try:
+            stat = self.config_file.stat()
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
 
     def load_config(self) -> Dict[str, Any]:
         """加载配置文件，如果不存在则创建默认配置"""
         if self.config_file.exists():
             try:
-                with open(self.config_file, 'r', encoding='utf-8') as f:
-                    loaded_config = json.load(f)
-                    # 合并默认配置，确保新字段存在
-                    merged_config = self._merge_configs(self.default_config, loaded_config)
-                    return merged_config
+                return self._read_config_file()
             except Exception as e:
                 print(f"配置文件加载失败，使用默认配置: {e}")
 
         # 返回默认配置
-        return self.default_config.copy()
+        return thaw(freeze(self.default_config))
+
+    def _read_config_file(self) -> Dict[str, Any]:
+        """读取配置文件并合并默认配置（确保新字段存在），同时记录文件状态"""
+        stamp = self._file_state()
+        with open(self.config_file, 'r', encoding='utf-8') as f:
+            loaded_config = json.load(f)
+        self._file_stamp = stamp
+        return self._merge_configs(thaw(freeze(self.default_config)), loaded_config)
 
     def _merge_configs(self, default: Dict, loaded: Dict) -> Dict:
         """合并默认配置和已加载的配置"""
@@ -61,35 +164,116 @@ class ConfigManager:
 
         return result
 
+    def reload_if_changed(self) -> bool:
+        """
+        配置文件被外部修改（手动编辑、setup_api_keys.py、另一个进程）时重新加载并替换快照；
+        文件内容无效时保留当前配置
+        :return: 是否重新加载
+        """
+        stamp = self._file_state()
+        if stamp is None or stamp == self._file_stamp:
+            return False
+        with self._lock:
+            if self._file_state() == self._file_stamp:
+                return False
+            try:
+                self._snapshot = freeze(self._read_config_file())
+            except Exception as e:
+                # 记下这次的文件状态，文件再次变化前不重复报错
+                self._file_stamp = stamp
+                print(f"配置文件重新加载失败，继续使用当前配置: {e}")
+                return False
+        print(f"配置文件已变化，重新加载: {self.config_file}")
+        return True
+
+    def start_watching(self, interval: Optional[float] = None):
+        """
+        启动后台线程轮询配置文件的修改时间，变化时自动重新加载（长时间运行的 Web 界面使用）
+        :param interval: 轮询间隔（秒），None 表示按 config_reload.interval_seconds 设置
+        """
+        settings = self._snapshot.get("config_reload", {})
+        if not settings.get("enabled", True) or (self._watcher and self._watcher.is_alive()):
+            return
+        interval = interval or float(settings.get("interval_seconds") or 2)
+
+        def watch():
+            while True:
+                time.sleep(interval)
+                try:
+                    self.reload_if_changed()
+                except Exception as e:
+                    print(f"检查配置文件失败: {e}")
+
+        self._watcher = threading.Thread(target=watch, name="config-watcher", daemon=True)
+        self._watcher.start()
+
     def save_config(self):
-        """保存配置到文件"""
+        """保存配置到文件（写入临时文件后原子替换，崩溃或并发保存不会留下截断的 config.json）"""
         try:
-            with open(self.config_file, 'w', encoding='utf-8') as f:
-                json.dump(self.config, f, ensure_ascii=False, indent=2)
+            with self._lock:
+                atomic_write_json(self.config_file, thaw(self._snapshot), fsync=True, file_mode=CONFIG_FILE_MODE, indent=2)
+                # 自己写入的修改不触发重新加载
+                self._file_stamp = self._file_state()
             return True
         except Exception as e:
             print(f"配置文件保存失败: {e}")
             return False
 
+    def _update(self, mutate: Callable[[Dict[str, Any]], Any]):
+        """在锁内基于当前快照的可变副本修改配置，整体替换快照后保存"""
+        with self._lock:
+            config = thaw(self._snapshot)
+            if mutate(config) is False:
+                return
+            self._snapshot = freeze(config)
+            self.save_config()
+
     def set_api_key(self, provider: str, api_key: str):
         """设置API密钥"""
-        if provider in self.config["api_keys"]:
-            self.config["api_keys"][provider] = api_key
-            self.save_config()
+        def mutate(config):
+            if provider not in config["api_keys"]:
+                return False
+            config["api_keys"][provider] = api_key
+        self._update(mutate)
 
     def get_api_key(self, provider: str) -> Optional[str]:
         """获取API密钥"""
-        return self.config["api_keys"].get(provider)
+        return self._snapshot["api_keys"].get(provider)
 
     def set_default_model(self, model: str):
         """设置默认模型"""
-        self.config["default_model"] = model
-        self.save_config()
+        self._update(lambda config: config.update(default_model=model))
+
+    def set_default_provider(self, provider: str):
+        """设置默认AI服务提供商"""
+        self._update(lambda config: config.update(default_provider=provider))
+
+    def update_section(self, section: str, values: Dict[str, Any]):
+        """合并更新某一节配置（如 local_llm、external_apis）并保存"""
+        self._update(lambda config: config.setdefault(section, {}).update(values))
 
     def get_default_model(self) -> str:
         """获取默认模型"""
         return self.config["default_model"]
 
+    def get_default_provider(self) -> str:
+        """获取默认AI服务提供商"""
+        return self.config.get("default_provider") or "deepseek"
+
+    def get_local_llm_config(self) -> Dict[str, Any]:
+        """获取本地OpenAI兼容服务配置，环境变量优先"""
+        local_config = dict(self.default_config["local_llm"])
+        local_config.update(self.config.get("local_llm", {}))
+        env_overrides = {
+            "base_url": os.getenv("LOCAL_LLM_BASE_URL"),
+            "model": os.getenv("LOCAL_LLM_MODEL"),
+            "api_key": os.getenv("LOCAL_LLM_API_KEY"),
+        }
+        for key, value in env_overrides.items():
+            if value:
+                local_config[key] = value
+        return local_config
+
 
 # 全局配置实例
 config_manager = ConfigManager()
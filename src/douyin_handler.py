@@ -3,70 +3,64 @@ douyin_handler.py
 负责处理抖音视频链接，使用TikHub API下载视频音频。
 """
 
+import asyncio
+import hashlib
 import os
-import re
-import requests
+import sys
 import tempfile
 from pathlib import Path
 from urllib.parse import urlparse
-import subprocess
-from .utils import safe_filename
+from .url_resolver import resolve_url, find_url, iter_share_urls, unique_share_urls
 from .config import config_manager
+from .ffmpeg_engine import convert_async
+from .instrumentation import span
+from .async_io import get_json, download_file, get_download_settings, RequestFailed, API_TIMEOUT, DOWNLOAD_TIMEOUT
+
+
+DOUYIN_PLATFORMS = ("douyin", "tiktok")
 
 
 def is_douyin_url(url: str) -> bool:
     """
-    判断是否为抖音/TikTok/Bilibili链接
+    判断是否为抖音/TikTok链接（或包含此类链接的分享文本）
     """
-    url_lower = url.lower()
-    return (
-        'douyin.com' in url_lower or
-        'tiktok.com' in url_lower or
-        'v.douyin.com' in url_lower or
-        'vm.tiktok.com' in url_lower or
-        'vt.tiktok.com' in url_lower
-    )
+    return resolve_url(url)["platform"] in DOUYIN_PLATFORMS
 
 
 def clean_douyin_url(url: str) -> str:
     """
-    清理抖音URL，移除多余的参数和格式化，从分享文本中提取URL
+    从分享文本中提取第一个抖音/TikTok链接，没有则返回原文
     """
-    # 移除抖音分享口令等多余内容
-    # 匹配抖音分享链接格式
-    dy_pattern = r'(https?://[^\s\'\"]*douyin\.com[^\s\'\"]*)'
-    vm_pattern = r'(https?://[^\s\'\"]*v\.douyin\.com[^\s\'\"]*)'
-    tiktok_pattern = r'(https?://[^\s\'\"]*tiktok\.com[^\s\'\"]*)'
-    vm_tiktok_pattern = r'(https?://[^\s\'\"]*vm\.tiktok\.com[^\s\'\"]*)'
-    vt_tiktok_pattern = r'(https?://[^\s\'\"]*vt\.tiktok\.com[^\s\'\"]*)'
-
-    patterns = [dy_pattern, vm_pattern, tiktok_pattern, vm_tiktok_pattern, vt_tiktok_pattern]
-
-    for pattern in patterns:
-        match = re.search(pattern, url)
-        if match:
-            extracted_url = match.group(1)
-            # 进一步清理URL，移除可能的尾随字符
-            extracted_url = extracted_url.split()[0]  # 取第一个URL
-            extracted_url = extracted_url.split('|')[0]  # 取第一部分
-            return extracted_url.strip()
+    return find_url(url, DOUYIN_PLATFORMS) or url
 
-    # 如果没匹配到，返回原始URL
-    return url
 
-
-def get_douyin_video_data(video_url: str, api_key: str = None) -> dict:
+def extract_douyin_share_urls(source: str) -> list:
     """
-    通过TikHub API获取抖音视频数据
+    从粘贴的聊天记录等大段文本文件（'-' 表示标准输入）中一次扫描提取全部抖音/TikTok链接，按作品去重
+    :return: 去重后的链接列表，可直接交给 batch_process_douyin_urls
     """
-    # 如果没有提供API密钥，则从环境变量或配置中获取
-    if api_key is None:
-        api_key = os.getenv('TIKHUB_API_KEY')  # 优先从环境变量获取
-        if not api_key:
-            api_key = config_manager.config.get("api_keys", {}).get("tikhub")  # 备用从配置获取
-    
+    if source == "-":
+        urls, duplicates = unique_share_urls(iter_share_urls(sys.stdin, DOUYIN_PLATFORMS))
+    else:
+        with open(source, "r", encoding="utf-8") as f:
+            urls, duplicates = unique_share_urls(iter_share_urls(f, DOUYIN_PLATFORMS))
+    print(f"提取到 {len(urls)} 个抖音/TikTok链接" + (f"（已去除 {duplicates} 个重复）" if duplicates else ""))
+    return urls
+
+
+def get_tikhub_api_key(api_key: str = None) -> str:
+    """获取TikHub API密钥：参数 > 环境变量 TIKHUB_API_KEY > 配置"""
+    api_key = api_key or os.getenv('TIKHUB_API_KEY') or config_manager.config.get("api_keys", {}).get("tikhub")
     if not api_key:
         raise ValueError("未配置TikHub API密钥，请设置环境变量TIKHUB_API_KEY或在API配置中设置")
+    return api_key
+
+
+async def fetch_douyin_video_data(video_url: str, api_key: str = None) -> dict:
+    """
+    通过TikHub API获取抖音视频数据（异步）
+    """
+    api_key = get_tikhub_api_key(api_key)
 
     # 使用TikHub抖音App V3 API端点 - 根据分享链接获取视频数据
     api_url = "https://api.tikhub.io/api/v1/douyin/app/v3/fetch_one_video_by_share_url"
@@ -84,40 +78,31 @@ def get_douyin_video_data(video_url: str, api_key: str = None) -> dict:
 
     try:
         print(f"正在调用TikHub抖音App V3 API获取视频信息: {api_url}")
-        response = requests.get(api_url, params=params, headers=headers, timeout=30)
-        response.raise_for_status()
-
-        data = response.json()
-
-        # 检查API响应是否成功
-        if response.status_code != 200 or data.get("code") != 200:
-            error_msg = data.get('message', f'API返回错误，状态码: {response.status_code}')
-            print(f"TikHub API返回错误: {error_msg}")
-            raise ValueError(f"TikHub API返回错误: {error_msg}")
-
-        return data
-    except requests.exceptions.RequestException as e:
+        data = await get_json(api_url, params=params, headers=headers, timeout=API_TIMEOUT)
+    except RequestFailed as e:
         print(f"获取抖音视频数据失败: {e}")
         raise
-    except ValueError as e:
-        print(f"解析抖音视频数据失败: {e}")
-        raise
-    except Exception as e:
-        print(f"获取抖音视频数据时发生未知错误: {e}")
-        raise
 
+    # 检查API响应是否成功
+    if data.get("code") != 200:
+        error_msg = data.get('message', 'API返回错误')
+        print(f"TikHub API返回错误: {error_msg}")
+        raise ValueError(f"TikHub API返回错误: {error_msg}")
+    return data
 
-def download_douyin_video(video_url: str, output_dir: str = "downloads", api_key: str = None) -> str:
+
+def get_douyin_video_data(video_url: str, api_key: str = None) -> dict:
     """
-    使用TikHub API下载抖音视频，提取音频
+    通过TikHub API获取抖音视频数据（同步接口）
     """
-    os.makedirs(output_dir, exist_ok=True)
+    return asyncio.run(fetch_douyin_video_data(video_url, api_key))
 
-    # 获取视频数据
-    print(f"正在获取抖音视频信息: {video_url}")
-    video_data = get_douyin_video_data(video_url, api_key)
 
-    # 提取视频下载链接
+def extract_play_url(video_data: dict) -> str:
+    """
+    从TikHub API响应中提取视频下载链接
+    :raises ValueError: 响应中没有可用的下载链接
+    """
     video_url_direct = None
 
     # 根据TikHub抖音App V3 API响应格式提取视频URL
@@ -176,97 +161,122 @@ def download_douyin_video(video_url: str, output_dir: str = "downloads", api_key
 
     if not video_url_direct:
         raise ValueError(f"未能从API响应中获取视频下载链接: {video_data}")
+    return video_url_direct
+
+
+async def download_douyin_video_async(video_url: str, output_dir: str = "downloads", api_key: str = None) -> str:
+    """
+    使用TikHub API下载抖音视频，提取音频（异步；任务取消时中断下载并结束ffmpeg）
+    """
+    os.makedirs(output_dir, exist_ok=True)
+
+    # 获取视频数据
+    print(f"正在获取抖音视频信息: {video_url}")
+    video_data = await fetch_douyin_video_data(video_url, api_key)
+    video_url_direct = extract_play_url(video_data)
 
     # 下载视频
     print(f"获取到视频下载链接，开始下载: {video_url_direct[:50]}...")
-    temp_video_path = os.path.join(output_dir, f"douyin_temp_{abs(hash(video_url)) % 10000}.mp4")
+    # 文件名由链接稳定生成，下载中断后再次处理同一链接可以续传
+    file_id = hashlib.sha1(video_url.encode("utf-8")).hexdigest()[:12]
+    temp_video_path = os.path.join(output_dir, f"douyin_temp_{file_id}.mp4")
 
-    # 下载视频
-    response = requests.get(video_url_direct, stream=True, timeout=60)
-    response.raise_for_status()
-
-    with open(temp_video_path, 'wb') as f:
-        for chunk in response.iter_content(chunk_size=8192):
-            f.write(chunk)
-
-    print(f"视频下载完成: {temp_video_path}")
-
-    # 提取音频
-    print("正在提取音频...")
-    audio_path = os.path.join(output_dir, f"douyin_{abs(hash(video_url)) % 10000}.mp3")
-
-    # 使用ffmpeg提取音频
-    cmd = [
-        "ffmpeg",
-        "-i", temp_video_path,
-        "-vn",  # 不包含视频
-        "-acodec", "mp3",  # 音频编码为mp3
-        "-ar", "44100",  # 音频采样率
-        "-ac", "2",  # 音频通道数
-        "-b:a", "192k",  # 音频比特率
-        "-y",  # 覆盖输出文件
-        audio_path
-    ]
-
-    result = subprocess.run(cmd, capture_output=True, text=True)
-
-    if result.returncode != 0:
-        print(f"音频提取失败: {result.stderr}")
-        # 删除临时视频文件
+    try:
+        with span("cdn_download") as record:
+            stats = await download_file(video_url_direct, temp_video_path, timeout=DOWNLOAD_TIMEOUT)
+            record.update(stats)
+        print(f"视频下载完成: {temp_video_path}（{stats['bytes'] / 1024 / 1024:.1f} MB，"
+              f"{stats['mb_per_s']} MB/s，{stats['connections']} 路并发）")
+
+        # 提取音频
+        print("正在提取音频...")
+        # 抖音视频音轨为AAC，直接流复制到m4a，无需重新编码（Whisper可直接解码）
+        audio_path = os.path.join(output_dir, f"douyin_{file_id}.m4a")
+        try:
+            await convert_async(temp_video_path, audio_path, source_codec="aac")
+        except (RuntimeError, OSError) as e:
+            print(f"音频提取失败: {e}")
+            raise RuntimeError(f"音频提取失败: {e}")
+    finally:
+        # 删除临时视频文件；未下载完的 .part 保留用于续传
         if os.path.exists(temp_video_path):
             os.remove(temp_video_path)
-        raise RuntimeError(f"音频提取失败: {result.stderr}")
 
     print(f"音频提取完成: {audio_path}")
+    return audio_path
 
-    # 删除临时视频文件
-    if os.path.exists(temp_video_path):
-        os.remove(temp_video_path)
 
-    return audio_path
+def download_douyin_video(video_url: str, output_dir: str = "downloads", api_key: str = None) -> str:
+    """
+    使用TikHub API下载抖音视频，提取音频（同步接口）
+    """
+    return asyncio.run(download_douyin_video_async(video_url, output_dir, api_key))
 
 
-def process_douyin_url(url: str, output_dir: str = "downloads", api_key: str = None) -> str:
+async def process_douyin_url_async(url: str, output_dir: str = "downloads", api_key: str = None) -> str:
     """
-    处理抖音URL的主函数
+    处理抖音URL的主函数（异步）
     """
     if not is_douyin_url(url):
         raise ValueError(f"不是有效的抖音/TikTok链接: {url}")
 
-    return download_douyin_video(url, output_dir, api_key)
+    return await download_douyin_video_async(url, output_dir, api_key)
+
 
+def process_douyin_url(url: str, output_dir: str = "downloads", api_key: str = None) -> str:
+    """
+    处理抖音URL的主函数
+    """
+    return asyncio.run(process_douyin_url_async(url, output_dir, api_key))
 
-def batch_process_douyin_urls(urls: list, output_dir: str = "downloads", api_key: str = None) -> list:
+
+async def download_douyin_urls(urls: list, output_dir: str = "downloads", api_key: str = None,
+                               max_concurrent: int = 4) -> list:
     """
-    批量处理抖音URL的函数
+    在同一个事件循环上并发下载多个抖音视频的音频
+    :param max_concurrent: 同时进行的下载数
+    :return: 与urls顺序一致的结果列表
     """
-    results = []
-    
-    for i, url in enumerate(urls, 1):
-        print(f"正在处理第 {i}/{len(urls)} 个视频: {url[:50]}...")
-        try:
+    semaphore = asyncio.Semaphore(max(1, max_concurrent))
+
+    async def download_one(i: int, url: str) -> dict:
+        async with semaphore:
+            print(f"正在处理第 {i}/{len(urls)} 个视频: {url[:50]}...")
             # 清理URL
             cleaned_url = clean_douyin_url(url)
-            print(f"  清理后URL: {cleaned_url}")
-            
-            # 处理单个URL
-            audio_path = process_douyin_url(cleaned_url, output_dir, api_key)
-            results.append({
-                "url": url,
-                "cleaned_url": cleaned_url,
-                "audio_path": audio_path,
-                "status": "success"
-            })
-            print(f"  ✓ 成功: {audio_path}")
-        except Exception as e:
-            error_msg = str(e)
-            print(f"  ✗ 失败: {error_msg}")
-            results.append({
-                "url": url,
-                "cleaned_url": clean_douyin_url(url) if is_douyin_url(url) else url,
-                "audio_path": None,
-                "status": "error",
-                "error": error_msg
-            })
-    
+            try:
+                audio_path = await process_douyin_url_async(cleaned_url, output_dir, api_key)
+                print(f"  ✓ 成功: {audio_path}")
+                return {"url": url, "cleaned_url": cleaned_url, "audio_path": audio_path, "status": "success"}
+            except Exception as e:
+                error_msg = str(e)
+                print(f"  ✗ 失败 ({cleaned_url}): {error_msg}")
+                return {"url": url, "cleaned_url": cleaned_url, "audio_path": None, "status": "error",
+                        "error": error_msg}
+
+    return list(await asyncio.gather(*(download_one(i, url) for i, url in enumerate(urls, 1))))
+
+
+def batch_process_douyin_urls(urls: list, output_dir: str = "downloads", api_key: str = None,
+                              transcribe_model: str = None, language: str = None) -> list:
+    """
+    批量处理抖音URL的函数（下载在同一个事件循环上并发进行，并发数取配置 download.max_concurrent）
+    :param transcribe_model: 指定时在下载完成后批量转录全部音频（短视频多个窗口合并为一个编码器批次）
+    :param language: 转录语言，None表示自动检测
+    """
+    max_concurrent = get_download_settings()["max_concurrent"]
+    results = asyncio.run(download_douyin_urls(urls, output_dir, api_key, max_concurrent))
+
+    if transcribe_model:
+        from .batch_transcribe import transcribe_clips_batched
+        downloaded = [r for r in results if r["status"] == "success"]
+        transcriptions = transcribe_clips_batched([r["audio_path"] for r in downloaded],
+                                                  model=transcribe_model, language=language)
+        for item, transcription in zip(downloaded, transcriptions):
+            if "error" in transcription:
+                item["status"] = "error"
+                item["error"] = f"转录失败: {transcription['error']}"
+            else:
+                item["transcription"] = transcription
+
     return results
\ No newline at end of file
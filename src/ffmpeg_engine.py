@@ -0,0 +1,150 @@
+"""
+ffmpeg_engine.py
+基于 ffmpeg 子进程的音频转换引擎 - 一条命令完成转码，能流复制时不重新编码。
+"""
+
+import os
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Optional, List, Dict, Any
+
+from .config import config_manager
+from .async_io import run_process
+
+# 目标扩展名 -> (ffmpeg编码器, ffprobe中对应的codec_name)
+TARGET_CODECS = {
+    ".mp3": ("libmp3lame", "mp3"),
+    ".wav": ("pcm_s16le", "pcm_s16le"),
+    ".flac": ("flac", "flac"),
+    ".m4a": ("aac", "aac"),
+    ".aac": ("aac", "aac"),
+    ".ogg": ("libvorbis", "vorbis"),
+}
+
+
+def get_conversion_settings() -> Dict[str, int]:
+    """读取转换设置：threads 为每个ffmpeg进程的线程数（0表示由ffmpeg决定），max_workers 为并发进程数"""
+    settings = {"threads": 0, "max_workers": max(1, (os.cpu_count() or 2) // 2)}
+    settings.update(config_manager.config.get("audio_conversion", {}))
+    if os.getenv("FFMPEG_THREADS"):
+        settings["threads"] = int(os.getenv("FFMPEG_THREADS"))
+    return settings
+
+
+def build_convert_command(input_path: str, output_path: str, source_codec: Optional[str] = None,
+                          sample_rate: Optional[int] = None, channels: Optional[int] = None,
+                          threads: Optional[int] = None, bitrate: Optional[str] = None) -> List[str]:
+    """
+    生成ffmpeg转换命令；源编码与目标一致且不需要重采样时使用流复制
+    :param source_codec: 源音频编码（来自ffprobe），None表示未知
+    :param sample_rate: 输出采样率
+    :param channels: 输出声道数
+    :param threads: ffmpeg线程数
+    :param bitrate: 输出码率（如 '192k'），仅对有损编码有效
+    """
+    suffix = Path(output_path).suffix.lower()
+    encoder, target_codec = TARGET_CODECS.get(suffix, TARGET_CODECS[".mp3"])
+
+    cmd = ["ffmpeg", "-hide_banner", "-loglevel", "error", "-nostdin", "-y"]
+    if threads:
+        cmd += ["-threads", str(threads)]
+    cmd += ["-i", input_path, "-vn", "-map", "0:a:0"]
+
+    if source_codec == target_codec and not sample_rate and not channels:
+        cmd += ["-c:a", "copy"]
+    else:
+        cmd += ["-c:a", encoder]
+        if sample_rate:
+            cmd += ["-ar", str(sample_rate)]
+        if channels:
+            cmd += ["-ac", str(channels)]
+        if bitrate and encoder not in ("pcm_s16le", "flac"):
+            cmd += ["-b:a", bitrate]
+    cmd.append(output_path)
+    return cmd
+
+
+def is_stream_copy(cmd: List[str]) -> bool:
+    """命令是否为流复制"""
+    return "copy" in cmd and cmd[cmd.index("copy") - 1] == "-c:a"
+
+
+def convert(input_path: str, output_path: str, source_codec: Optional[str] = None,
+            sample_rate: Optional[int] = None, channels: Optional[int] = None,
+            threads: Optional[int] = None, bitrate: Optional[str] = None) -> str:
+    """
+    执行一次转换
+    :return: 输出文件路径
+    :raises RuntimeError: ffmpeg 未安装或转换失败
+    """
+    if not os.path.exists(input_path):
+        raise FileNotFoundError(f"输入音频文件不存在: {input_path}")
+    output_dir = os.path.dirname(output_path)
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+    if threads is None:
+        threads = get_conversion_settings()["threads"]
+
+    cmd = build_convert_command(input_path, output_path, source_codec, sample_rate, channels, threads, bitrate)
+    try:
+        result = subprocess.run(cmd, capture_output=True, text=True)
+    except FileNotFoundError:
+        raise RuntimeError("未找到 ffmpeg，请先安装 ffmpeg 并确保其在 PATH 中")
+    if result.returncode != 0 and is_stream_copy(cmd):
+        # 容器不支持直接封装该编码时退回重新编码
+        cmd = build_convert_command(input_path, output_path, None, sample_rate, channels, threads, bitrate)
+        result = subprocess.run(cmd, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"ffmpeg 转换失败: {result.stderr.strip()}")
+    return output_path
+
+
+async def convert_async(input_path: str, output_path: str, source_codec: Optional[str] = None,
+                        sample_rate: Optional[int] = None, channels: Optional[int] = None,
+                        threads: Optional[int] = None, bitrate: Optional[str] = None,
+                        timeout: Optional[float] = None) -> str:
+    """
+    convert() 的异步版本，等待ffmpeg时不阻塞事件循环；任务取消或超时时结束ffmpeg进程
+    :param timeout: 单次ffmpeg执行的超时秒数，None表示不限制
+    """
+    if not os.path.exists(input_path):
+        raise FileNotFoundError(f"输入音频文件不存在: {input_path}")
+    output_dir = os.path.dirname(output_path)
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+    if threads is None:
+        threads = get_conversion_settings()["threads"]
+
+    cmd = build_convert_command(input_path, output_path, source_codec, sample_rate, channels, threads, bitrate)
+    try:
+        result = await run_process(cmd, timeout)
+    except FileNotFoundError:
+        raise RuntimeError("未找到 ffmpeg，请先安装 ffmpeg 并确保其在 PATH 中")
+    if result.returncode != 0 and is_stream_copy(cmd):
+        cmd = build_convert_command(input_path, output_path, None, sample_rate, channels, threads, bitrate)
+        result = await run_process(cmd, timeout)
+    if result.returncode != 0:
+        raise RuntimeError(f"ffmpeg 转换失败: {result.stderr.strip()}")
+    return output_path
+
+
+def convert_many(jobs: List[Dict[str, Any]], max_workers: Optional[int] = None) -> List[Dict[str, Any]]:
+    """
+    并发执行多项转换。实际转码在ffmpeg子进程中进行，线程只负责调度，
+    因此线程池即相当于一个ffmpeg进程池
+    :param jobs: convert() 的关键字参数列表
+    :param max_workers: 并发ffmpeg进程数，默认取配置
+    :return: 与jobs顺序一致的结果 {'output_path', 'error'}
+    """
+    if max_workers is None:
+        max_workers = get_conversion_settings()["max_workers"]
+
+    def run(job):
+        try:
+            return {"output_path": convert(**job), "error": None}
+        except Exception as e:
+            return {"output_path": None, "error": str(e)}
+
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+        return list(executor.map(run, jobs))
@@ -0,0 +1,206 @@
+"""
+instrumentation.py
+分阶段计时与资源统计 - 记录下载、转换、模型加载、转录、每次LLM调用、写入等阶段的耗时和资源数据。
+
+用法:
+    with JobTrace() as trace:          # 绑定到当前线程或 asyncio 任务
+        with span("download") as s:    # 任意深度的代码都可以记录阶段
+            ...
+            s["bytes"] = os.path.getsize(path)
+    trace.to_dict()
+"""
+
+import os
+import resource
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional, Dict, Any, List
+
+from . import metrics
+
+# 使用 ContextVar 而非线程局部变量：同一事件循环上的多个任务各自绑定自己的记录，
+# asyncio.to_thread 转到线程执行的阶段也能继承
+_current_trace = ContextVar("job_trace", default=None)
+
+# ru_maxrss 在 macOS 上单位为字节，Linux 上为KB
+_MAXRSS_DIVISOR = 1024 * 1024 if sys.platform == "darwin" else 1024
+
+# 需要累加汇总的数值字段
+_SUM_FIELDS = ("bytes", "audio_seconds", "tokens_in", "tokens_out", "tokens_cached", "tokens_saved")
+
+
+def peak_rss_mb() -> float:
+    """进程启动以来的峰值常驻内存（MB），不能代表某个阶段的峰值"""
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / _MAXRSS_DIVISOR, 1)
+
+
+def current_rss_mb() -> Optional[float]:
+    """当前常驻内存（MB），从 /proc/self/statm 读取；非Linux平台返回 None"""
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+    except (OSError, ValueError, IndexError):
+        return None
+    return round(pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024), 1)
+
+
+class JobTrace:
+    """单个任务的阶段记录，线程安全（LLM分段可能并发写入）"""
+
+    def __init__(self, job_id: Optional[str] = None):
+        self.job_id = job_id
+        self.spans: List[Dict[str, Any]] = []
+        self.started = time.time()
+        self._t0 = time.perf_counter()
+        self._lock = threading.Lock()
+        self._token = None
+        self.ended: Optional[float] = None
+
+    def __enter__(self):
+        self._token = _current_trace.set(self)
+        return self
+
+    def __exit__(self, *exc):
+        _current_trace.reset(self._token)
+        self.ended = time.time()
+        return False
+
+    @contextmanager
+    def span(self, name: str, **attrs):
+        """记录一个阶段，yield 出的字典可在阶段内补充 bytes/tokens_in 等字段"""
+        record = None
+        try:
+            with _timed(name, attrs) as record:
+                record["start_s"] = round(time.perf_counter() - self._t0, 4)
+                yield record
+        finally:
+            # 计时字段填写完毕后再加入列表，避免并发读取到半成品
+            if record is not None:
+                with self._lock:
+                    self.spans.append(record)
+
+    def to_list(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            return [dict(s) for s in self.spans]
+
+    def summary(self) -> Dict[str, Any]:
+        """按阶段名汇总耗时与计数，并计算实时率（转录耗时/音频时长）"""
+        stages: Dict[str, Dict[str, Any]] = {}
+        for s in self.to_list():
+            stage = stages.setdefault(s["name"], {"count": 0, "duration_s": 0.0})
+            stage["count"] += 1
+            stage["duration_s"] = round(stage["duration_s"] + s["duration_s"], 4)
+            for field in _SUM_FIELDS:
+                if s.get(field) is not None:
+                    stage[field] = round(stage.get(field, 0) + s[field], 4)
+            if s.get("rss_end_mb") is not None:
+                stage["max_rss_end_mb"] = max(stage.get("max_rss_end_mb", 0), s["rss_end_mb"])
+        end = self.ended or time.time()
+        result = {
+            "wall_s": round(end - self.started, 4),
+            "process_peak_rss_mb": peak_rss_mb(),
+            "stages": stages,
+        }
+        transcribe = stages.get("transcribe", {})
+        audio_seconds = transcribe.get("audio_seconds")
+        if audio_seconds:
+            result["audio_seconds"] = audio_seconds
+            result["rtf"] = round(transcribe["duration_s"] / audio_seconds, 4)
+        bottleneck = max(stages.items(), key=lambda kv: kv[1]["duration_s"], default=None)
+        if bottleneck:
+            result["bottleneck"] = bottleneck[0]
+        return result
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"spans": self.to_list(), "timing": self.summary()}
+
+
+@contextmanager
+def _timed(name: str, attrs: Dict[str, Any]):
+    """计时并在结束时更新 /metrics 指标"""
+    record = {"name": name}
+    record.update(attrs)
+    start = time.perf_counter()
+    cpu_start = time.thread_time()
+    record["rss_start_mb"] = current_rss_mb()
+    try:
+        yield record
+    except Exception as e:
+        record["error"] = str(e)
+        raise
+    finally:
+        record["duration_s"] = round(time.perf_counter() - start, 4)
+        record["cpu_s"] = round(time.thread_time() - cpu_start, 4)
+        record["rss_end_mb"] = current_rss_mb()
+        metrics.observe_span(record)
+
+
+def current_trace() -> Optional[JobTrace]:
+    """获取当前线程/任务绑定的任务记录（没有则返回None）"""
+    return _current_trace.get()
+
+
+@contextmanager
+def span(name: str, trace: Optional[JobTrace] = None, **attrs):
+    """
+    在当前任务记录中记录一个阶段；没有绑定任务时只更新 /metrics 指标
+    :param trace: 显式指定任务记录（用于线程池中的子任务）
+    """
+    trace = trace or current_trace()
+    if trace is None:
+        with _timed(name, attrs) as record:
+            yield record
+        return
+    with trace.span(name, **attrs) as record:
+        yield record
+
+
+def file_size(path: str) -> Optional[int]:
+    """安全获取文件大小"""
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return None
+
+
+def rollup(timings: List[Dict[str, Any]], wall_s: Optional[float] = None) -> Dict[str, Any]:
+    """
+    汇总多个任务的 timing，计算批量级实时率与吞吐
+    :param timings: JobTrace.summary() 的列表
+    :param wall_s: 批量处理总墙钟时间（不提供则按各任务之和计算）
+    """
+    stages: Dict[str, Dict[str, Any]] = {}
+    audio_seconds = 0.0
+    transcribe_seconds = 0.0
+    for timing in timings:
+        audio_seconds += timing.get("audio_seconds", 0) or 0
+        for name, stage in timing.get("stages", {}).items():
+            total = stages.setdefault(name, {"count": 0, "duration_s": 0.0})
+            total["count"] += stage["count"]
+            total["duration_s"] = round(total["duration_s"] + stage["duration_s"], 4)
+            for field in _SUM_FIELDS:
+                if field in stage:
+                    total[field] = round(total.get(field, 0) + stage[field], 4)
+            if "max_rss_end_mb" in stage:
+                total["max_rss_end_mb"] = max(total.get("max_rss_end_mb", 0), stage["max_rss_end_mb"])
+            if name == "transcribe":
+                transcribe_seconds += stage["duration_s"]
+    if wall_s is None:
+        wall_s = sum(t.get("wall_s", 0) for t in timings)
+    result = {
+        "jobs": len(timings),
+        "wall_s": round(wall_s, 4),
+        "audio_seconds": round(audio_seconds, 2),
+        "stages": stages,
+        "process_peak_rss_mb": peak_rss_mb(),
+    }
+    if audio_seconds:
+        result["rtf"] = round(wall_s / audio_seconds, 4)
+        result["transcribe_rtf"] = round(transcribe_seconds / audio_seconds, 4)
+    if wall_s:
+        result["jobs_per_hour"] = round(len(timings) * 3600 / wall_s, 2)
+        result["audio_hours_per_hour"] = round(audio_seconds / wall_s, 4)
+    return result
@@ -0,0 +1,110 @@
+"""
+job_registry.py
+Web UI 任务合并 - 按“规范化视频ID/上传文件哈希 + 处理选项”生成请求键：
+相同请求正在处理时后来者直接挂到已有任务上，已完成的请求直接返回已保存的结果。
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Optional, Dict, Any
+
+from .output_writer import atomic_write_json
+
+# 已完成请求的索引（请求键 -> 结果文件），重启后仍可复用
+COMPLETED_INDEX_PATH = Path("cache") / "completed_jobs.json"
+# 索引最多保留的请求数，超出时淘汰最早完成的记录
+MAX_COMPLETED_JOBS = 1000
+
+
+def job_key(kind: str, identity: str, **options) -> str:
+    """
+    生成请求键
+    :param kind: 任务类型（video_url / local_audio）
+    :param identity: 规范化视频ID或上传文件内容哈希
+    :param options: 影响输出的处理选项（模型、提示词、语言、服务商等）
+    """
+    payload = json.dumps({"kind": kind, "identity": identity, "options": options}, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class JobRegistry:
+    """进程内请求合并表，线程安全"""
+
+    def __init__(self, index_path: Path = COMPLETED_INDEX_PATH, max_completed: int = MAX_COMPLETED_JOBS):
+        self.index_path = Path(index_path)
+        self.max_completed = max_completed
+        self._lock = threading.Lock()
+        self._in_flight: Dict[str, str] = {}  # 请求键 -> task_id
+        self._task_keys: Dict[str, str] = {}  # task_id -> 请求键
+        self._completed: Optional[Dict[str, Dict[str, Any]]] = None
+
+    def _load_completed(self) -> Dict[str, Dict[str, Any]]:
+        if self._completed is None:
+            try:
+                with open(self.index_path, "r", encoding="utf-8") as f:
+                    self._completed = json.load(f)
+            except (OSError, ValueError):
+                self._completed = {}
+        return self._completed
+
+    def claim(self, key: str, task_id: str) -> Dict[str, Any]:
+        """
+        尝试以 task_id 认领请求
+        :return: {'state': 'new'} 表示需要启动新任务；
+                 {'state': 'in_flight', 'task_id'} 表示挂到正在处理的任务；
+                 {'state': 'completed', 'result'} 表示结果已存在（结果文件仍在磁盘上）
+        """
+        with self._lock:
+            running = self._in_flight.get(key)
+            if running:
+                return {"state": "in_flight", "task_id": running}
+            result = self._load_completed().get(key)
+            if result and os.path.exists(result.get("result_path") or ""):
+                return {"state": "completed", "result": result}
+            self._in_flight[key] = task_id
+            self._task_keys[task_id] = key
+            return {"state": "new"}
+
+    def release(self, key: str):
+        """释放已认领但未能启动任务的请求键（如提交阶段出错），以便后续相同请求重新处理"""
+        with self._lock:
+            task_id = self._in_flight.pop(key, None)
+            if task_id is not None:
+                self._task_keys.pop(task_id, None)
+
+    def finish(self, task_id: str, status: Dict[str, Any]):
+        """任务结束：成功时记录结果供后续相同请求复用，失败时释放请求键以便重试"""
+        with self._lock:
+            key = self._task_keys.pop(task_id, None)
+            if key is None:
+                return
+            self._in_flight.pop(key, None)
+            if status.get("status") != "completed" or not status.get("result_path"):
+                return
+            completed = self._load_completed()
+            completed[key] = {
+                "task_id": task_id,
+                "result_path": status["result_path"],
+                "result_paths": status.get("result_paths") or [status["result_path"]],
+                "model_choice": status.get("model_choice"),
+                "completed_at": time.time(),
+            }
+            self._prune_completed(completed)
+            atomic_write_json(self.index_path, completed)
+
+    def _prune_completed(self, completed: Dict[str, Dict[str, Any]]):
+        """删除结果文件已不存在的记录，并在超出 max_completed 时淘汰最早完成的记录"""
+        for key in [k for k, v in completed.items() if not os.path.exists(v.get("result_path") or "")]:
+            del completed[key]
+        excess = len(completed) - max(1, self.max_completed)
+        if excess > 0:
+            oldest = sorted(completed, key=lambda k: completed[k].get("completed_at") or 0)[:excess]
+            for key in oldest:
+                del completed[key]
+
+
+job_registry = JobRegistry()
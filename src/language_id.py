@@ -0,0 +1,145 @@
+"""
+language_id.py
+语言识别预检 - 在音频中均匀抽取若干个30秒窗口，用小模型（默认tiny）识别语言并取加权结果。
+
+whisper 自动检测只看前30秒，前奏、片头或混合语言内容经常误判，导致整段用错语言解码后再强制语言重跑。
+识别结果按音频内容哈希缓存，同一文件重复处理时不再计算。
+"""
+
+import hashlib
+import json
+import subprocess
+import threading
+from pathlib import Path
+from typing import Optional, Dict, Any, List
+
+from .config import config_manager
+from .instrumentation import span
+from .output_writer import atomic_write_json
+
+# whisper 单次处理的窗口长度（秒）
+WINDOW_SECONDS = 30
+SAMPLE_RATE = 16000
+
+CACHE_PATH = Path("cache") / "language_id.json"
+
+_cache: Optional[Dict[str, Dict[str, Any]]] = None
+_cache_lock = threading.Lock()
+
+
+def get_language_id_settings() -> Dict[str, Any]:
+    """读取语言识别预检配置"""
+    settings = {"enabled": True, "model": "tiny", "windows": 3}
+    settings.update(config_manager.config.get("language_id", {}))
+    return settings
+
+
+def audio_hash(audio_path: str) -> str:
+    """计算音频文件内容哈希（分块读取，不占用额外内存）"""
+    digest = hashlib.sha256()
+    with open(audio_path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _load_cache() -> Dict[str, Dict[str, Any]]:
+    global _cache
+    if _cache is None:
+        try:
+            with open(CACHE_PATH, "r", encoding="utf-8") as f:
+                _cache = json.load(f)
+        except (OSError, ValueError):
+            _cache = {}
+    return _cache
+
+
+def get_cached_language(digest: str) -> Optional[Dict[str, Any]]:
+    with _cache_lock:
+        return _load_cache().get(digest)
+
+
+def _store_cached_language(digest: str, result: Dict[str, Any]):
+    with _cache_lock:
+        cache = _load_cache()
+        cache[digest] = result
+        atomic_write_json(CACHE_PATH, cache)
+
+
+def sample_offsets(duration: Optional[float], windows: int) -> List[float]:
+    """在音频中均匀选取窗口起点（避开开头和结尾），时长未知或过短时只取开头"""
+    if not duration or duration <= WINDOW_SECONDS or windows <= 1:
+        return [0.0]
+    span_seconds = duration - WINDOW_SECONDS
+    return [round(span_seconds * (i + 1) / (windows + 1), 2) for i in range(windows)]
+
+
+def _decode_window(audio_path: str, start: float):
+    """用ffmpeg只解码指定的30秒窗口，返回float32波形"""
+    import numpy as np
+    cmd = [
+        "ffmpeg", "-hide_banner", "-loglevel", "error", "-nostdin",
+        "-ss", str(start), "-t", str(WINDOW_SECONDS), "-i", audio_path, "-vn",
+        "-f", "s16le", "-acodec", "pcm_s16le", "-ac", "1", "-ar", str(SAMPLE_RATE), "-"
+    ]
+    try:
+        result = subprocess.run(cmd, capture_output=True)
+    except FileNotFoundError:
+        raise RuntimeError("未找到 ffmpeg，请先安装 ffmpeg 并确保其在 PATH 中")
+    if result.returncode != 0:
+        raise RuntimeError(f"ffmpeg 解码失败: {result.stderr.decode('utf-8', errors='replace').strip()}")
+    return np.frombuffer(result.stdout, np.int16).astype(np.float32) / 32768.0
+
+
+def detect_language(audio_path: str, duration: Optional[float] = None, model: Optional[str] = None,
+                    windows: Optional[int] = None) -> Dict[str, Any]:
+    """
+    识别音频语言：多个窗口的语言概率相加后取最大者
+    :param audio_path: 音频文件路径
+    :param duration: 音频时长（秒），用于选取窗口位置
+    :param model: 用于识别的whisper模型，默认取配置（tiny）
+    :param windows: 抽取窗口数，默认取配置
+    :return: {'language', 'probability', 'mixed', 'model', 'windows': [{'start', 'language', 'probability'}], 'cached'}
+    """
+    import whisper
+    from .transcribe import whisper_model_slot
+
+    settings = get_language_id_settings()
+    model = model or settings["model"]
+    windows = windows or settings["windows"]
+
+    digest = audio_hash(audio_path)
+    cached = get_cached_language(digest)
+    if cached:
+        return dict(cached, cached=True)
+
+    totals: Dict[str, float] = {}
+    per_window = []
+    with span("language_id", model=model) as record:
+        with whisper_model_slot(model) as whisper_model:
+            n_mels = whisper_model.dims.n_mels
+            for start in sample_offsets(duration, windows):
+                audio = _decode_window(audio_path, start)
+                if not audio.size:
+                    continue
+                mel = whisper.log_mel_spectrogram(whisper.pad_or_trim(audio), n_mels=n_mels).to(whisper_model.device)
+                _, probs = whisper_model.detect_language(mel)
+                language = max(probs, key=probs.get)
+                per_window.append({"start": start, "language": language, "probability": round(probs[language], 3)})
+                for code, p in probs.items():
+                    totals[code] = totals.get(code, 0.0) + p
+        if not totals:
+            raise RuntimeError(f"无法从音频中解码出用于语言识别的内容: {audio_path}")
+        language = max(totals, key=totals.get)
+        record["audio_seconds"] = len(per_window) * WINDOW_SECONDS
+        record["language"] = language
+
+    result = {
+        "language": language,
+        "probability": round(totals[language] / len(per_window), 3),
+        "mixed": len({w["language"] for w in per_window}) > 1,
+        "model": model,
+        "windows": per_window,
+    }
+    _store_cached_language(digest, result)
+    return dict(result, cached=False)
@@ -0,0 +1,149 @@
+"""
+llm_stub.py
+离线OpenAI兼容桩服务 - 用于在无网络环境下跑通并压测整个流水线。
+
+用法:
+    python -m src.llm_stub --port 8080 --latency 0.2
+然后在 config.json 中设置 "default_provider": "local"，
+local_llm.base_url 指向 http://127.0.0.1:8080/v1 即可。
+"""
+
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def build_stub_summary(content: str, max_chars: int = 400) -> str:
+    """根据输入内容生成确定性的Markdown摘要（只截取正文，不做真实推理）"""
+    lines = [line.strip() for line in content.splitlines() if line.strip()]
+    body = lines[-1] if lines else ""
+    excerpt = body[:max_chars]
+    return f"# 摘要（本地桩服务）\n\n- 输入字数: {len(content)}\n- 内容节选: {excerpt}"
+
+
+def estimate_tokens(text: str) -> int:
+    """粗略估算token数（中文约1字1 token，英文约4字符1 token）"""
+    ascii_chars = sum(1 for ch in text if ord(ch) < 128)
+    return (len(text) - ascii_chars) + ascii_chars // 4 + 1
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """处理 /v1/models 与 /v1/chat/completions 请求"""
+
+    server_version = "sum4u-llm-stub/0.1"
+
+    def log_message(self, format, *args):
+        if not self.server.quiet:
+            super().log_message(format, *args)
+
+    def _send_json(self, status: int, payload: dict):
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path.rstrip("/").endswith("/models"):
+            self._send_json(200, {"object": "list", "data": [{"id": self.server.model_name, "object": "model"}]})
+        else:
+            self._send_json(404, {"error": {"message": f"未知路径: {self.path}"}})
+
+    def do_POST(self):
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self._send_json(404, {"error": {"message": f"未知路径: {self.path}"}})
+            return
+
+        length = int(self.headers.get("Content-Length") or 0)
+        try:
+            request = json.loads(self.rfile.read(length) or b"{}")
+        except json.JSONDecodeError as e:
+            self._send_json(400, {"error": {"message": f"请求体不是合法JSON: {e}"}})
+            return
+
+        messages = request.get("messages") or []
+        content = "\n".join(str(m.get("content", "")) for m in messages)
+
+        # 模拟服务端前缀缓存：相同的 system 消息第二次出现时按命中缓存计数
+        system = messages[0].get("content", "") if messages and messages[0].get("role") == "system" else None
+        with self.server.lock:
+            self.server.request_count += 1
+            request_id = self.server.request_count
+            cached_tokens = estimate_tokens(system) if system in self.server.cached_prefixes else 0
+            if system is not None:
+                self.server.cached_prefixes.add(system)
+
+        if self.server.latency > 0:
+            time.sleep(self.server.latency)
+
+        answer = build_stub_summary(content)
+        prompt_tokens = estimate_tokens(content)
+        completion_tokens = estimate_tokens(answer)
+        self._send_json(200, {
+            "id": f"chatcmpl-stub-{request_id}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": request.get("model") or self.server.model_name,
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": answer},
+                "finish_reason": "stop"
+            }],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+                "prompt_tokens_details": {"cached_tokens": cached_tokens}
+            }
+        })
+
+
+def create_stub_server(host: str = "127.0.0.1", port: int = 8080, latency: float = 0.0,
+                       model_name: str = "local-model", quiet: bool = True) -> ThreadingHTTPServer:
+    """
+    创建桩服务实例（未启动），port=0 时由系统分配端口
+    :param latency: 每次请求模拟的推理耗时（秒）
+    :return: ThreadingHTTPServer 实例
+    """
+    server = ThreadingHTTPServer((host, port), StubHandler)
+    server.daemon_threads = True
+    server.latency = latency
+    server.model_name = model_name
+    server.quiet = quiet
+    server.lock = threading.Lock()
+    server.request_count = 0
+    server.cached_prefixes = set()
+    return server
+
+
+def start_stub_server_in_thread(**kwargs) -> ThreadingHTTPServer:
+    """在后台线程启动桩服务，返回服务实例（用 server.shutdown() 停止）"""
+    server = create_stub_server(**kwargs)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="离线OpenAI兼容桩服务")
+    parser.add_argument("--host", default="127.0.0.1", help="监听地址，默认127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080, help="监听端口，默认8080")
+    parser.add_argument("--latency", type=float, default=0.0, help="每次请求模拟的推理耗时（秒）")
+    parser.add_argument("--model", default="local-model", help="返回的模型名")
+    args = parser.parse_args()
+
+    server = create_stub_server(args.host, args.port, args.latency, args.model, quiet=False)
+    print(f"本地LLM桩服务已启动: http://{args.host}:{server.server_port}/v1")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("桩服务已停止")
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -9,137 +9,103 @@ if __name__ == "__main__" and __package__ is None:
     __package__ = "src"
 
 import argparse
-from datetime import datetime
-import pytz
 from pathlib import Path
 from .audio import download_audio
-from .transcribe import transcribe_audio, transcribe_local_audio
-from .summarize import summarize_text
-from .prompts import prompt_templates
+from .transcribe import transcribe_audio_segments, transcribe_local_audio_segments
+from .segments import save_transcript, export_subtitles, transcript_path_for_summary
+from .results_catalog import save_summaries
+from .summarize import summarize_many
+from .prompts import select_prompts
 from .audio_handler import handle_audio_upload
-from .utils import safe_filename
-from .batch_processor import process_batch
+from .url_resolver import generate_filename, HOST_PLATFORMS
+from .batch_processor import process_batch, process_url_batch, read_url_inputs
 from .config import config_manager
 from .config import config_manager, get_api_key, set_api_key
-
-
-def generate_filename(url_or_path: str, has_summary: bool = True, is_local: bool = False) -> str:
-    """根据URL或文件路径和是否有总结生成文件名"""
-    # 生成时间戳，使用UTC时间并转换为本地时区
-    utc_now = datetime.utcnow()
-    local_tz = pytz.timezone('Asia/Shanghai')  # 使用中国时区
-    local_time = utc_now.replace(tzinfo=pytz.utc).astimezone(local_tz)
-    timestamp = local_time.strftime("%Y%m%d_%H%M%S")
-
-    if is_local:
-        # 本地文件处理
-        file_stem = Path(url_or_path).stem
-        # 清理文件名中的特殊字符
-        safe_stem = safe_filename(file_stem)
-        platform = "local"
-        video_id = safe_stem[:10]  # 取前10个字符作为ID
-    else:
-        # 从URL中提取视频ID
-        if "bilibili.com" in url_or_path:
-            # B站视频ID格式：BV1xx411c7mu
-            if "BV" in url_or_path:
-                video_id = url_or_path.split("BV")[1].split("?")[0][:10]
-                platform = "bilibili"
-            else:
-                video_id = "unknown"
-                platform = "bilibili"
-        elif "youtube.com" in url_or_path:
-            # YouTube视频ID格式：dQw4w9WgXcQ
-            if "v=" in url_or_path:
-                video_id = url_or_path.split("v=")[1].split("&")[0][:11]
-                platform = "youtube"
-            else:
-                video_id = "unknown"
-                platform = "youtube"
-        elif "douyin.com" in url_or_path or "v.douyin.com" in url_or_path:
-            # 抖音视频ID提取
-            import re
-            # 尝试从URL中提取视频ID
-            match = re.search(r'/video/(\d+)', url_or_path)
-            if match:
-                video_id = match.group(1)[:10]
-            else:
-                # 尝试从短链接或其他格式提取
-                video_id = url_or_path.split('/')[-1].split('?')[0][:10]
-            platform = "douyin"
-        elif "tiktok.com" in url_or_path:
-            # TikTok视频ID提取
-            import re
-            # 尝试从URL中提取视频ID
-            match = re.search(r'/video/(\d+)', url_or_path)
-            if match:
-                video_id = match.group(1)[:11]
-            else:
-                # 尝试从短链接或其他格式提取
-                video_id = url_or_path.split('/')[-1].split('?')[0][:11]
-            platform = "tiktok"
-        else:
-            video_id = "unknown"
-            platform = "other"
-
-    # 生成文件名
-    if has_summary:
-        filename = f"{platform}_{video_id}_{timestamp}_总结.md"
-    else:
-        filename = f"{platform}_{video_id}_{timestamp}_转录.txt"
-
-    return filename
-
-
-def process_local_audio(audio_file_path: str, model: str, prompt_to_use: str, output_path: str, language: str = None):
-    """处理本地音频文件的完整流程"""
+from .instrumentation import JobTrace, span
+from .output_writer import init_umask
+
+
+def save_transcription(result: dict, output_path: str, subtitles: list = None):
+    """保存转录文本与时间戳分段，并按需导出字幕"""
+    transcript_path = transcript_path_for_summary(str(output_path))
+    with span("write") as record:
+        segments_path = save_transcript(result, transcript_path)
+        record["bytes"] = os.path.getsize(transcript_path) + os.path.getsize(segments_path)
+    print(f"转录已保存到: {transcript_path}")
+    if subtitles:
+        for path in export_subtitles(result["segments"], transcript_path.rsplit(".", 1)[0], subtitles):
+            print(f"字幕已导出: {path}")
+
+
+def process_local_audio(audio_file_path: str, model: str, prompts: dict, output_path: str, language: str = None, provider: str = None,
+                        subtitles: list = None):
+    """
+    处理本地音频文件的完整流程
+    :param prompts: {模板名: 提示词}，多个模板时只转录一次，每个模板各生成一份总结
+    """
     print("[1/3] 准备音频文件...")
     processed_audio_path = handle_audio_upload(audio_file_path, output_dir="downloads")
     print(f"音频已准备: {processed_audio_path}")
 
     print(f"[2/3] 转录音频 (使用模型: {model})...")
     print("提示：转录过程可能需要几分钟时间，请耐心等待...")
-    transcript = transcribe_local_audio(processed_audio_path, model=model, language=language)
+    transcription = transcribe_local_audio_segments(processed_audio_path, model=model, language=language)
     print("转录完成！")
+    save_transcription(transcription, output_path, subtitles)
 
     print("[3/4] 结构化总结...")
     # 确定AI提供商
-    provider = "deepseek"  # 默认使用deepseek
-    summary = summarize_text(transcript, prompt=prompt_to_use, model=config_manager.get_default_model(), provider=provider)
+    provider = provider or config_manager.get_default_provider()
+    summarize_and_save(transcription, prompts, output_path, provider)
+
+
+def summarize_and_save(transcription: dict, prompts: dict, output_path: str, provider: str):
+    """用同一份转录生成每个模板的总结（模板之间并发）并保存"""
+    summaries = summarize_many(transcription["text"], prompts, model=config_manager.get_default_model(), provider=provider,
+                               segments=transcription["segments"], language=transcription.get("language"))
     print("摘要完成！")
 
     print("[4/4] 保存结果...")
     # 保存到总结文件夹
-    with open(output_path, "w", encoding="utf-8") as f:
-        f.write(summary)
-    print(f"结果已保存到: {output_path}")
-
-
-def process_video_url(video_url: str, model: str, prompt_to_use: str, output_path: str):
-    """处理视频URL的完整流程"""
+    paths = save_summaries(summaries, str(output_path), model=transcription["model"],
+                           transcript_path=transcript_path_for_summary(str(output_path)))
+    for path in paths.values():
+        print(f"结果已保存到: {path}")
+
+
+def process_video_url(video_url: str, model: str, prompts: dict, output_path: str, provider: str = None,
+                      subtitles: list = None):
+    """
+    处理视频URL的完整流程
+    :param prompts: {模板名: 提示词}，多个模板时只下载、转录一次，每个模板各生成一份总结
+    """
     print("[1/3] 下载并提取音频...")
     audio_path = download_audio(video_url)
     print(f"音频已保存: {audio_path}")
 
     print(f"[2/3] 转录音频 (使用模型: {model})...")
     print("提示：转录过程可能需要几分钟时间，请耐心等待...")
-    transcript = transcribe_audio(audio_path, model=model)
+    transcription = transcribe_audio_segments(audio_path, model=model)
     print("转录完成！")
+    save_transcription(transcription, output_path, subtitles)
 
     print("[3/4] 结构化总结...")
     # 确定AI提供商
-    provider = "deepseek"  # 默认使用deepseek
-    summary = summarize_text(transcript, prompt=prompt_to_use, model=config_manager.get_default_model(), provider=provider)
-    print("摘要完成！")
+    provider = provider or config_manager.get_default_provider()
+    summarize_and_save(transcription, prompts, output_path, provider)
 
-    print("[4/4] 保存结果...")
-    # 保存到总结文件夹
-    with open(output_path, "w", encoding="utf-8") as f:
-        f.write(summary)
-    print(f"结果已保存到: {output_path}")
+
+def print_timing(trace: JobTrace):
+    """打印各阶段耗时，便于判断任务是下载、转录还是LLM受限"""
+    timing = trace.summary()
+    stages = ", ".join(f"{name} {stage['duration_s']:.1f}s" for name, stage in timing["stages"].items())
+    print(f"⏱  总耗时 {timing['wall_s']:.1f}s（{stages}）")
+    if timing.get("rtf") is not None:
+        print(f"   转录实时率: {timing['rtf']:.3f}，进程峰值内存: {timing['process_peak_rss_mb']:.0f}MB")
 
 
 def main():
+    init_umask()
     parser = argparse.ArgumentParser(description="音频/视频结构化总结工具")
 
     # 添加互斥组，确保用户只能提供URL或本地文件之一，或者进行批量处理
@@ -147,23 +113,25 @@ def main():
     group.add_argument("--url", help="视频链接（支持B站、YouTube等）")
     group.add_argument("--audio-file", help="本地音频文件路径（支持MP3, WAV, M4A等格式）")
     group.add_argument("--batch", action="store_true", help="批量处理上传文件夹中的所有音频文件")
+    group.add_argument("--url-file", help="批量处理链接列表文件（每行一个链接或分享文本，'-' 表示从标准输入读取）")
     group.add_argument("--setup-api", action="store_true", help="交互式设置API密钥")
 
     parser.add_argument("--upload-dir", required=False, default="uploads", help="批量处理的上传文件夹路径，默认为uploads")
-    parser.add_argument("--model", required=False, default="small", help="Whisper模型大小 (tiny, base, small, medium, large-v1, large-v2, large-v3)，默认small")
+    parser.add_argument("--model", required=False, default="auto", help="Whisper模型大小 (auto, tiny, base, small, medium, large-v1, large-v2, large-v3)，默认auto（按音频时长与负载自动选择）")
     parser.add_argument("--output", required=False, help="自定义输出文件名（单文件处理时有效）")
     parser.add_argument("--prompt", required=False, help="自定义摘要提示词")
-    parser.add_argument("--prompt_template", required=False, default="default课堂笔记", help="选择摘要提示词模板，可选: default课堂笔记, youtube_英文笔记, youtube_结构化提取, youtube_精炼提取, youtube_专业课笔记, 爆款短视频文案, youtube_视频总结")
+    parser.add_argument("--prompt_template", required=False, default="default课堂笔记", help="选择摘要提示词模板，多个模板用逗号分隔（只转录一次，每个模板各生成一份总结），可选: default课堂笔记, youtube_英文笔记, youtube_结构化提取, youtube_精炼提取, youtube_专业课笔记, 爆款短视频文案, youtube_视频总结")
     parser.add_argument("--language", required=False, help="指定音频语言（如 zh, en），不指定则自动检测")
-    parser.add_argument("--provider", required=False, help="AI服务提供商 (deepseek, openai, anthropic)")
+    parser.add_argument("--subtitles", required=False, help="同时导出字幕，逗号分隔: srt, vtt, json")
+    parser.add_argument("--provider", required=False, help="AI服务提供商 (deepseek, openai, anthropic, local)，local 为本地OpenAI兼容服务")
+    parser.add_argument("--platforms", required=False, help="--url-file 时只提取这些平台的链接，逗号分隔，如 douyin,tiktok")
+    parser.add_argument("--report-format", required=False, default="json", choices=("json", "csv"), help="批量处理报告格式，默认json")
 
     args = parser.parse_args()
 
     # 如果请求设置API密钥，则启动设置向导
     if args.setup_api:
         import subprocess
-        import sys
-        from pathlib import Path
 
         setup_script = Path(__file__).parent.parent / "setup_api_keys.py"
         if setup_script.exists():
@@ -173,7 +141,7 @@ def main():
         return
 
     # 如果没有提供任何参数，则显示帮助信息
-    if not args.url and not args.audio_file and not args.batch and not args.setup_api:
+    if not args.url and not args.audio_file and not args.batch and not args.url_file and not args.setup_api:
         parser.print_help()
         sys.exit(1)
 
@@ -185,8 +153,10 @@ def main():
     transcriptions_dir = Path("transcriptions")
     transcriptions_dir.mkdir(exist_ok=True)
 
-    # 优先使用 --prompt，如果没有则用模板
-    prompt_to_use = args.prompt if args.prompt else prompt_templates.get(args.prompt_template, prompt_templates["default课堂笔记"])
+    subtitles = [fmt.strip() for fmt in args.subtitles.split(",") if fmt.strip()] if args.subtitles else None
+
+    # 优先使用 --prompt，如果没有则用模板（可用逗号分隔多个模板）
+    prompts = select_prompts(args.prompt_template, args.prompt)
 
     # 根据输入类型决定处理流程
     if args.url:
@@ -204,12 +174,11 @@ def main():
 
         # 使用用户指定的模型，否则使用默认模型
         model_to_use = config_manager.get_default_model() if not args.model else args.model
-        provider_to_use = args.provider if args.provider else "deepseek"
-
-        # 更新prompt_to_use使用用户的模板或自定义提示词
-        prompt_to_use = args.prompt if args.prompt else prompt_templates.get(args.prompt_template, prompt_templates["default课堂笔记"])
+        provider_to_use = args.provider if args.provider else config_manager.get_default_provider()
 
-        process_video_url(args.url, model_to_use, prompt_to_use, output_path)
+        with JobTrace() as trace:
+            process_video_url(args.url, model_to_use, prompts, output_path, provider_to_use, subtitles)
+        print_timing(trace)
 
     elif args.audio_file:
         # 处理本地音频文件
@@ -231,29 +200,49 @@ def main():
 
         # 使用用户指定的模型，否则使用默认模型
         model_to_use = config_manager.get_default_model() if not args.model else args.model
-        provider_to_use = args.provider if args.provider else "deepseek"
+        provider_to_use = args.provider if args.provider else config_manager.get_default_provider()
 
-        # 更新prompt_to_use使用用户的模板或自定义提示词
-        prompt_to_use = args.prompt if args.prompt else prompt_templates.get(args.prompt_template, prompt_templates["default课堂笔记"])
-
-        process_local_audio(args.audio_file, model_to_use, prompt_to_use, output_path, args.language)
+        with JobTrace() as trace:
+            process_local_audio(args.audio_file, model_to_use, prompts, output_path, args.language, provider_to_use, subtitles)
+        print_timing(trace)
 
     elif args.batch:
         # 批量处理模式
         print(f"批量处理模式: 处理 {args.upload_dir} 文件夹中的所有音频文件")
         # 使用用户指定的模型，否则使用默认模型
         model_to_use = config_manager.get_default_model() if not args.model else args.model
-        provider_to_use = args.provider if args.provider else "deepseek"
-
-        # 更新prompt_to_use使用用户的模板或自定义提示词
-        prompt_to_use = args.prompt if args.prompt else prompt_templates.get(args.prompt_template, prompt_templates["default课堂笔记"])
+        provider_to_use = args.provider if args.provider else config_manager.get_default_provider()
 
         process_batch(
             upload_dir=args.upload_dir,
             model=model_to_use,
-            prompt_to_use=prompt_to_use,
+            prompt_to_use=args.prompt,
+            prompt_template=args.prompt_template,
+            language=args.language,
+            provider=provider_to_use,
+            report_format=args.report_format
+        )
+
+    elif args.url_file:
+        # 批量处理链接列表：并发下载，转录复用同一个已加载的模型
+        print(f"批量处理链接列表: {'标准输入' if args.url_file == '-' else args.url_file}")
+        model_to_use = config_manager.get_default_model() if not args.model else args.model
+        provider_to_use = args.provider if args.provider else config_manager.get_default_provider()
+        platforms = [p.strip() for p in args.platforms.split(",") if p.strip()] if args.platforms else None
+        unknown = sorted(set(platforms or ()) - set(HOST_PLATFORMS.values()))
+        if unknown:
+            print(f"错误: 未知平台 {', '.join(unknown)}，可选: {', '.join(sorted(set(HOST_PLATFORMS.values())))}")
+            sys.exit(1)
+
+        process_url_batch(
+            read_url_inputs(args.url_file, platforms),
+            model=model_to_use,
+            prompt_to_use=args.prompt,
             prompt_template=args.prompt_template,
-            language=args.language
+            language=args.language,
+            provider=provider_to_use,
+            source=args.url_file,
+            report_format=args.report_format
         )
 
 
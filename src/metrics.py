@@ -0,0 +1,241 @@
+"""
+metrics.py
+Prometheus 文本格式指标 - 进程内计数器、仪表和直方图，由 Web UI 的 /metrics 暴露。
+
+只依赖标准库，指标在 instrumentation 的阶段结束时自动更新。
+"""
+
+import threading
+import time
+from typing import Dict, Tuple, Optional, Iterable, Callable
+
+# 默认直方图分桶（秒），覆盖从毫秒级写入到小时级转录
+DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800, 3600)
+
+LabelValues = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Tuple[str, ...], values: LabelValues, extra: Optional[Dict[str, str]] = None) -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.extend(f'{name}="{_escape(value)}"' for name, value in extra.items())
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Metric:
+    metric_type = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> LabelValues:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.metric_type}"]
+        lines.extend(self._samples())
+        return "\n".join(lines)
+
+    def _samples(self):
+        return []
+
+
+class Counter(_Metric):
+    """只增计数器"""
+
+    metric_type = "counter"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def _samples(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(v)}" for key, v in items]
+
+
+class Gauge(_Metric):
+    """可增可减的仪表；也可以绑定回调在采集时取值"""
+
+    metric_type = "gauge"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[LabelValues, float] = {}
+        self._callback: Optional[Callable[[], Dict[LabelValues, float]]] = None
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+    def set_function(self, callback: Callable[[], Dict[LabelValues, float]]):
+        """采集时调用 callback，返回 {标签值元组: 数值}"""
+        self._callback = callback
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def total(self) -> float:
+        """所有标签组合的数值之和"""
+        with self._lock:
+            return sum(self._values.values())
+
+    def _samples(self):
+        if self._callback is not None:
+            items = sorted(self._callback().items())
+        else:
+            with self._lock:
+                items = sorted(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(v)}" for key, v in items]
+
+
+class Histogram(_Metric):
+    """累积分桶直方图"""
+
+    metric_type = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = (), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+        self._counts: Dict[LabelValues, list] = {}
+        self._sums: Dict[LabelValues, float] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            counts = self._counts.setdefault(key, [0] * len(self.buckets))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            self._sums[key] = self._sums.get(key, 0) + value
+
+    def count(self, **labels) -> int:
+        return sum(self._counts.get(self._key(labels), []))
+
+    def _samples(self):
+        lines = []
+        with self._lock:
+            items = sorted((key, list(counts)) for key, counts in self._counts.items())
+            sums = dict(self._sums)
+        for key, counts in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                le = _format_labels(self.labelnames, key, {"le": _format_value(bound)})
+                lines.append(f"{self.name}_bucket{le} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(sums.get(key, 0))}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class Registry:
+    """指标注册表"""
+
+    def __init__(self):
+        self._metrics = []
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics)
+        return "\n".join(metric.render() for metric in metrics) + "\n"
+
+
+REGISTRY = Registry()
+PROCESS_START = time.time()
+
+tasks_submitted = REGISTRY.register(Counter(
+    "sum4u_tasks_submitted_total", "提交的任务数", ["type"]))
+tasks_completed = REGISTRY.register(Counter(
+    "sum4u_tasks_completed_total", "成功完成的任务数", ["type"]))
+tasks_failed = REGISTRY.register(Counter(
+    "sum4u_tasks_failed_total", "失败的任务数", ["type"]))
+tasks_coalesced = REGISTRY.register(Counter(
+    "sum4u_tasks_coalesced_total", "合并到已有任务或直接返回已有结果的重复请求数", ["type", "state"]))
+tasks_in_flight = REGISTRY.register(Gauge(
+    "sum4u_tasks_in_flight", "正在处理的任务数", ["type"]))
+task_duration = REGISTRY.register(Histogram(
+    "sum4u_task_duration_seconds", "任务总耗时", ["type", "status"]))
+stage_duration = REGISTRY.register(Histogram(
+    "sum4u_stage_duration_seconds", "各处理阶段耗时", ["stage"]))
+model_cache_requests = REGISTRY.register(Counter(
+    "sum4u_whisper_model_cache_total", "Whisper模型缓存命中/未命中次数", ["model", "result"]))
+whisper_waiting = REGISTRY.register(Gauge(
+    "sum4u_whisper_queue_depth", "等待Whisper模型的转录任务数", ["model"]))
+whisper_busy = REGISTRY.register(Gauge(
+    "sum4u_whisper_workers_busy", "正在执行转录的Whisper模型数", ["model"]))
+llm_call_duration = REGISTRY.register(Histogram(
+    "sum4u_llm_call_duration_seconds", "LLM调用耗时", ["provider"]))
+llm_tokens = REGISTRY.register(Counter(
+    "sum4u_llm_tokens_total", "LLM消耗的token数", ["provider", "direction"]))
+cleanup_tokens_saved = REGISTRY.register(Counter(
+    "sum4u_cleanup_tokens_saved_total", "转录后处理估算节省的LLM输入token数"))
+download_bytes = REGISTRY.register(Counter(
+    "sum4u_download_bytes_total", "下载的音频字节数", ["platform"]))
+uptime = REGISTRY.register(Gauge(
+    "sum4u_process_uptime_seconds", "进程运行时间"))
+uptime.set_function(lambda: {(): round(time.time() - PROCESS_START, 1)})
+
+
+def observe_span(record: Dict) -> None:
+    """阶段结束时更新对应指标（由 instrumentation 调用）"""
+    name = record.get("name", "unknown")
+    duration = record.get("duration_s") or 0
+    stage_duration.observe(duration, stage=name)
+    if name == "llm_call":
+        provider = record.get("provider", "unknown")
+        llm_call_duration.observe(duration, provider=provider)
+        for field, direction in (("tokens_in", "in"), ("tokens_out", "out"), ("tokens_cached", "cached")):
+            if record.get(field):
+                llm_tokens.inc(record[field], provider=provider, direction=direction)
+    elif name == "cleanup" and record.get("tokens_saved"):
+        cleanup_tokens_saved.inc(record["tokens_saved"])
+    elif name == "download" and record.get("bytes"):
+        download_bytes.inc(record["bytes"], platform=record.get("platform", "unknown"))
+
+
+def render() -> str:
+    """导出全部指标的 Prometheus 文本格式"""
+    return REGISTRY.render()
+
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
@@ -0,0 +1,159 @@
+"""
+model_policy.py
+Whisper 模型自适应选择 - 根据音频时长、语言、当前排队情况和目标周转时间（SLA）为每个任务选择模型。
+
+--model auto（或Web UI中选择“自动”）时启用：负载高时降级到更小的模型，空闲时升级到更大的模型。
+"""
+
+import threading
+from typing import Optional, Dict, Any, List
+
+from .config import config_manager
+from . import metrics
+
+AUTO_MODEL = "auto"
+
+# 从小到大的模型梯度
+MODEL_LADDER = ("tiny", "base", "small", "medium", "large")
+
+# 默认实时率估计（转录耗时/音频时长，CPU），有实际观测值后以观测值为准
+DEFAULT_RTF = {"tiny": 0.05, "base": 0.1, "small": 0.3, "medium": 0.8, "large": 1.6}
+
+# 观测实时率的指数滑动平均权重
+_RTF_SMOOTHING = 0.3
+
+_observed_rtf: Dict[str, float] = {}
+_rtf_lock = threading.Lock()
+
+
+# 策略设置中的模型项及其默认值
+_MODEL_SETTING_DEFAULTS = {
+    "base_model": "small",
+    "min_model": "tiny",
+    "max_model": "medium",
+    "min_model_non_english": "base",
+}
+
+
+def get_policy_settings() -> Dict[str, Any]:
+    """读取模型选择策略配置"""
+    settings = {
+        **_MODEL_SETTING_DEFAULTS,
+        "sla_seconds": 1800,
+        "idle_upgrade": True,
+    }
+    settings.update(config_manager.config.get("model_policy", {}))
+    return settings
+
+
+def _ladder_key(model: str) -> str:
+    """large-v3、turbo（large-v3-turbo）等变体按 large 处理，small.en 等英文专用模型按对应大小处理"""
+    model = model.lower()
+    if model.endswith(".en"):
+        model = model[:-len(".en")]
+    return "large" if model.startswith("large") or model == "turbo" else model
+
+
+def _ladder_index(settings: Dict[str, Any], name: str) -> int:
+    """策略设置中某个模型项在梯度中的位置；不认识的模型名提示后使用默认值"""
+    value = str(settings.get(name) or "")
+    key = _ladder_key(value)
+    if key in MODEL_LADDER:
+        return MODEL_LADDER.index(key)
+    default = _MODEL_SETTING_DEFAULTS[name]
+    print(f"⚠️  model_policy.{name} 配置的模型 {value!r} 不在 {', '.join(MODEL_LADDER)} 中，使用默认值 {default}")
+    return MODEL_LADDER.index(default)
+
+
+def observe_rtf(model: str, audio_seconds: Optional[float], duration_s: Optional[float]) -> None:
+    """记录一次实际转录的实时率，用于后续估计"""
+    if not audio_seconds or not duration_s:
+        return
+    key = _ladder_key(model)
+    rtf = duration_s / audio_seconds
+    with _rtf_lock:
+        previous = _observed_rtf.get(key)
+        _observed_rtf[key] = rtf if previous is None else previous + _RTF_SMOOTHING * (rtf - previous)
+
+
+def estimate_rtf(model: str) -> float:
+    """估计模型实时率：优先使用本进程的观测值"""
+    key = _ladder_key(model)
+    with _rtf_lock:
+        if key in _observed_rtf:
+            return _observed_rtf[key]
+    return DEFAULT_RTF.get(key, DEFAULT_RTF["large"])
+
+
+def current_queue_depth() -> int:
+    """当前正在转录及等待转录的任务数"""
+    return int(metrics.whisper_waiting.total() + metrics.whisper_busy.total())
+
+
+def estimate_turnaround(model: str, duration: float, queue_depth: int) -> float:
+    """估计周转时间：假设排队任务与本任务时长相近，在同一个模型上依次执行"""
+    return (queue_depth + 1) * duration * estimate_rtf(model)
+
+
+def select_model(duration: Optional[float], language: Optional[str] = None,
+                 queue_depth: Optional[int] = None, sla_seconds: Optional[float] = None) -> Dict[str, Any]:
+    """
+    为一个转录任务选择Whisper模型
+    :param duration: 音频时长（秒），未知时使用基准模型
+    :param language: 音频语言（已知时），非英语不低于 min_model_non_english
+    :param queue_depth: 当前排队深度，默认读取进程内指标
+    :param sla_seconds: 目标周转时间，默认取配置
+    :return: {'model', 'reason', 'requested', 'queue_depth', 'estimated_seconds'}
+    """
+    settings = get_policy_settings()
+    if queue_depth is None:
+        queue_depth = current_queue_depth()
+    if sla_seconds is None:
+        sla_seconds = settings["sla_seconds"]
+
+    ladder: List[str] = list(MODEL_LADDER)
+    low = _ladder_index(settings, "min_model")
+    if language and language != "en":
+        low = max(low, _ladder_index(settings, "min_model_non_english"))
+    high = max(low, _ladder_index(settings, "max_model"))
+    index = min(max(_ladder_index(settings, "base_model"), low), high)
+
+    def choice(reason: str) -> Dict[str, Any]:
+        model = ladder[index]
+        return {
+            "model": model,
+            "reason": reason,
+            "requested": AUTO_MODEL,
+            "queue_depth": queue_depth,
+            "estimated_seconds": round(estimate_turnaround(model, duration, queue_depth), 1) if duration else None,
+        }
+
+    if not duration:
+        return choice("无法获取音频时长，使用基准模型")
+
+    if estimate_turnaround(ladder[index], duration, queue_depth) > sla_seconds:
+        while index > low and estimate_turnaround(ladder[index], duration, queue_depth) > sla_seconds:
+            index -= 1
+        if estimate_turnaround(ladder[index], duration, queue_depth) > sla_seconds:
+            return choice(f"排队 {queue_depth} 个任务，即使最小允许模型也无法满足 {sla_seconds:.0f} 秒目标，已降到最低")
+        return choice(f"排队 {queue_depth} 个任务，为满足 {sla_seconds:.0f} 秒目标降级")
+
+    if settings["idle_upgrade"] and queue_depth == 0:
+        upgraded = index
+        while upgraded < high and estimate_turnaround(ladder[upgraded + 1], duration, 0) <= sla_seconds:
+            upgraded += 1
+        if upgraded > index:
+            index = upgraded
+            return choice(f"当前空闲，{duration / 60:.1f} 分钟音频在目标时间内可使用更大的模型")
+
+    return choice(f"排队 {queue_depth} 个任务，基准模型可在 {sla_seconds:.0f} 秒目标内完成")
+
+
+def resolve_model(model: Optional[str], duration: Optional[float], language: Optional[str] = None) -> Dict[str, Any]:
+    """
+    解析请求的模型：auto 时由策略选择，否则原样使用并记录为手动指定
+    :return: 同 select_model
+    """
+    if model and model != AUTO_MODEL:
+        return {"model": model, "reason": "手动指定", "requested": model}
+    return select_model(duration, language)
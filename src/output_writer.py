@@ -0,0 +1,160 @@
+"""
+output_writer.py
+统一的结果写入 - 先写入同目录下的临时文件，fsync 后用 os.replace 原子替换目标文件：
+进程崩溃、断电或 Web 界面多个线程同时写入时，读到的要么是完整的旧文件，要么是完整的新文件，不会出现截断的半个文件。
+大转录的分段JSON可选 gzip 压缩保存（xxx.segments.json.gz），读取时用 resolve_output / read_text 透明兼容两种形式。
+"""
+
+import gzip
+import json
+import os
+import stat
+import tempfile
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Any, Optional, Union
+
+GZIP_SUFFIX = ".gz"
+
+
+def _read_umask() -> Optional[int]:
+    """从 /proc/self/status 读取当前 umask（Linux 4.7+），不改动进程的 umask；读取不到时返回 None"""
+    try:
+        with open("/proc/self/status", "r", encoding="ascii") as f:
+            for line in f:
+                if line.startswith("Umask:"):
+                    return int(line.split()[1], 8)
+    except (OSError, ValueError, IndexError):
+        pass
+    return None
+
+
+# mkstemp 创建的临时文件权限为 0600，替换前按 umask 恢复成与普通 open 一致的权限
+_UMASK = _read_umask()
+
+
+def init_umask():
+    """
+    在程序入口、尚未启动写文件的线程时调用一次：无法从 /proc 读取 umask 的平台上用 os.umask 取得当前值
+    （os.umask 只能先设置再恢复，期间其他线程创建的文件权限会不正确，所以不能在导入时或写文件时调用）
+    """
+    global _UMASK
+    if _UMASK is None:
+        _UMASK = os.umask(0o077)
+        os.umask(_UMASK)
+
+
+def get_output_settings() -> Dict[str, Any]:
+    """
+    读取写入设置：fsync 为替换前是否把数据刷到磁盘（关闭后仍是原子替换，只是断电时可能丢失最近的写入）；
+    compress_segments_min_mb 为分段JSON超过该大小（MB）时用 gzip 压缩保存，0表示不压缩
+    """
+    # config.py 保存配置时也使用本模块，这里按需导入避免循环导入
+    from .config import config_manager
+
+    settings = {"fsync": True, "compress_segments_min_mb": 0}
+    settings.update({k: v for k, v in config_manager.config.get("output_settings", {}).items() if k in settings})
+    return settings
+
+
+def _fsync_dir(directory: str):
+    """把目录项（重命名结果）刷到磁盘；Windows 不支持打开目录，跳过"""
+    if os.name != "posix":
+        return
+    fd = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+@contextmanager
+def atomic_open(path: Union[str, Path], mode: str = "w", encoding: Optional[str] = "utf-8", newline: Optional[str] = None,
+                fsync: Optional[bool] = None, file_mode: Optional[int] = None):
+    """
+    以原子方式写文件的上下文管理器，用法与 open 相同：with atomic_open(path) as f: f.write(...)。
+    正常退出时替换目标文件，发生异常时删除临时文件、目标文件保持不变
+    :param mode: "w" 或 "wb"
+    :param fsync: None 表示按 output_settings.fsync 设置
+    :param file_mode: 指定写入文件的权限（如保存密钥的配置文件用 0o600）；None 表示沿用已有目标文件的权限，目标不存在时按 umask
+    """
+    if fsync is None:
+        fsync = get_output_settings()["fsync"]
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    if file_mode is None:
+        try:
+            file_mode = stat.S_IMODE(os.stat(path).st_mode)
+        except FileNotFoundError:
+            file_mode = 0o666 & ~(0o022 if _UMASK is None else _UMASK)
+    fd, tmp_path = tempfile.mkstemp(prefix=f".{path.name}.", suffix=".tmp", dir=str(path.parent))
+    try:
+        if "b" in mode:
+            f = os.fdopen(fd, mode)
+        else:
+            f = os.fdopen(fd, mode, encoding=encoding, newline=newline)
+        with f:
+            os.chmod(tmp_path, file_mode)
+            yield f
+            f.flush()
+            if fsync:
+                os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+    if fsync:
+        _fsync_dir(str(path.parent))
+
+
+def atomic_write(path: Union[str, Path], data: Union[str, bytes], encoding: str = "utf-8", compress: bool = False,
+                 fsync: Optional[bool] = None, file_mode: Optional[int] = None) -> str:
+    """
+    原子写入整个文件
+    :param data: 文本或字节
+    :param compress: 以 gzip 压缩写入 path + '.gz'，并删除同名的未压缩文件（反之亦然），避免读到过期的另一种形式
+    :return: 实际写入的路径
+    """
+    path = str(path)
+    if isinstance(data, str):
+        data = data.encode(encoding)
+    target, stale = (path + GZIP_SUFFIX, path) if compress else (path, path + GZIP_SUFFIX)
+    if compress:
+        data = gzip.compress(data, compresslevel=6, mtime=0)
+    with atomic_open(target, "wb", fsync=fsync, file_mode=file_mode) as f:
+        f.write(data)
+    if os.path.exists(stale):
+        os.remove(stale)
+    return target
+
+
+def atomic_write_json(path: Union[str, Path], obj: Any, compress: bool = False, fsync: Optional[bool] = None,
+                      file_mode: Optional[int] = None, **dump_kwargs) -> str:
+    """把对象序列化为JSON后原子写入（先完整序列化，序列化失败不会动到目标文件）"""
+    dump_kwargs.setdefault("ensure_ascii", False)
+    return atomic_write(path, json.dumps(obj, **dump_kwargs), compress=compress, fsync=fsync, file_mode=file_mode)
+
+
+def resolve_output(path: Union[str, Path]) -> Optional[str]:
+    """返回实际存在的文件路径（原路径或其 .gz 压缩形式），都不存在时返回 None"""
+    path = str(path)
+    if os.path.exists(path):
+        return path
+    if os.path.exists(path + GZIP_SUFFIX):
+        return path + GZIP_SUFFIX
+    return None
+
+
+def read_text(path: Union[str, Path], encoding: str = "utf-8", errors: str = "strict") -> str:
+    """读取 atomic_write 写入的文本（自动识别 .gz 压缩形式）"""
+    actual = resolve_output(path) or str(path)
+    if actual.endswith(GZIP_SUFFIX):
+        with gzip.open(actual, "rt", encoding=encoding, errors=errors) as f:
+            return f.read()
+    with open(actual, "r", encoding=encoding, errors=errors) as f:
+        return f.read()
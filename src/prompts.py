@@ -3,6 +3,9 @@ prompts.py
 该文件存储所有用于摘要的提示词模板。
 """
 
+from functools import lru_cache
+from typing import Dict, Optional, Union, List
+
 prompt_default="""
 # Role
 教育内容分析师，专门从事视频课程内容的结构化整理和学习笔记生成
@@ -329,3 +332,37 @@ prompt_templates = {
     "爆款短视频文案": prompt_5,
     "youtube_视频总结": prompt_6,
 }
+
+
+@lru_cache(maxsize=64)
+def compile_prompt(prompt: str) -> str:
+    """
+    把提示词编译为字节稳定的系统消息前缀（统一换行符、去掉行尾空白与首尾空行），
+    同一模板每次请求发送完全相同的内容，便于服务端前缀缓存（DeepSeek上下文缓存、Anthropic cache_control）命中
+    """
+    lines = prompt.replace("\r\n", "\n").replace("\r", "\n").split("\n")
+    return "\n".join(line.rstrip() for line in lines).strip("\n")
+
+
+def select_prompts(template_names: Union[str, List[str]] = "default课堂笔记",
+                   custom_prompt: Optional[str] = None) -> Dict[str, str]:
+    """
+    解析本次任务使用的提示词：自定义提示词优先（名为 'custom'），否则按模板名依次取模板，
+    未知模板名回退到 default课堂笔记
+    :param template_names: 模板名列表，或逗号分隔的字符串（如 "default课堂笔记,youtube_精炼提取"）
+    :return: {模板名: 提示词}，保持给定顺序并去重
+    """
+    if custom_prompt:
+        return {"custom": custom_prompt}
+    if isinstance(template_names, str):
+        template_names = template_names.split(",")
+    prompts = {}
+    for name in template_names:
+        name = name.strip()
+        if not name:
+            continue
+        if name not in prompt_templates:
+            print(f"未知的提示词模板 {name}，使用 default课堂笔记")
+            name = "default课堂笔记"
+        prompts.setdefault(name, prompt_templates[name])
+    return prompts or {"default课堂笔记": prompt_default}
@@ -0,0 +1,273 @@
+"""
+results_catalog.py
+结果目录（SQLite）- 写入总结时登记一条记录，/api/results 直接分页查询，不再每次遍历 summaries/。
+
+用法:
+    python -m src.results_catalog rescan            # 与 summaries/ 目录做一致性重扫
+    python -m src.results_catalog list --platform youtube --page 1
+"""
+
+import argparse
+import os
+import re
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Optional, Dict, Any
+
+import pytz
+
+from .instrumentation import span
+from .search_index import index_outputs
+from .segments import summary_path_for_template
+from .output_writer import atomic_write
+
+CATALOG_PATH = Path("cache") / "catalog.db"
+SUMMARY_DIR = "summaries"
+
+# 文件名格式：{platform}_{video_id}_{YYYYmmdd_HHMMSS}_总结.md，一次生成多个模板时为 ..._{YYYYmmdd_HHMMSS}_{模板名}_总结.md
+_FILENAME_PATTERN = re.compile(
+    r'^(?P<platform>[a-z]+)_(?P<video_id>.*?)_(?P<stamp>\d{8}_\d{6})(?:_(?P<template>.+))?_总结\.md$')
+# 文件名中时间戳所用的时区（与 url_resolver.generate_filename 一致）
+_FILENAME_TZ = pytz.timezone('Asia/Shanghai')
+
+SORT_COLUMNS = {"modified": "mtime", "created": "created", "size": "size", "filename": "filename", "platform": "platform"}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    path TEXT PRIMARY KEY,
+    filename TEXT NOT NULL,
+    platform TEXT,
+    video_id TEXT,
+    template TEXT,
+    model TEXT,
+    transcript_path TEXT,
+    size INTEGER NOT NULL,
+    mtime REAL NOT NULL,
+    created REAL
+);
+CREATE INDEX IF NOT EXISTS idx_results_mtime ON results (mtime);
+CREATE INDEX IF NOT EXISTS idx_results_platform_mtime ON results (platform, mtime);
+CREATE INDEX IF NOT EXISTS idx_results_template_mtime ON results (template, mtime);
+CREATE INDEX IF NOT EXISTS idx_results_created ON results (created);
+CREATE INDEX IF NOT EXISTS idx_results_size ON results (size);
+CREATE INDEX IF NOT EXISTS idx_results_filename ON results (filename);
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+"""
+
+
+def parse_summary_filename(filename: str) -> Dict[str, Any]:
+    """从总结文件名解析平台、视频ID、生成时间和模板名（文件名不含模板名时为None）"""
+    match = _FILENAME_PATTERN.match(filename)
+    if not match:
+        return {"platform": None, "video_id": None, "created": None, "template": None}
+    try:
+        created = _FILENAME_TZ.localize(datetime.strptime(match.group("stamp"), "%Y%m%d_%H%M%S")).timestamp()
+    except ValueError:
+        created = None
+    return {"platform": match.group("platform"), "video_id": match.group("video_id"), "created": created,
+            "template": match.group("template")}
+
+
+class ResultsCatalog:
+    """SQLite 结果目录，每个线程使用独立连接"""
+
+    def __init__(self, db_path: Path = CATALOG_PATH, summary_dir: str = SUMMARY_DIR):
+        self.db_path = Path(db_path)
+        self.summary_dir = summary_dir
+        self._local = threading.local()
+        self._init_lock = threading.Lock()
+        self._initialized = False
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            self.db_path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(str(self.db_path), timeout=30)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        with self._init_lock:
+            if not self._initialized:
+                conn.executescript(_SCHEMA)
+                self._initialized = True
+                first_use = conn.execute("SELECT value FROM meta WHERE key = 'scanned_at'").fetchone() is None
+                if conn.execute("SELECT value FROM meta WHERE key = 'created_tz'").fetchone() is None:
+                    self._reparse_created(conn)
+            else:
+                first_use = False
+        if first_use:
+            # 首次使用时导入已有的总结文件
+            self.rescan(conn)
+        return conn
+
+    def _reparse_created(self, conn: sqlite3.Connection):
+        """早期版本按服务器本地时区解析文件名中的生成时间，按 _FILENAME_TZ 重新计算一次"""
+        with conn:
+            for row in conn.execute("SELECT path, filename FROM results").fetchall():
+                created = parse_summary_filename(row["filename"])["created"]
+                if created is not None:
+                    conn.execute("UPDATE results SET created = ? WHERE path = ?", (created, row["path"]))
+            conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('created_tz', ?)", (_FILENAME_TZ.zone,))
+
+    def record(self, summary_path: str, template: Optional[str] = None, model: Optional[str] = None,
+               transcript_path: Optional[str] = None):
+        """登记（或更新）一条总结记录，写入总结文件后调用"""
+        conn = self._connect()
+        stat = os.stat(summary_path)
+        filename = os.path.basename(summary_path)
+        info = parse_summary_filename(filename)
+        with conn:
+            conn.execute(
+                "INSERT INTO results (path, filename, platform, video_id, template, model, transcript_path, size, mtime, created) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT(path) DO UPDATE SET size = excluded.size, mtime = excluded.mtime, "
+                "template = COALESCE(excluded.template, template), model = COALESCE(excluded.model, model), "
+                "transcript_path = COALESCE(excluded.transcript_path, transcript_path)",
+                (self._key(summary_path), filename, info["platform"], info["video_id"], template or info["template"], model,
+                 transcript_path, stat.st_size, stat.st_mtime, info["created"] or stat.st_mtime)
+            )
+
+    def _key(self, path: str) -> str:
+        """统一为相对当前目录的路径（与 /download-result 使用的路径一致）"""
+        return os.path.relpath(path).replace(os.sep, "/")
+
+    def query(self, page: int = 1, page_size: int = 50, sort: str = "modified", order: str = "desc",
+              platform: Optional[str] = None, template: Optional[str] = None,
+              date_from: Optional[float] = None, date_to: Optional[float] = None) -> Dict[str, Any]:
+        """
+        分页查询
+        :param sort: modified / created / size / filename / platform
+        :param date_from: 修改时间下限（时间戳）
+        :param date_to: 修改时间上限（时间戳）
+        :return: {'results', 'total', 'page', 'page_size'}
+        """
+        conn = self._connect()
+        where, params = [], []
+        if platform:
+            where.append("platform = ?")
+            params.append(platform)
+        if template:
+            where.append("template = ?")
+            params.append(template)
+        if date_from is not None:
+            where.append("mtime >= ?")
+            params.append(date_from)
+        if date_to is not None:
+            where.append("mtime < ?")
+            params.append(date_to)
+        clause = f"WHERE {' AND '.join(where)}" if where else ""
+        column = SORT_COLUMNS.get(sort, "mtime")
+        direction = "ASC" if order.lower() == "asc" else "DESC"
+        page = max(1, page)
+        page_size = min(max(1, page_size), 500)
+
+        total = conn.execute(f"SELECT COUNT(*) FROM results {clause}", params).fetchone()[0]
+        rows = conn.execute(
+            f"SELECT * FROM results {clause} ORDER BY {column} {direction} LIMIT ? OFFSET ?",
+            params + [page_size, (page - 1) * page_size]
+        ).fetchall()
+        return {"results": [dict(row) for row in rows], "total": total, "page": page, "page_size": page_size}
+
+    def rescan(self, conn: Optional[sqlite3.Connection] = None) -> Dict[str, int]:
+        """
+        与 summaries/ 目录做一致性重扫：补登新文件、更新变化的文件、删除已不存在的记录
+        :return: {'added', 'updated', 'removed', 'total'}
+        """
+        conn = conn or self._connect()
+        on_disk = {}
+        if os.path.isdir(self.summary_dir):
+            with os.scandir(self.summary_dir) as entries:
+                for entry in entries:
+                    if entry.is_file() and entry.name.endswith(".md"):
+                        on_disk[self._key(entry.path)] = entry
+        known = {row["path"]: (row["size"], row["mtime"]) for row in conn.execute("SELECT path, size, mtime FROM results")}
+
+        added = updated = 0
+        with conn:
+            for path, entry in on_disk.items():
+                stat = entry.stat()
+                if path not in known:
+                    info = parse_summary_filename(entry.name)
+                    conn.execute(
+                        "INSERT INTO results (path, filename, platform, video_id, template, size, mtime, created) "
+                        "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                        (path, entry.name, info["platform"], info["video_id"], info["template"], stat.st_size,
+                         stat.st_mtime, info["created"] or stat.st_mtime)
+                    )
+                    added += 1
+                elif known[path] != (stat.st_size, stat.st_mtime):
+                    conn.execute("UPDATE results SET size = ?, mtime = ? WHERE path = ?", (stat.st_size, stat.st_mtime, path))
+                    updated += 1
+            # 目录外（如 --output 指定路径）的记录只要文件还在就保留
+            stale = [path for path in known if path not in on_disk and not os.path.exists(path)]
+            conn.executemany("DELETE FROM results WHERE path = ?", [(path,) for path in stale])
+            conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('scanned_at', ?)", (str(time.time()),))
+        return {"added": added, "updated": updated, "removed": len(stale), "total": len(on_disk)}
+
+
+catalog = ResultsCatalog()
+
+
+def record_summary(summary_path: str, template: Optional[str] = None, model: Optional[str] = None,
+                   transcript_path: Optional[str] = None):
+    """登记新写入的总结；目录不可用时只打印警告，不影响主流程"""
+    try:
+        catalog.record(summary_path, template=template, model=model, transcript_path=transcript_path)
+    except (sqlite3.Error, OSError) as e:
+        print(f"结果目录登记失败（可运行 python -m src.results_catalog rescan 修复）: {e}")
+
+
+def save_summaries(summaries: Dict[str, str], summary_path: str, model: Optional[str] = None,
+                   transcript_path: Optional[str] = None) -> Dict[str, str]:
+    """
+    写入一个任务的总结文件，登记到结果目录并与转录一起加入全文索引。
+    只有一个模板时写入 summary_path；多个模板时每个模板写入 xxx_{模板名}_总结.md
+    :param summaries: {模板名: 总结}（自定义提示词的模板名为 'custom'）
+    :return: {模板名: 总结文件路径}
+    """
+    paths = {}
+    with span("write") as record:
+        for name, summary in summaries.items():
+            path = summary_path if len(summaries) == 1 else summary_path_for_template(summary_path, name)
+            atomic_write(path, summary)
+            paths[name] = str(path)
+        record["bytes"] = sum(os.path.getsize(path) for path in paths.values())
+    for name, path in paths.items():
+        record_summary(path, name, model=model, transcript_path=transcript_path)
+    index_outputs(transcript_path, *paths.values())
+    return paths
+
+
+def main():
+    parser = argparse.ArgumentParser(description="结果目录管理")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("rescan", help="与 summaries/ 目录做一致性重扫")
+    list_parser = sub.add_parser("list", help="分页列出结果")
+    list_parser.add_argument("--page", type=int, default=1)
+    list_parser.add_argument("--page-size", type=int, default=20)
+    list_parser.add_argument("--platform")
+    list_parser.add_argument("--template")
+    list_parser.add_argument("--sort", default="modified", choices=sorted(SORT_COLUMNS))
+    list_parser.add_argument("--order", default="desc", choices=("asc", "desc"))
+    args = parser.parse_args()
+
+    if args.command == "rescan":
+        start = time.perf_counter()
+        stats = catalog.rescan()
+        print(f"重扫完成: 新增 {stats['added']}，更新 {stats['updated']}，删除 {stats['removed']}，"
+              f"共 {stats['total']} 个结果（{time.perf_counter() - start:.2f} 秒）")
+    else:
+        data = catalog.query(page=args.page, page_size=args.page_size, sort=args.sort, order=args.order,
+                             platform=args.platform, template=args.template)
+        for row in data["results"]:
+            modified = datetime.fromtimestamp(row["mtime"]).strftime("%Y-%m-%d %H:%M:%S")
+            print(f"{modified}  {row['size']:>8}  {row['template'] or '-':<16} {row['path']}")
+        print(f"第 {data['page']} 页，共 {data['total']} 条")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,278 @@
+"""
+search_index.py
+转录与总结的全文检索（SQLite FTS5）- 写入结果时增量索引，按相关度返回带摘录的命中。
+
+中文没有空格分词，入库与查询时把连续的中日韩字符切成重叠二元组（“语音识别” -> “语音 音识 识别”），
+查询词按短语匹配，任意长度的中文子串都能命中；英文等仍由 unicode61 分词。
+转录优先按带时间戳的分段（*.segments.json）索引，命中可以直接定位到时间点。
+
+用法:
+    python -m src.search_index reindex
+    python -m src.search_index search "语音识别" --kind transcript --limit 10
+"""
+
+import argparse
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Optional, Dict, Any, List, Tuple
+
+from .segments import segments_path_for, format_clock
+from .output_writer import resolve_output, read_text
+
+INDEX_PATH = Path("cache") / "search.db"
+INDEX_DIRS = {"transcript": ("transcriptions", ".txt"), "summary": ("summaries", ".md")}
+
+# 中日韩统一表意文字、扩展A、兼容表意文字、假名、谚文
+_CJK_RUN = re.compile(r'[぀-ヿ㐀-䶿一-鿿가-힯豈-﫿]+')
+SNIPPET_CHARS = 40
+# 相关度排序的候选上限：常见词命中几十万分段时，只在最近索引的这么多条命中里按 bm25 排序，
+# 避免为全部命中计算相关度；命中数少于上限时结果与全量排序相同。
+# 命中数超过上限时，更早索引的分段不参与排序，offset 超过上限后不再有结果（/api/search 返回 total 与 ranked 提示）
+RANK_CANDIDATES = 2000
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    id INTEGER PRIMARY KEY,
+    path TEXT UNIQUE NOT NULL,
+    kind TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS passages (
+    id INTEGER PRIMARY KEY,
+    doc_id INTEGER NOT NULL,
+    start REAL,
+    end REAL,
+    text TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_passages_doc ON passages (doc_id);
+CREATE VIRTUAL TABLE IF NOT EXISTS passages_fts USING fts5(body, content='', tokenize='unicode61 remove_diacritics 2');
+"""
+
+
+def cjk_bigrams(text: str) -> str:
+    """把连续的中日韩字符替换为空格分隔的重叠二元组，单个字保持原样"""
+    def split(match):
+        run = match.group(0)
+        if len(run) == 1:
+            return f" {run} "
+        return " " + " ".join(run[i:i + 2] for i in range(len(run) - 1)) + " "
+    return _CJK_RUN.sub(split, text)
+
+
+def build_match_query(query: str) -> str:
+    """
+    把用户输入转为FTS5查询：按空白拆成多个词（同时满足），每个词作为短语匹配；
+    单个中文字按前缀匹配（匹配以该字开头的二元组）
+    """
+    terms = []
+    for term in query.split():
+        tokens = cjk_bigrams(term).split()
+        if not tokens:
+            continue
+        if len(tokens) == 1 and _CJK_RUN.fullmatch(tokens[0]) and len(tokens[0]) == 1:
+            terms.append(f'"{tokens[0]}"*')
+        else:
+            escaped = " ".join(token.replace('"', '""') for token in tokens)
+            terms.append(f'"{escaped}"')
+    return " AND ".join(terms)
+
+
+def make_snippet(text: str, query: str, width: int = SNIPPET_CHARS) -> str:
+    """在原文中定位第一个查询词，截取前后文并用【】标出"""
+    lowered = text.lower()
+    for term in query.split():
+        pos = lowered.find(term.lower())
+        if pos >= 0:
+            start = max(0, pos - width)
+            end = min(len(text), pos + len(term) + width)
+            return (("…" if start else "") + text[start:pos] + "【" + text[pos:pos + len(term)] + "】"
+                    + text[pos + len(term):end] + ("…" if end < len(text) else ""))
+    return text[:width * 2] + ("…" if len(text) > width * 2 else "")
+
+
+def _passages_for(path: str, kind: str) -> List[Tuple[Optional[float], Optional[float], str]]:
+    """把文件切成索引单元：转录优先使用时间戳分段，否则按非空行/段落"""
+    if kind == "transcript":
+        seg_path = resolve_output(segments_path_for(path))
+        if seg_path:
+            data = json.loads(read_text(seg_path))
+            return [(s["start"], s["end"], s["text"]) for s in data.get("segments", []) if s.get("text")]
+    with open(path, "r", encoding="utf-8", errors="replace") as f:
+        content = f.read()
+    return [(None, None, block.strip()) for block in re.split(r'\n\s*\n|\n', content) if block.strip()]
+
+
+class SearchIndex:
+    """全文索引，每个线程使用独立连接"""
+
+    def __init__(self, db_path: Path = INDEX_PATH):
+        self.db_path = Path(db_path)
+        self._local = threading.local()
+        self._init_lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._initialized = False
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            self.db_path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(str(self.db_path), timeout=30)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        with self._init_lock:
+            if not self._initialized:
+                conn.executescript(_SCHEMA)
+                self._initialized = True
+        return conn
+
+    def _delete_document(self, conn: sqlite3.Connection, doc_id: int):
+        # 无内容表的FTS删除需要提供原先写入的内容
+        rows = conn.execute("SELECT id, text FROM passages WHERE doc_id = ?", (doc_id,)).fetchall()
+        conn.executemany("INSERT INTO passages_fts (passages_fts, rowid, body) VALUES ('delete', ?, ?)",
+                         [(row["id"], cjk_bigrams(row["text"])) for row in rows])
+        conn.execute("DELETE FROM passages WHERE doc_id = ?", (doc_id,))
+        conn.execute("DELETE FROM documents WHERE id = ?", (doc_id,))
+
+    def index_file(self, path: str, kind: str) -> bool:
+        """
+        增量索引一个文件（大小和修改时间未变时跳过）
+        :param kind: transcript / summary
+        :return: 是否重新索引
+        """
+        conn = self._connect()
+        key = os.path.relpath(path).replace(os.sep, "/")
+        stat = os.stat(path)
+        with self._write_lock:
+            row = conn.execute("SELECT id, size, mtime FROM documents WHERE path = ?", (key,)).fetchone()
+            if row and (row["size"], row["mtime"]) == (stat.st_size, stat.st_mtime):
+                return False
+            passages = _passages_for(path, kind)
+            with conn:
+                if row:
+                    self._delete_document(conn, row["id"])
+                doc_id = conn.execute("INSERT INTO documents (path, kind, size, mtime) VALUES (?, ?, ?, ?)",
+                                      (key, kind, stat.st_size, stat.st_mtime)).lastrowid
+                for start, end, text in passages:
+                    passage_id = conn.execute("INSERT INTO passages (doc_id, start, end, text) VALUES (?, ?, ?, ?)",
+                                              (doc_id, start, end, text)).lastrowid
+                    conn.execute("INSERT INTO passages_fts (rowid, body) VALUES (?, ?)", (passage_id, cjk_bigrams(text)))
+        return True
+
+    def remove_missing(self) -> int:
+        """删除磁盘上已不存在的文件的索引"""
+        conn = self._connect()
+        removed = 0
+        with self._write_lock, conn:
+            for row in conn.execute("SELECT id, path FROM documents").fetchall():
+                if not os.path.exists(row["path"]):
+                    self._delete_document(conn, row["id"])
+                    removed += 1
+        return removed
+
+    def reindex(self) -> Dict[str, int]:
+        """增量扫描 transcriptions/ 与 summaries/"""
+        indexed = skipped = 0
+        for kind, (directory, suffix) in INDEX_DIRS.items():
+            if not os.path.isdir(directory):
+                continue
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    if entry.is_file() and entry.name.endswith(suffix):
+                        if self.index_file(entry.path, kind):
+                            indexed += 1
+                        else:
+                            skipped += 1
+        return {"indexed": indexed, "skipped": skipped, "removed": self.remove_missing()}
+
+    def count(self, query: str, kind: Optional[str] = None) -> int:
+        """命中的分段总数（不计算相关度）"""
+        match = build_match_query(query)
+        if not match:
+            return 0
+        kind_clause = ("AND rowid IN (SELECT p.id FROM passages p JOIN documents d ON d.id = p.doc_id WHERE d.kind = ?)"
+                       if kind else "")
+        row = self._connect().execute(f"SELECT COUNT(*) FROM passages_fts WHERE passages_fts MATCH ? {kind_clause}",
+                                      [match] + ([kind] if kind else [])).fetchone()
+        return row[0]
+
+    def search(self, query: str, kind: Optional[str] = None, limit: int = 20, offset: int = 0) -> List[Dict[str, Any]]:
+        """
+        全文检索
+        :param kind: 只检索 transcript 或 summary
+        :param offset: 分页偏移，只在最近的 RANK_CANDIDATES 条命中内有效，超过时返回空列表
+        :return: 按相关度排序的命中 [{'path', 'kind', 'start', 'end', 'snippet', 'score'}]
+        """
+        match = build_match_query(query)
+        if not match:
+            return []
+        conn = self._connect()
+        kind_clause = "AND d.kind = ?" if kind else ""
+        sql = ("WITH hits AS ("
+               "SELECT f.rowid AS id, f.rank AS score FROM passages_fts f "
+               "JOIN passages p ON p.id = f.rowid JOIN documents d ON d.id = p.doc_id "
+               f"WHERE passages_fts MATCH ? {kind_clause} ORDER BY f.rowid DESC LIMIT ?) "
+               "SELECT p.text, p.start, p.end, d.path, d.kind, hits.score FROM hits "
+               "JOIN passages p ON p.id = hits.id JOIN documents d ON d.id = p.doc_id "
+               "ORDER BY hits.score LIMIT ? OFFSET ?")
+        params: List[Any] = [match] + ([kind] if kind else [])
+        params += [RANK_CANDIDATES, min(max(1, limit), 200), min(max(0, offset), RANK_CANDIDATES)]
+        return [{
+            "path": row["path"],
+            "kind": row["kind"],
+            "start": row["start"],
+            "end": row["end"],
+            "snippet": make_snippet(row["text"], query),
+            "score": round(row["score"], 4),
+        } for row in conn.execute(sql, params)]
+
+
+search_index = SearchIndex()
+
+
+def index_outputs(*paths: Optional[str]):
+    """索引新写入的转录/总结文件；索引失败只打印警告，不影响主流程"""
+    for path in paths:
+        if not path:
+            continue
+        kind = "summary" if str(path).endswith(".md") else "transcript"
+        try:
+            search_index.index_file(str(path), kind)
+        except (sqlite3.Error, OSError, ValueError) as e:
+            print(f"全文索引失败（可运行 python -m src.search_index reindex 修复）: {e}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="转录与总结全文检索")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("reindex", help="增量索引 transcriptions/ 与 summaries/")
+    search_parser = sub.add_parser("search", help="检索")
+    search_parser.add_argument("query", help="检索词，多个词用空格分隔（同时满足）")
+    search_parser.add_argument("--kind", choices=sorted(INDEX_DIRS), help="只检索转录或总结")
+    search_parser.add_argument("--limit", type=int, default=10)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    if args.command == "reindex":
+        stats = search_index.reindex()
+        print(f"索引完成: 更新 {stats['indexed']}，未变化 {stats['skipped']}，删除 {stats['removed']}"
+              f"（{time.perf_counter() - start:.2f} 秒）")
+        return
+    hits = search_index.search(args.query, kind=args.kind, limit=args.limit)
+    for hit in hits:
+        position = f" [{format_clock(hit['start'])}]" if hit["start"] is not None else ""
+        print(f"{hit['path']}{position}\n    {hit['snippet']}")
+    total = search_index.count(args.query, kind=args.kind)
+    ranked = f"，仅在最近的 {RANK_CANDIDATES} 条命中中排序" if total > RANK_CANDIDATES else ""
+    print(f"共 {total} 条命中，显示 {len(hits)} 条{ranked}（{(time.perf_counter() - start) * 1000:.1f} ms）")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,206 @@
+"""
+segments.py
+转录分段（带时间戳）的存储与导出 - 支持 SRT/VTT/JSON 字幕导出，无需重新运行模型。
+
+用法:
+    python -m src.segments transcriptions/xxx_转录.segments.json --format srt,vtt
+"""
+
+import argparse
+import json
+from pathlib import Path
+from typing import List, Dict, Any, Optional
+
+from .output_writer import atomic_write, read_text, get_output_settings, GZIP_SUFFIX
+
+SEGMENTS_SUFFIX = ".segments.json"
+SUBTITLE_FORMATS = ("srt", "vtt", "json")
+
+
+def compact_segments(raw_segments: List[Dict[str, Any]], offset: float = 0.0) -> List[Dict[str, Any]]:
+    """
+    从 whisper 结果中提取精简分段（start, end, text, avg_logprob）
+    :param raw_segments: whisper transcribe 返回的 segments
+    :param offset: 时间偏移（秒），分段转录时为该段在原音频中的起点
+    """
+    segments = []
+    for seg in raw_segments or []:
+        text = (seg.get("text") or "").strip()
+        if not text:
+            continue
+        segments.append({
+            "start": round(seg["start"] + offset, 2),
+            "end": round(seg["end"] + offset, 2),
+            "text": text,
+            "avg_logprob": round(seg["avg_logprob"], 3) if seg.get("avg_logprob") is not None else None,
+        })
+    return segments
+
+
+def segments_path_for(transcript_path: str) -> str:
+    """转录文本路径对应的分段文件路径（xxx_转录.txt -> xxx_转录.segments.json）"""
+    path = Path(transcript_path)
+    return str(path.with_name(path.stem + SEGMENTS_SUFFIX))
+
+
+def transcript_path_for_summary(summary_path: str, transcriptions_dir: str = "transcriptions") -> str:
+    """根据总结文件路径生成对应的转录文本路径（xxx_总结.md -> transcriptions/xxx_转录.txt）"""
+    stem = Path(summary_path).stem
+    stem = stem[:-len("_总结")] + "_转录" if stem.endswith("_总结") else stem + "_转录"
+    return str(Path(transcriptions_dir) / f"{stem}.txt")
+
+
+def summary_path_for_template(summary_path: str, template: str) -> str:
+    """一次生成多个模板的总结时，每个模板的总结路径（xxx_总结.md -> xxx_{模板名}_总结.md）"""
+    path = Path(summary_path)
+    stem = path.stem[:-len("_总结")] if path.stem.endswith("_总结") else path.stem
+    return str(path.with_name(f"{stem}_{template}_总结{path.suffix}"))
+
+
+def save_segments(result: Dict[str, Any], path: str) -> str:
+    """
+    保存转录结果（language、duration、segments）为JSON；
+    超过 output_settings.compress_segments_min_mb 时以 gzip 压缩保存为 path + '.gz'
+    :return: 实际写入的路径
+    """
+    data = {
+        "language": result.get("language"),
+        "duration": result.get("duration"),
+        "segments": result.get("segments", []),
+    }
+    payload = json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    min_mb = get_output_settings()["compress_segments_min_mb"]
+    return atomic_write(path, payload, compress=bool(min_mb) and len(payload) >= min_mb * 1024 * 1024)
+
+
+def save_transcript(result: Dict[str, Any], transcript_path: str) -> str:
+    """
+    保存转录文本，并在旁边保存分段JSON
+    :param result: transcribe_audio_segments 的返回值
+    :param transcript_path: 转录文本路径
+    :return: 分段文件路径
+    """
+    atomic_write(transcript_path, result["text"])
+    return save_segments(result, segments_path_for(transcript_path))
+
+
+def load_segments(path: str) -> Dict[str, Any]:
+    """读取分段JSON（兼容压缩保存的 .gz 形式）"""
+    return json.loads(read_text(path))
+
+
+def format_timestamp(seconds: float, separator: str = ",", always_hours: bool = True) -> str:
+    """秒数转为 HH:MM:SS,mmm（SRT）或 HH:MM:SS.mmm（VTT）"""
+    millis = int(round(max(seconds, 0) * 1000))
+    hours, millis = divmod(millis, 3_600_000)
+    minutes, millis = divmod(millis, 60_000)
+    secs, millis = divmod(millis, 1000)
+    if hours or always_hours:
+        return f"{hours:02d}:{minutes:02d}:{secs:02d}{separator}{millis:03d}"
+    return f"{minutes:02d}:{secs:02d}{separator}{millis:03d}"
+
+
+def format_clock(seconds: float) -> str:
+    """秒数转为 HH:MM:SS，用于摘要中引用时间范围"""
+    seconds = int(seconds)
+    return f"{seconds // 3600:02d}:{seconds % 3600 // 60:02d}:{seconds % 60:02d}"
+
+
+def to_srt(segments: List[Dict[str, Any]]) -> str:
+    """导出为SRT字幕"""
+    blocks = []
+    for i, seg in enumerate(segments, 1):
+        blocks.append(f"{i}\n{format_timestamp(seg['start'])} --> {format_timestamp(seg['end'])}\n{seg['text']}\n")
+    return "\n".join(blocks)
+
+
+def to_vtt(segments: List[Dict[str, Any]]) -> str:
+    """导出为WebVTT字幕"""
+    blocks = ["WEBVTT\n"]
+    for seg in segments:
+        blocks.append(f"{format_timestamp(seg['start'], '.')} --> {format_timestamp(seg['end'], '.')}\n{seg['text']}\n")
+    return "\n".join(blocks)
+
+
+def to_json(segments: List[Dict[str, Any]]) -> str:
+    """导出为JSON（便于其他工具二次处理）"""
+    return json.dumps(segments, ensure_ascii=False, indent=2)
+
+
+EXPORTERS = {"srt": to_srt, "vtt": to_vtt, "json": to_json}
+
+
+def export_subtitles(segments: List[Dict[str, Any]], base_path: str, formats=("srt",)) -> List[str]:
+    """
+    导出字幕文件
+    :param base_path: 输出路径（不含扩展名）
+    :param formats: 导出格式列表，可选 srt/vtt/json
+    :return: 生成的文件路径列表
+    """
+    written = []
+    for fmt in formats:
+        fmt = fmt.strip().lower()
+        if fmt not in EXPORTERS:
+            raise ValueError(f"不支持的字幕格式: {fmt}，可选: {', '.join(SUBTITLE_FORMATS)}")
+        path = f"{base_path}.{fmt}"
+        atomic_write(path, EXPORTERS[fmt](segments))
+        written.append(path)
+    return written
+
+
+def _join_texts(texts: List[str]) -> str:
+    """拼接分段文本：中文直接相连，英文等以空格分隔"""
+    joined = ""
+    for text in texts:
+        if joined and (joined[-1].isascii() or text[0].isascii()):
+            joined += " "
+        joined += text
+    return joined
+
+
+def segments_to_timed_text(segments: List[Dict[str, Any]], window_seconds: float = 60.0) -> str:
+    """
+    把分段合并为带时间范围的段落，供摘要分段使用：
+    每个段落约 window_seconds 秒，形如 "[00:01:00-00:02:03] ……"，一段一行，
+    split_text 按行切分时不会把时间范围拆开，摘要可以直接引用时间点
+    """
+    paragraphs = []
+    buf: List[str] = []
+    start: Optional[float] = None
+    end = 0.0
+    for seg in segments:
+        if start is None:
+            start = seg["start"]
+        buf.append(seg["text"])
+        end = seg["end"]
+        if end - start >= window_seconds:
+            paragraphs.append(f"[{format_clock(start)}-{format_clock(end)}] {_join_texts(buf)}")
+            buf, start = [], None
+    if buf:
+        paragraphs.append(f"[{format_clock(start)}-{format_clock(end)}] {_join_texts(buf)}")
+    return "\n".join(paragraphs)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="从已保存的转录分段导出字幕")
+    parser.add_argument("segments_file", help="分段JSON文件（*.segments.json 或压缩保存的 *.segments.json.gz）")
+    parser.add_argument("--format", default="srt", help="导出格式，逗号分隔：srt, vtt, json，默认srt")
+    parser.add_argument("--output", help="输出路径（不含扩展名），默认与分段文件同名")
+    args = parser.parse_args()
+
+    data = load_segments(args.segments_file)
+    base = args.output
+    if not base:
+        segments_file = args.segments_file
+        if segments_file.endswith(GZIP_SUFFIX):
+            segments_file = segments_file[:-len(GZIP_SUFFIX)]
+        if segments_file.endswith(SEGMENTS_SUFFIX):
+            base = segments_file[:-len(SEGMENTS_SUFFIX)]
+        else:
+            base = str(Path(segments_file).with_suffix(""))
+    for path in export_subtitles(data.get("segments", []), base, args.format.split(",")):
+        print(f"字幕已导出: {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -3,12 +3,17 @@ summarize.py
 AI 摘要模块 - 支持多种API提供商。
 """
 
-from typing import Optional
-import requests
+from typing import Optional, Dict, Any, List
+from concurrent.futures import ThreadPoolExecutor
+import contextvars
+import threading
 import os
 
-from .prompts import prompt_default, prompt_templates
-from .config import get_api_key
+from .prompts import prompt_default, prompt_templates, compile_prompt
+from .config import get_api_key, config_manager
+from .instrumentation import span, current_trace
+from .segments import segments_to_timed_text
+from .transcript_cleanup import prepare_for_summary
 
 # API URL 配置
 API_URLS = {
@@ -17,6 +22,74 @@ API_URLS = {
     "anthropic": "https://api.anthropic.com/v1/messages"  # 这里使用示例URL，实际需要根据Anthropic API格式调整
 }
 
+# 本地OpenAI兼容服务（llama.cpp server、vLLM、Ollama等），地址来自 config.json 的 local_llm
+LOCAL_PROVIDER = "local"
+
+# 单段最大字数（托管API）
+MAX_CHUNK_CHARS = 15000
+
+# 各提供商的并发闸门，跨线程共享，避免Web UI多任务同时压垮本地推理服务
+_provider_gates = {}
+_provider_gates_lock = threading.Lock()
+
+
+class _ConcurrencyGate:
+    """
+    可调整上限的并发闸门（用法同信号量：with gate: ...）。
+    配置热加载或 /api/config 修改并发数时原地调整上限，已在进行的请求仍计入，不会因换成新的信号量而超出上限
+    """
+
+    def __init__(self, limit: int):
+        self._condition = threading.Condition()
+        self._limit = limit
+        self._active = 0
+
+    def set_limit(self, limit: int):
+        with self._condition:
+            if limit != self._limit:
+                self._limit = limit
+                self._condition.notify_all()
+
+    def __enter__(self):
+        with self._condition:
+            while self._active >= self._limit:
+                self._condition.wait()
+            self._active += 1
+        return self
+
+    def __exit__(self, *exc):
+        with self._condition:
+            self._active -= 1
+            self._condition.notify()
+        return False
+
+
+def _get_provider_gate(provider: str, max_concurrency: int) -> _ConcurrencyGate:
+    """获取（或创建）提供商对应的并发闸门，并按当前配置更新上限"""
+    with _provider_gates_lock:
+        gate = _provider_gates.get(provider)
+        if gate is None:
+            gate = _provider_gates[provider] = _ConcurrencyGate(max_concurrency)
+    gate.set_limit(max_concurrency)
+    return gate
+
+
+def get_chunk_chars(provider: str, prompt: Optional[str] = None) -> int:
+    """
+    计算单段最大字数。
+    本地模型按 context_length 预留提示词和输出空间后折算（中文约1字1 token，按保守值估算）。
+    :param provider: API提供商
+    :param prompt: 本次使用的提示词
+    :return: 单段最大字数
+    """
+    if provider != LOCAL_PROVIDER:
+        return MAX_CHUNK_CHARS
+    context_length = int(config_manager.get_local_llm_config().get("context_length") or 8192)
+    prompt_len = len(prompt if prompt else prompt_default)
+    # 预留四分之一上下文给输出
+    budget = context_length - context_length // 4 - prompt_len
+    return max(1000, min(MAX_CHUNK_CHARS, budget))
+
 
 def split_text(text, max_len=15000):
     """将文本按最大长度分段，优先按段落分割。"""
@@ -36,40 +109,124 @@ def split_text(text, max_len=15000):
     return parts
 
 
-def summarize_text(text: str, prompt: Optional[str] = None, model: str = "deepseek-chat", provider: str = "deepseek") -> str:
+def cached_prompt_tokens(usage: dict) -> Optional[int]:
+    """
+    从OpenAI兼容响应的 usage 中读取命中缓存的输入token数：
+    DeepSeek 为 prompt_cache_hit_tokens，OpenAI/vLLM 为 prompt_tokens_details.cached_tokens；都没有时返回None
+    """
+    if usage.get("prompt_cache_hit_tokens") is not None:
+        return usage["prompt_cache_hit_tokens"]
+    details = usage.get("prompt_tokens_details") or {}
+    return details.get("cached_tokens")
+
+
+def summarize_text(text: str, prompt: Optional[str] = None, model: str = "deepseek-chat", provider: str = "deepseek",
+                   segments: Optional[list] = None, language: Optional[str] = None, cleanup: bool = True) -> str:
     """
     调用AI API对转录文本进行结构化总结。
-    自动分段摘要，单段不超过15000字。
+    自动分段摘要，单段不超过15000字（本地模型按 context_length 折算）。
+    提供 segments 时按时间戳组织文本，每段带 [HH:MM:SS-HH:MM:SS] 时间范围，摘要可引用时间点。
+    发送前先做转录后处理（折叠重复循环、删除语气词等，见 transcript_cleanup），减少输入token。
     :param text: 需要总结的文本
     :param prompt: 自定义摘要提示词（可选）
-    :param model: AI模型名
-    :param provider: API提供商 ('deepseek', 'openai', 'anthropic')
+    :param model: AI模型名（local 提供商使用 config.json 中 local_llm.model）
+    :param provider: API提供商 ('deepseek', 'openai', 'anthropic', 'local')
+    :param segments: 转录分段（transcribe_audio_segments 返回的 segments，可选）
+    :param language: 转录语言，决定是否做繁简转换
+    :param cleanup: 是否做转录后处理（递归摘要时对模型输出不再处理）
     :return: 结构化摘要文本
     """
-    def call_api(chunk):
-        api_key = get_api_key(provider)
-        if not api_key:
-            raise ValueError(f"未找到 {provider} 的API密钥，请在 config.json 中设置")
+    if cleanup:
+        text, segments = prepare_for_summary(text, segments, language)
+    if segments:
+        text = segments_to_timed_text(segments)
+
+    chunk_chars = get_chunk_chars(provider, prompt)
+    chunks = split_text(text, chunk_chars)
+    print(f"文本分为{len(chunks)}段，每段不超过{chunk_chars}字，使用 {provider} API")
+    return _summarize_chunks(chunks, chunk_chars, prompt, model, provider)
+
+
+def summarize_many(text: str, prompts: Dict[str, str], model: str = "deepseek-chat", provider: str = "deepseek",
+                   segments: Optional[list] = None, language: Optional[str] = None) -> Dict[str, str]:
+    """
+    用同一份转录生成多个模板的总结：转录后处理、按时间组织和分段只做一次，
+    各模板并发调用（同一提供商的并发闸门仍然生效）
+    :param prompts: {模板名: 提示词}，见 prompts.select_prompts
+    :return: {模板名: 总结}，顺序与 prompts 一致
+    """
+    text, segments = prepare_for_summary(text, segments, language)
+    if segments:
+        text = segments_to_timed_text(segments)
+
+    # 所有模板共用同一组分段，单段字数取各模板允许值中最小的
+    chunk_chars = min(get_chunk_chars(provider, prompt) for prompt in prompts.values())
+    chunks = split_text(text, chunk_chars)
+    print(f"文本分为{len(chunks)}段，每段不超过{chunk_chars}字，使用 {provider} API，{len(prompts)} 个模板")
+    if len(prompts) == 1:
+        name, prompt = next(iter(prompts.items()))
+        return {name: _summarize_chunks(chunks, chunk_chars, prompt, model, provider)}
+    with ThreadPoolExecutor(max_workers=len(prompts)) as executor:
+        # 复制上下文，工作线程中的 LLM 调用仍记录到当前任务
+        futures = {name: executor.submit(contextvars.copy_context().run, _summarize_chunks,
+                                         chunks, chunk_chars, prompt, model, provider)
+                   for name, prompt in prompts.items()}
+        return {name: future.result() for name, future in futures.items()}
+
+
+def get_max_concurrency(provider: str, local_config: Dict[str, Any]) -> int:
+    """提供商允许同时进行的请求数：本地服务取 local_llm.max_concurrency，托管API取 summarize.max_concurrency（默认1，需用户显式调大）"""
+    if provider == LOCAL_PROVIDER:
+        return max(1, int(local_config.get("max_concurrency") or 1))
+    return max(1, int(config_manager.config.get("summarize", {}).get("max_concurrency") or 1))
+
 
-        p = prompt if prompt else prompt_default
-        p = p + "\n" + chunk
+def _summarize_chunks(chunks: List[str], chunk_chars: int, prompt: Optional[str], model: str, provider: str) -> str:
+    """对已分好的文本段逐段（或并发）调用API并合并，合并结果仍超长时递归摘要"""
+    import requests
 
-        if provider == "deepseek" or provider == "openai":
+    local_config = config_manager.get_local_llm_config() if provider == LOCAL_PROVIDER else {}
+    # 提示词作为字节稳定的系统消息放在最前面，转录分段单独作为用户消息：
+    # 同一模板的所有分段、所有任务共享同一前缀，服务端前缀缓存可以命中
+    system_prompt = compile_prompt(prompt if prompt else prompt_default)
+
+    def call_api(chunk, record):
+        if provider == LOCAL_PROVIDER:
+            api_key = local_config.get("api_key")
+        else:
+            api_key = get_api_key(provider)
+            if not api_key:
+                raise ValueError(f"未找到 {provider} 的API密钥，请在 config.json 中设置")
+
+        if provider == "deepseek" or provider == "openai" or provider == LOCAL_PROVIDER:
             headers = {
-                "Authorization": f"Bearer {api_key}",
                 "Content-Type": "application/json"
             }
+            if api_key:
+                headers["Authorization"] = f"Bearer {api_key}"
             payload = {
                 "model": model,
                 "messages": [
-                    {"role": "user", "content": p}
+                    {"role": "system", "content": system_prompt},
+                    {"role": "user", "content": chunk}
                 ],
                 "temperature": 0.6,
                 "stream": False
             }
-            response = requests.post(API_URLS[provider], headers=headers, json=payload, timeout=120)
+            if provider == LOCAL_PROVIDER:
+                url = local_config["base_url"].rstrip("/") + "/chat/completions"
+                payload["model"] = local_config.get("model") or model
+                timeout = local_config.get("timeout", 600)
+            else:
+                url = API_URLS[provider]
+                timeout = 120
+            response = requests.post(url, headers=headers, json=payload, timeout=timeout)
             response.raise_for_status()
             data = response.json()
+            usage = data.get("usage") or {}
+            record["tokens_in"] = usage.get("prompt_tokens")
+            record["tokens_out"] = usage.get("completion_tokens")
+            record["tokens_cached"] = cached_prompt_tokens(usage)
             return data["choices"][0]["message"]["content"].strip()
 
         # 注意：Anthropic API 格式可能需要单独处理
@@ -80,10 +237,14 @@ def summarize_text(text: str, prompt: Optional[str] = None, model: str = "deepse
                 "Content-Type": "application/json",
                 "anthropic-version": "2023-06-01"
             }
+            # Anthropic 需要显式的缓存断点：系统提示词整体标记为可缓存
             payload = {
                 "model": model,
+                "system": [
+                    {"type": "text", "text": system_prompt, "cache_control": {"type": "ephemeral"}}
+                ],
                 "messages": [
-                    {"role": "user", "content": p}
+                    {"role": "user", "content": chunk}
                 ],
                 "max_tokens": 4096,
                 "temperature": 0.6
@@ -91,18 +252,45 @@ def summarize_text(text: str, prompt: Optional[str] = None, model: str = "deepse
             response = requests.post(API_URLS[provider], headers=headers, json=payload, timeout=120)
             response.raise_for_status()
             data = response.json()
+            usage = data.get("usage") or {}
+            # input_tokens 不含缓存读写部分，这里统一为总输入token
+            cached = usage.get("cache_read_input_tokens")
+            if usage.get("input_tokens") is not None:
+                record["tokens_in"] = (usage["input_tokens"] + (cached or 0)
+                                       + (usage.get("cache_creation_input_tokens") or 0))
+            record["tokens_out"] = usage.get("output_tokens")
+            record["tokens_cached"] = cached
             return data["content"][0]["text"].strip()
 
         else:
             raise ValueError(f"不支持的API提供商: {provider}")
 
-    # 分段处理
-    chunks = split_text(text, 15000)
-    print(f"文本分为{len(chunks)}段，每段不超过15000字，使用 {provider} API")
-    summaries = [call_api(chunk) for chunk in chunks]
+    max_concurrency = get_max_concurrency(provider, local_config)
+    gate = _get_provider_gate(provider, max_concurrency)
+
+    # 线程池中的调用无法继承线程绑定的任务记录，这里显式传入
+    trace = current_trace()
+
+    records = []
+
+    def limited_call(chunk):
+        with gate:
+            with span("llm_call", trace=trace, provider=provider, model=model, chars_in=len(chunk)) as record:
+                records.append(record)
+                return call_api(chunk, record)
+
+    if max_concurrency > 1 and len(chunks) > 1:
+        with ThreadPoolExecutor(max_workers=min(max_concurrency, len(chunks))) as executor:
+            summaries = list(executor.map(limited_call, chunks))
+    else:
+        summaries = [limited_call(chunk) for chunk in chunks]
     summary_text = '\n\n'.join(summaries)
+    cached = sum(r.get("tokens_cached") or 0 for r in records)
+    if cached:
+        tokens_in = sum(r.get("tokens_in") or 0 for r in records)
+        print(f"提示词缓存命中 {cached}/{tokens_in} 输入tokens（{cached / max(tokens_in, 1):.0%}）")
     # 如拼接后仍超长，递归摘要
-    if len(summary_text) > 15000:
+    if len(summary_text) > chunk_chars:
         print("摘要结果仍超长，递归再次摘要...")
-        return summarize_text(summary_text, prompt, model, provider)
-    return summary_text
\ No newline at end of file
+        return summarize_text(summary_text, prompt, model, provider, cleanup=False)
+    return summary_text
@@ -4,99 +4,342 @@ Whisper 转录模块 - 使用本地 whisper 进行音频转录。
 """
 
 import os
-from typing import Optional
-import tempfile
-from moviepy import AudioFileClip
+import subprocess
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Optional, Dict, Any, Iterator, Tuple
+from .config import config_manager
+from .audio_handler import probe_audio
+from .instrumentation import span
+from . import metrics
+from .segments import compact_segments, format_clock
+from .model_policy import AUTO_MODEL, resolve_model, observe_rtf
+
+MB = 1024 * 1024
+
+# whisper 以16kHz单声道处理音频
+SAMPLE_RATE = 16000
+# 流式转录时窗口末尾最多回带多少秒音频到下一个窗口（whisper单次解码窗口为30秒）
+STREAM_CARRY_SECONDS = 30
+
+# 进程内Whisper模型缓存（LRU），Web UI多个任务共享已加载的模型
+MODEL_CACHE_SIZE = int(os.getenv("WHISPER_MODEL_CACHE_SIZE", "2"))
+_model_cache = OrderedDict()
+_model_locks = {}  # 模型 -> 转录独占锁
+_model_load_locks = {}  # 模型 -> 加载锁（同一模型只加载一次）
+_model_cache_lock = threading.Lock()
+
+
+def load_whisper_model(model: str):
+    """
+    加载（或从缓存获取）Whisper模型。
+    加载期间只持有该模型自己的加载锁，缓存锁只在查找和写入缓存时短暂持有，
+    加载大模型时其他模型的缓存命中不受影响
+    :param model: whisper模型大小
+    :return: whisper模型实例
+    """
+    import whisper
+    with _model_cache_lock:
+        if model in _model_cache:
+            _model_cache.move_to_end(model)
+            metrics.model_cache_requests.inc(model=model, result="hit")
+            return _model_cache[model]
+        load_lock = _model_load_locks.setdefault(model, threading.Lock())
+    with load_lock:
+        # 等待加载锁期间，其他线程可能已经加载好同一个模型
+        with _model_cache_lock:
+            if model in _model_cache:
+                _model_cache.move_to_end(model)
+                metrics.model_cache_requests.inc(model=model, result="hit")
+                return _model_cache[model]
+        metrics.model_cache_requests.inc(model=model, result="miss")
+        print("正在加载模型...")
+        with span("model_load", model=model):
+            whisper_model = whisper.load_model(model)
+        with _model_cache_lock:
+            _model_cache[model] = whisper_model
+            while len(_model_cache) > max(1, MODEL_CACHE_SIZE):
+                evicted, _ = _model_cache.popitem(last=False)
+                print(f"释放缓存的Whisper模型: {evicted}")
+        return whisper_model
+
+
+@contextmanager
+def whisper_model_slot(model: str):
+    """
+    独占使用某个缓存模型（whisper解码时会在模型上挂kv-cache钩子，同一实例不能并发转录）
+    :param model: whisper模型大小
+    """
+    with _model_cache_lock:
+        lock = _model_locks.setdefault(model, threading.Lock())
+    metrics.whisper_waiting.inc(model=model)
+    try:
+        lock.acquire()
+    finally:
+        metrics.whisper_waiting.dec(model=model)
+    metrics.whisper_busy.inc(model=model)
+    try:
+        yield load_whisper_model(model)
+    finally:
+        metrics.whisper_busy.dec(model=model)
+        lock.release()
+
 
 def transcribe_audio(audio_path: str, api_key: Optional[str] = None, model: str = "small", language: Optional[str] = None) -> str:
     """
     将音频文件转为文本，使用本地 whisper 进行转录。
-    当文件大于100M时自动分段（每600秒一段）转录。
+    长音频自动使用流式转录，峰值内存与时长无关。
     :param audio_path: 音频文件路径
     :param api_key: 保留参数以兼容接口（实际不使用）
     :param model: whisper模型大小（tiny, base, small, medium, large），默认small
     :param language: 指定音频语言（如 'zh', 'en'），None表示自动检测
     :return: 转录文本
     """
+    return transcribe_audio_segments(audio_path, model=model, language=language)["text"]
+
+
+def transcribe_audio_segments(audio_path: str, model: str = "small", language: Optional[str] = None) -> Dict[str, Any]:
+    """
+    转录音频并保留 whisper 已计算出的时间戳分段。
+    未指定语言时先做语言识别预检（多窗口抽样，结果按音频哈希缓存），
+    长音频（默认超过30分钟）按窗口流式转录，分段时间换算回原音频时间轴。
+    :param audio_path: 音频文件路径
+    :param model: whisper模型大小（tiny, base, small, medium, large），auto表示按负载自动选择，默认small
+    :param language: 指定音频语言（如 'zh', 'en'），None表示自动检测
+    :return: {'text', 'language', 'duration', 'segments': [{'start', 'end', 'text', 'avg_logprob'}],
+              'model', 'model_choice': {'model', 'reason', ...}, 'language_id': 预检结果或None}
+    """
     try:
-        import whisper
         file_size = os.path.getsize(audio_path)
-        MB = 1024 * 1024
+        duration = probe_duration(audio_path)
 
+        language_info = None
+        if not language:
+            language_info = identify_language(audio_path, duration)
+            if language_info:
+                language = language_info["language"]
+
+        model_choice = resolve_model(model, duration, language)
+        model = model_choice["model"]
         print(f"音频文件大小: {file_size/MB:.1f}MB")
+        if model_choice["requested"] == AUTO_MODEL:
+            print(f"自动选择模型 {model}: {model_choice['reason']}")
         print(f"使用本地 whisper ({model}) 进行转录...")
-        print("正在加载模型...")
 
-        # 加载模型
-        whisper_model = whisper.load_model(model)
-        print("模型加载完成，开始转录...")
-
-        if file_size <= 100 * MB:
-            # 设置转录参数
-            transcribe_kwargs = {
-                "verbose": False  # 添加verbose=False避免过多输出
-            }
-            if language:
-                transcribe_kwargs["language"] = language
-
-            result = whisper_model.transcribe(audio_path, **transcribe_kwargs)
-            print("转录完成！")
-            return result["text"]
-        else:
-            print(f"音频文件较大，开始分段转录...")
-            audio = AudioFileClip(audio_path)
-            duration = int(audio.duration)  # 秒
-            chunk_sec = 600  # 每段10分钟
-            texts = []
-
-            total_chunks = (duration + chunk_sec - 1) // chunk_sec  # 计算总段数
-            print(f"总共需要处理 {total_chunks} 个分段")
-
-            for i, start in enumerate(range(0, duration, chunk_sec), 1):
-                end = min(start + chunk_sec, duration)
-                print(f"正在处理分段 {i}/{total_chunks}: {start//60:02d}:{start%60:02d} - {end//60:02d}:{end%60:02d}")
-
-                with tempfile.NamedTemporaryFile(suffix='.mp3', delete=True) as tmp:
-                    # 兼容moviepy 1.x和2.x的分段方法
-                    try:
-                        segment = audio.subclip(start, end)
-                    except AttributeError:
-                        segment = audio.subclipped(start, end)
-
-                    # 保存分段音频
-                    try:
-                        segment.write_audiofile(tmp.name, codec='mp3', verbose=False, logger=None)
-                    except Exception as e:
-                        print(f"保存分段音频失败: {e}")
-                        audio.close()
-                        raise e
-
-                    # 转录分段音频
-                    try:
-                        # 设置转录参数
-                        transcribe_kwargs = {
-                            "verbose": False  # 添加verbose=False避免过多输出
-                        }
-                        if language:
-                            transcribe_kwargs["language"] = language
-
-                        result = whisper_model.transcribe(tmp.name, **transcribe_kwargs)
-                        texts.append(result["text"])
-                        print(f"分段 {i} 转录完成")
-                    except Exception as e:
-                        print(f"转录分段 {i} 失败: {e}")
-                        audio.close()
-                        raise e
-
-            audio.close()
-            print("所有分段转录完成！")
-            return '\n'.join(texts)
+        with whisper_model_slot(model) as whisper_model:
+            print("模型就绪，开始转录...")
+            result = _run_transcription(whisper_model, audio_path, model, language, file_size, duration)
+        result["model"] = model
+        result["model_choice"] = model_choice
+        result["language_id"] = language_info
+        return result
     except ImportError:
         raise RuntimeError("未安装 whisper 库，请运行: pip install openai-whisper")
     except Exception as e:
         raise RuntimeError(f"本地 whisper 转录失败: {e}")
 
 
+def identify_language(audio_path: str, duration: Optional[float] = None) -> Optional[Dict[str, Any]]:
+    """
+    语言识别预检（可在配置 language_id.enabled 中关闭）；失败时返回None，交给whisper自动检测
+    :return: language_id.detect_language 的结果
+    """
+    from .language_id import detect_language, get_language_id_settings
+    if not get_language_id_settings()["enabled"]:
+        return None
+    try:
+        info = detect_language(audio_path, duration=duration)
+    except Exception as e:
+        print(f"语言识别预检失败，交由 whisper 自动检测: {e}")
+        return None
+    print(f"语言识别: {info['language']}（置信度 {info['probability']:.2f}"
+          f"{'，检测到多种语言' if info['mixed'] else ''}{'，来自缓存' if info['cached'] else ''}）")
+    return info
+
+
+def get_streaming_settings() -> Dict[str, float]:
+    """读取流式转录设置，可用 WHISPER_STREAM_WINDOW / WHISPER_STREAM_THRESHOLD 环境变量覆盖"""
+    settings = {"stream_threshold_seconds": 1800, "stream_window_seconds": 600}
+    settings.update(config_manager.config.get("transcription", {}))
+    if os.getenv("WHISPER_STREAM_WINDOW"):
+        settings["stream_window_seconds"] = float(os.getenv("WHISPER_STREAM_WINDOW"))
+    if os.getenv("WHISPER_STREAM_THRESHOLD"):
+        settings["stream_threshold_seconds"] = float(os.getenv("WHISPER_STREAM_THRESHOLD"))
+    return settings
+
+
+def probe_duration(audio_path: str) -> Optional[float]:
+    """探测音频时长（秒），未安装ffprobe或无法识别时返回None"""
+    try:
+        probe = probe_audio(audio_path)
+    except ValueError:
+        return None
+    return probe.get("duration") if probe else None
+
+
+def _should_stream(duration: Optional[float], file_size: int) -> bool:
+    """
+    判断是否使用流式转录：按音频时长判断（低码率的长录音文件很小，解码后却很大），
+    无法探测时长时退回按文件大小（>100M）判断
+    """
+    threshold = get_streaming_settings()["stream_threshold_seconds"]
+    if duration is None:
+        return file_size > 100 * MB or not threshold
+    return duration > threshold
+
+
+def iter_pcm_windows(audio_path: str, window_seconds: float, sample_rate: int = SAMPLE_RATE) -> Iterator[Tuple[float, bytes, bool]]:
+    """
+    通过 ffmpeg 管道把音频解码为 16-bit 单声道PCM，按窗口逐段读取，任意时刻只保留当前与下一个窗口
+    :param window_seconds: 窗口时长（秒）
+    :return: 迭代 (窗口起点秒数, PCM字节, 是否最后一个窗口)
+    """
+    window_bytes = int(window_seconds * sample_rate) * 2
+    cmd = [
+        "ffmpeg", "-hide_banner", "-loglevel", "error", "-nostdin",
+        "-i", audio_path, "-vn",
+        "-f", "s16le", "-acodec", "pcm_s16le", "-ac", "1", "-ar", str(sample_rate), "-"
+    ]
+    try:
+        proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    except FileNotFoundError:
+        raise RuntimeError("未找到 ffmpeg，请先安装 ffmpeg 并确保其在 PATH 中")
+
+    def read_window() -> bytes:
+        # 管道可能一次只返回部分数据，读满一个窗口或到达结尾为止
+        chunks, remaining = [], window_bytes
+        while remaining:
+            chunk = proc.stdout.read(remaining)
+            if not chunk:
+                break
+            chunks.append(chunk)
+            remaining -= len(chunk)
+        return b"".join(chunks)
+
+    try:
+        offset = 0.0
+        current = read_window()
+        while current:
+            following = read_window()
+            yield offset, current, not following
+            offset += len(current) / 2 / sample_rate
+            current = following
+        stderr = proc.stderr.read().decode("utf-8", errors="replace").strip()
+        if proc.wait() != 0:
+            raise RuntimeError(f"ffmpeg 解码失败: {stderr}")
+    finally:
+        if proc.poll() is None:
+            proc.kill()
+            proc.wait()
+        proc.stdout.close()
+        proc.stderr.close()
+
+
+def _transcribe_kwargs(language: Optional[str]) -> Dict[str, Any]:
+    transcribe_kwargs = {
+        "verbose": False  # 添加verbose=False避免过多输出
+    }
+    if language:
+        transcribe_kwargs["language"] = language
+    return transcribe_kwargs
+
+
+def _run_transcription(whisper_model, audio_path: str, model: str, language: Optional[str], file_size: int,
+                       duration: Optional[float] = None) -> Dict[str, Any]:
+    """使用已加载的模型转录，长音频使用流式转录"""
+    if _should_stream(duration, file_size):
+        return stream_transcription(whisper_model, audio_path, model, language, file_size, duration)
+
+    with span("transcribe", model=model, bytes=file_size) as record:
+        result = whisper_model.transcribe(audio_path, **_transcribe_kwargs(language))
+        segments = compact_segments(result.get("segments"))
+        duration = duration or (segments[-1]["end"] if segments else None)
+        record["audio_seconds"] = duration
+    observe_rtf(model, record["audio_seconds"], record["duration_s"])
+    print("转录完成！")
+    return {
+        "text": result["text"],
+        "language": result.get("language"),
+        "duration": duration,
+        "segments": segments,
+    }
+
+
+def stream_transcription(whisper_model, audio_path: str, model: str, language: Optional[str] = None,
+                         file_size: Optional[int] = None, duration: Optional[float] = None,
+                         window_seconds: Optional[float] = None) -> Dict[str, Any]:
+    """
+    流式转录：ffmpeg 边解码边按窗口转录，峰值内存只与窗口长度有关，与音频总时长无关。
+    窗口末尾被截断的最后一个分段（不超过 STREAM_CARRY_SECONDS）会连同音频一起留到下一个窗口重新识别，
+    上一窗口的结尾文本作为 initial_prompt 传入，保持上下文连贯。
+    :param whisper_model: 已加载的whisper模型
+    :param duration: 音频总时长（仅用于显示进度）
+    :param window_seconds: 窗口时长，默认取配置
+    :return: 同 transcribe_audio_segments
+    """
+    import numpy as np
+
+    window_seconds = window_seconds or get_streaming_settings()["stream_window_seconds"]
+    total_windows = int(-(-duration // window_seconds)) if duration else None
+    print(f"音频较长，开始流式转录（每个窗口 {window_seconds:.0f} 秒{f'，约 {total_windows} 个窗口' if total_windows else ''}）...")
+
+    texts = []
+    segments = []
+    detected_language = language
+    carry = b""
+    audio_seconds = 0.0
+
+    with span("transcribe", model=model, bytes=file_size, stream=True) as record:
+        windows = 0
+        for offset, pcm, is_last in iter_pcm_windows(audio_path, window_seconds):
+            offset -= len(carry) / 2 / SAMPLE_RATE
+            if carry:
+                pcm = carry + pcm
+                carry = b""
+            windows += 1
+            window_end = len(pcm) / 2 / SAMPLE_RATE
+            print(f"正在处理窗口 {windows}{f'/{total_windows}' if total_windows else ''}: "
+                  f"{format_clock(offset)} - {format_clock(offset + window_end)}")
+
+            audio = np.frombuffer(pcm, np.int16).astype(np.float32) / 32768.0
+            del pcm
+            transcribe_kwargs = _transcribe_kwargs(detected_language)
+            if texts:
+                transcribe_kwargs["initial_prompt"] = texts[-1][-200:]
+            result = whisper_model.transcribe(audio, **transcribe_kwargs)
+            raw_segments = result.get("segments") or []
+            detected_language = detected_language or result.get("language")
+
+            if not is_last and len(raw_segments) > 1 and window_end - raw_segments[-1]["start"] <= STREAM_CARRY_SECONDS:
+                cut = raw_segments.pop()["start"]
+                carry = audio_to_pcm(audio[int(cut * SAMPLE_RATE):])
+            del audio
+
+            window_text = "".join(seg["text"] for seg in raw_segments).strip()
+            if window_text:
+                texts.append(window_text)
+            segments.extend(compact_segments(raw_segments, offset=offset))
+            audio_seconds = offset + window_end
+        record["audio_seconds"] = round(audio_seconds, 2)
+        record["windows"] = windows
+    observe_rtf(model, record["audio_seconds"], record["duration_s"])
+
+    print("所有窗口转录完成！")
+    return {
+        "text": "\n".join(texts),
+        "language": detected_language,
+        "duration": round(audio_seconds, 2),
+        "segments": segments,
+    }
+
+
+def audio_to_pcm(audio) -> bytes:
+    """float32 波形转回 16-bit PCM（用于把窗口尾部并入下一个窗口）"""
+    import numpy as np
+    return (np.clip(audio, -1.0, 1.0) * 32767).astype(np.int16).tobytes()
+
+
 def transcribe_local_audio(audio_path: str, model: str = "small", language: Optional[str] = None) -> str:
     """
     专门用于转录本地音频文件的函数
@@ -105,4 +348,12 @@ def transcribe_local_audio(audio_path: str, model: str = "small", language: Opti
     :param language: 指定语言，None表示自动检测
     :return: 转录文本
     """
-    return transcribe_audio(audio_path, model=model, language=language)
\ No newline at end of file
+    return transcribe_audio(audio_path, model=model, language=language)
+
+
+def transcribe_local_audio_segments(audio_path: str, model: str = "small", language: Optional[str] = None) -> Dict[str, Any]:
+    """
+    转录本地音频文件并返回带时间戳的分段
+    :return: 同 transcribe_audio_segments
+    """
+    return transcribe_audio_segments(audio_path, model=model, language=language)
\ No newline at end of file
@@ -0,0 +1,162 @@
+"""
+transcript_cleanup.py
+转录后处理 - 在转录与摘要之间清理 Whisper 文本，减少送入大模型的 token 与等待时间：
+折叠静音处幻觉出的重复循环（"谢谢观看"反复出现）、丢弃常见幻觉语句、删除语气词、合并多余空白，
+并可选地把繁体转为简体（需要安装 opencc）。只影响送去摘要的文本，保存的转录与字幕保持原样。
+"""
+
+import re
+from functools import lru_cache
+from typing import Dict, Any, List, Optional, Tuple
+
+from .config import config_manager
+from .instrumentation import span
+
+# 分隔重复片段、语气词的标点与空白
+_SEPARATORS = r'\s，,。.！!？?、；;…~～'
+
+_SEPARATOR_RUN = re.compile(rf'[{_SEPARATORS}]+')
+_WHITESPACE = re.compile(r'[ \t　]+')
+_BLANK_LINES = re.compile(r'\n\s*\n+')
+# 删除语气词后留下的重复标点，如 "，，" "，。"
+_DANGLING_PUNCT = re.compile(r'[，,、]\s*(?=[，,、。.！!？?])')
+
+_converter = None
+_converter_checked = False
+
+
+def get_cleanup_settings() -> Dict[str, Any]:
+    """
+    读取转录后处理设置：enabled 总开关；collapse_repeats 折叠连续重复 min_repeats 次及以上的短语；
+    remove_fillers 删除 fillers 中独立出现的语气词；drop_phrases 为整段出现时丢弃的幻觉语句；
+    to_simplified 在中文转录上做繁体转简体（未安装 opencc 时跳过）
+    """
+    settings = {
+        "enabled": True,
+        "collapse_repeats": True,
+        "min_repeats": 3,
+        "remove_fillers": True,
+        "fillers": ["嗯", "呃", "额", "唔", "啊", "哦", "um", "umm", "uh", "uhm", "er", "erm", "hmm"],
+        "drop_phrases": ["谢谢观看", "感谢观看", "谢谢大家观看", "请不吝点赞 订阅 转发 打赏支持明镜与点点栏目",
+                         "字幕由Amara.org社区提供", "Thanks for watching!", "Thank you for watching."],
+        "to_simplified": True,
+    }
+    settings.update(config_manager.config.get("transcript_cleanup", {}))
+    return settings
+
+
+def estimate_tokens(text: str) -> int:
+    """粗略估算token数（中文约1字1 token，英文约4字符1 token），与 llm_stub 的计数方式一致"""
+    ascii_chars = sum(1 for ch in text if ord(ch) < 128)
+    return (len(text) - ascii_chars) + ascii_chars // 4
+
+
+@lru_cache(maxsize=None)
+def _repeat_pattern(min_repeats: int):
+    """
+    2~30 字的短语连续出现 min_repeats 次及以上（中间可隔标点或空白）。
+    先用前瞻确认首字在后文中还会出现，大多数位置不必逐个尝试30种短语长度
+    """
+    repeats = max(1, min_repeats - 1)
+    return re.compile(rf'([^{_SEPARATORS}])(?=(?:.{{0,60}}?\1){{{repeats}}})(.{{1,29}}?)(?:[{_SEPARATORS}]*\1\2){{{repeats},}}')
+
+
+@lru_cache(maxsize=None)
+def _filler_pattern(fillers: Tuple[str, ...]):
+    """独立出现（前后不紧挨文字）的语气词，连同其后的逗号与空白"""
+    alternatives = "|".join(re.escape(f) for f in sorted(fillers, key=len, reverse=True))
+    return re.compile(rf'(?<!\w)(?:{alternatives})+(?!\w)[，,、]?\s*', re.IGNORECASE)
+
+
+def _normalize_phrase(text: str) -> str:
+    return _SEPARATOR_RUN.sub('', text).lower()
+
+
+def _keep_one(match) -> str:
+    unit = match.group(1) + match.group(2)
+    # 纯数字（如 "100100100"）不是幻觉循环
+    return match.group(0) if unit.isdigit() else unit
+
+
+def _get_converter():
+    """按需加载 opencc 繁转简转换器，未安装时返回 None（只提示一次）"""
+    global _converter, _converter_checked
+    if not _converter_checked:
+        _converter_checked = True
+        try:
+            import opencc
+            try:
+                _converter = opencc.OpenCC("t2s")
+            except Exception:
+                _converter = opencc.OpenCC("t2s.json")
+        except Exception:
+            print("未安装 opencc，跳过繁体转简体（pip install opencc-python-reimplemented）")
+    return _converter
+
+
+def clean_text(text: str, settings: Optional[Dict[str, Any]] = None, language: Optional[str] = None) -> str:
+    """
+    清理一段转录文本（保留换行，split_text 依赖换行切分）
+    :param language: 转录语言，非中文时不做繁简转换；None表示未知（按中文处理）
+    """
+    settings = settings or get_cleanup_settings()
+    if settings.get("to_simplified") and (language is None or language.startswith("zh")):
+        converter = _get_converter()
+        if converter is not None:
+            text = converter.convert(text)
+    if settings.get("collapse_repeats"):
+        text = _repeat_pattern(int(settings.get("min_repeats", 3))).sub(_keep_one, text)
+    if settings.get("remove_fillers") and settings.get("fillers"):
+        text = _filler_pattern(tuple(settings["fillers"])).sub("", text)
+        text = _DANGLING_PUNCT.sub("", text)
+    text = _WHITESPACE.sub(" ", text)
+    text = _BLANK_LINES.sub("\n", text)
+    return "\n".join(line.strip(" ，,、") for line in text.split("\n")).strip()
+
+
+def clean_segments(segments: List[Dict[str, Any]], settings: Optional[Dict[str, Any]] = None,
+                   language: Optional[str] = None) -> List[Dict[str, Any]]:
+    """
+    清理转录分段：逐段清理文本，丢弃清理后为空或整段是幻觉语句的分段，
+    连续文本相同的分段（静音处的循环）合并为一段，时间范围取并集
+    :return: 新的分段列表（不修改传入的分段）
+    """
+    settings = settings or get_cleanup_settings()
+    drop = {_normalize_phrase(p) for p in settings.get("drop_phrases") or ()}
+    cleaned = []
+    previous = None
+    for seg in segments:
+        text = clean_text(seg["text"], settings, language)
+        normalized = _normalize_phrase(text)
+        if not normalized or normalized in drop:
+            continue
+        if normalized == previous and settings.get("collapse_repeats"):
+            cleaned[-1]["end"] = seg["end"]
+            continue
+        cleaned.append({**seg, "text": text})
+        previous = normalized
+    return cleaned
+
+
+def prepare_for_summary(text: str, segments: Optional[List[Dict[str, Any]]] = None,
+                        language: Optional[str] = None) -> Tuple[str, Optional[List[Dict[str, Any]]]]:
+    """
+    摘要前的后处理阶段，在当前任务记录中记录 cleanup 阶段（字数与估算节省的 token 数）
+    :return: (清理后的文本, 清理后的分段)；未启用时原样返回
+    """
+    settings = get_cleanup_settings()
+    if not settings.get("enabled"):
+        return text, segments
+    with span("cleanup", chars_in=len(text)) as record:
+        tokens_before = estimate_tokens(text)
+        if segments:
+            segments = clean_segments(segments, settings, language)
+            text = " ".join(seg["text"] for seg in segments)
+        else:
+            text = clean_text(text, settings, language)
+        tokens_after = estimate_tokens(text)
+        record["chars_out"] = len(text)
+        record["tokens_saved"] = max(0, tokens_before - tokens_after)
+    if record["tokens_saved"]:
+        print(f"转录后处理: {record['chars_in']} → {record['chars_out']} 字，约节省 {record['tokens_saved']} tokens")
+    return text, segments
@@ -0,0 +1,196 @@
+"""
+url_resolver.py
+统一的链接解析 - 从分享文本中提取链接，只解析一次主机名，通过预编译的分派表识别平台并提取规范视频ID
+（B站 BV/av 号、YouTube 视频ID、抖音/TikTok 作品ID），生成缓存、去重和文件名共用的规范键；
+并支持从大段文本流（聊天记录中成百上千条分享口令）中一次扫描批量提取、去重链接。
+"""
+
+import re
+from datetime import datetime
+from functools import lru_cache
+from pathlib import Path
+from typing import Optional, Dict, List, Iterator, Iterable, Tuple, TextIO
+
+# 分享文本中的链接：到空白、引号、竖线或中文标点为止
+_URL_STOP = r'\s\'"<>|，。！？、；：【】（）《》'
+_URL_PATTERN = re.compile(rf'https?://[^{_URL_STOP}]+', re.IGNORECASE)
+_TRAILING = ".,;!?)]}"
+# 一次匹配拆出 主机部分、路径、查询参数（比 urlsplit 快，且不校验端口等细节）
+_URL_PARTS = re.compile(r'^(?:[A-Za-z][A-Za-z0-9+.-]*://)?([^/?#]*)([^?#]*)(?:\?([^#]*))?')
+
+# 主机名（含所有子域名）-> 平台；按主机名后缀逐级查找，不做子串匹配（避免 'qq.com' 误匹配无关主机）
+HOST_PLATFORMS = {
+    "bilibili.com": "bilibili",
+    "b23.tv": "bilibili",
+    "youtube.com": "youtube",
+    "youtu.be": "youtube",
+    "youtube-nocookie.com": "youtube",
+    "v.qq.com": "tencent",
+    "iqiyi.com": "iqiyi",
+    "youku.com": "youku",
+    "douyin.com": "douyin",
+    "iesdouyin.com": "douyin",
+    "tiktok.com": "tiktok",
+}
+
+# 平台 -> 视频ID规则（匹配 路径+查询参数）
+_ID_PATTERNS = {
+    "youtube": re.compile(r'^/(?:watch\?(?:.*&)?v=|shorts/|embed/|live/|v/)([\w-]{11})'),
+    "bilibili": re.compile(r'/video/(BV[0-9A-Za-z]{10}|av\d+)', re.IGNORECASE),
+    "douyin": re.compile(r'(?:/(?:video|note)/|[?&](?:modal_id|aweme_id)=)(\d+)'),
+    "tiktok": re.compile(r'/(?:@[^/]+/)?video/(\d+)'),
+}
+_YOUTU_BE_ID = re.compile(r'^/([\w-]{11})')
+
+
+def extract_urls(text: str) -> List[str]:
+    """从文本（链接、分享口令等）中按出现顺序提取所有链接"""
+    return [match.rstrip(_TRAILING) for match in _URL_PATTERN.findall(text)]
+
+
+def platform_for_host(host: str) -> str:
+    """按主机名后缀查找平台，未知返回 'other'"""
+    host = host.lower().rstrip(".")
+    while host:
+        platform = HOST_PLATFORMS.get(host)
+        if platform:
+            return platform
+        _, _, host = host.partition(".")
+    return "other"
+
+
+def resolve_url(text: str) -> Dict[str, Optional[str]]:
+    """
+    解析链接或包含链接的分享文本
+    :return: {'url': 提取出的链接, 'platform', 'video_id': 无法识别时为None,
+              'key': 规范键，如 'youtube:dQw4w9WgXcQ'；无法识别ID时（如未展开的短链接）为去掉查询参数和结尾斜杠的地址}
+    """
+    text = text.strip()
+    match = _URL_PATTERN.search(text)
+    return _resolve(match.group(0).rstrip(_TRAILING) if match else text)
+
+
+def _resolve(url: str) -> Dict[str, Optional[str]]:
+    netloc, path, query = _URL_PARTS.match(url).groups()
+    netloc = netloc.lower()
+    host = netloc.rpartition("@")[2].partition(":")[0]
+    platform = platform_for_host(host)
+
+    video_id = None
+    pattern = _YOUTU_BE_ID if host.endswith("youtu.be") else _ID_PATTERNS.get(platform)
+    if pattern:
+        id_match = pattern.search(f"{path}?{query}" if query else path)
+        if id_match:
+            video_id = id_match.group(1)
+
+    key = f"{platform}:{video_id}" if video_id else f"{platform}:{netloc}{path.rstrip('/')}"
+    return {"url": url, "platform": platform, "video_id": video_id, "key": key}
+
+
+def find_url(text: str, platforms=None) -> Optional[str]:
+    """
+    返回文本中第一个属于指定平台的链接
+    :param platforms: 平台集合，None表示任意平台
+    """
+    for url in extract_urls(text):
+        if platforms is None or resolve_url(url)["platform"] in platforms:
+            return url
+    return None
+
+
+# 批量提取时每次读取的字符数
+SHARE_CHUNK_SIZE = 1024 * 1024
+
+
+@lru_cache(maxsize=None)
+def _share_pattern(platforms: Optional[frozenset], skip_comments: bool):
+    """
+    构造批量提取用的组合正则：指定平台时主机名直接在正则中匹配（一次扫描即可过滤掉无关链接），
+    skip_comments 时 # 开头的整行作为另一个分支匹配并丢弃
+    """
+    if platforms is None:
+        url = rf'https?://[^{_URL_STOP}]+'
+    else:
+        hosts = sorted((h for h, p in HOST_PLATFORMS.items() if p in platforms), key=len, reverse=True)
+        if not hosts:
+            raise ValueError(f"未知平台: {', '.join(sorted(platforms))}")
+        url = (rf'https?://(?:[\w-]+\.)*(?:{"|".join(re.escape(h) for h in hosts)})(?::\d+)?'
+               rf'(?![\w.-])[^{_URL_STOP}]*')
+    pattern = rf'(?P<url>{url})'
+    if skip_comments:
+        pattern = rf'^[ \t]*#[^\n]*|{pattern}'
+    return re.compile(pattern, re.IGNORECASE | re.MULTILINE)
+
+
+def iter_share_urls(stream: TextIO, platforms: Optional[Iterable[str]] = None, skip_comments: bool = False,
+                    chunk_size: int = SHARE_CHUNK_SIZE) -> Iterator[str]:
+    """
+    从任意大小的文本流（聊天记录、分享口令合集等）中按出现顺序提取链接，只扫描一遍、不整体读入内存
+    :param stream: 文本文件对象（如 open(path, encoding='utf-8')、sys.stdin）
+    :param platforms: 只提取这些平台的链接（如 ('douyin', 'tiktok')），None表示任意链接
+    :param skip_comments: 忽略 # 开头的行
+    """
+    pattern = _share_pattern(frozenset(platforms) if platforms is not None else None, skip_comments)
+    carry = ""
+    while True:
+        chunk = stream.read(chunk_size)
+        buffer = carry + chunk
+        if not buffer:
+            return
+        if chunk:
+            # 在最后一个换行处切开，余下的半行留到下一块，保证链接和注释行不会被块边界截断；
+            # 超长的单行（没有换行的导出文本）退而在最后一个空白处切开（链接不含空白）
+            cut = buffer.rfind("\n") + 1
+            if not cut and len(buffer) >= max(16 * chunk_size, SHARE_CHUNK_SIZE):
+                cut = max(buffer.rfind(" "), buffer.rfind("\t")) + 1 or len(buffer)
+            if not cut:
+                carry = buffer
+                continue
+            buffer, carry = buffer[:cut], buffer[cut:]
+        for match in pattern.finditer(buffer):
+            url = match.group("url")
+            if url:
+                yield url.rstrip(_TRAILING)
+        if not chunk:
+            return
+
+
+def unique_share_urls(urls: Iterable[str]) -> Tuple[List[str], int]:
+    """
+    按规范键去重（同一视频的不同链接形式只保留第一次出现的）
+    :return: (去重后的链接, 重复数量)
+    """
+    seen = set()
+    unique = []
+    total = 0
+    for url in urls:
+        total += 1
+        key = _resolve(url)["key"]
+        if key not in seen:
+            seen.add(key)
+            unique.append(url)
+    return unique, total - len(unique)
+
+
+def generate_filename(url_or_path: str, has_summary: bool = True, is_local: bool = False) -> str:
+    """
+    根据链接或本地文件路径生成结果文件名：{platform}_{video_id}_{YYYYmmdd_HHMMSS}_总结.md / _转录.txt
+    （时间为北京时间）
+    """
+    import pytz
+    from .utils import safe_filename
+
+    timestamp = datetime.now(pytz.timezone('Asia/Shanghai')).strftime("%Y%m%d_%H%M%S")
+    if is_local:
+        platform = "local"
+        video_id = safe_filename(Path(url_or_path).stem)[:10]  # 取前10个字符作为ID
+    else:
+        resolved = resolve_url(url_or_path)
+        platform = resolved["platform"]
+        video_id = resolved["video_id"]
+        if not video_id:
+            # 短链接等无法识别ID时取链接最后一段路径
+            last = _URL_PARTS.match(resolved["url"]).group(2).rstrip("/").rsplit("/", 1)[-1]
+            video_id = safe_filename(last)[:20] or "unknown"
+    suffix = "总结.md" if has_summary else "转录.txt"
+    return f"{platform}_{video_id}_{timestamp}_{suffix}"
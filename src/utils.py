@@ -5,31 +5,26 @@ utils.py
 
 import re
 import os
-from urllib.parse import urlparse
+from .url_resolver import resolve_url
 
 def get_platform(url: str) -> str:
     """
     判断视频链接平台类型。
-    :param url: 视频链接
+    :param url: 视频链接或分享文本
     :return: 'bilibili'/'youtube'/'tencent'/'iqiyi'/'youku'/'douyin'/'tiktok'/'other'
     """
-    url = url.lower()
-    if 'bilibili.com' in url:
-        return 'bilibili'
-    elif 'youtube.com' in url or 'youtu.be' in url:
-        return 'youtube'
-    elif 'v.qq.com' in url or 'qq.com' in url:
-        return 'tencent'
-    elif 'iqiyi.com' in url:
-        return 'iqiyi'
-    elif 'youku.com' in url:
-        return 'youku'
-    elif 'douyin.com' in url or 'v.douyin.com' in url:
-        return 'douyin'
-    elif 'tiktok.com' in url or 'vm.tiktok.com' in url or 'vt.tiktok.com' in url:
-        return 'tiktok'
-    else:
-        return 'other'
+    return resolve_url(url)["platform"]
+
+
+def canonical_video_id(url: str) -> str:
+    """
+    规范化视频标识（平台:视频ID），同一视频的不同链接形式得到相同结果；
+    无法识别ID时（如未展开的短链接）退回去掉查询参数和结尾斜杠的URL
+    :param url: 视频链接或分享文本
+    :return: 如 'youtube:dQw4w9WgXcQ'
+    """
+    return resolve_url(url)["key"]
+
 
 def safe_filename(name: str, ext: str = "") -> str:
     """
@@ -4,11 +4,12 @@ FastAPI Web界面后端。
 """
 import os
 import sys
-from pathlib import Path
 import uuid
+import hashlib
+import functools
 from typing import Optional
 from fastapi import FastAPI, File, UploadFile, Form, HTTPException, Request
-from fastapi.responses import HTMLResponse, JSONResponse
+from fastapi.responses import HTMLResponse, JSONResponse, Response
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 import asyncio
@@ -23,14 +24,20 @@ src_dir = os.path.dirname(os.path.abspath(__file__))
 sys.path.insert(0, src_dir)
 
 # 使用绝对导入
-from src.audio import download_audio
-from src.transcribe import transcribe_audio, transcribe_local_audio
-from src.summarize import summarize_text
-from src.prompts import prompt_templates
+from src.audio import download_audio_async
+from src.transcribe import transcribe_audio_segments, transcribe_local_audio_segments
+from src.segments import save_transcript, transcript_path_for_summary
+from src.summarize import summarize_many
+from src.prompts import select_prompts
 from src.audio_handler import handle_audio_upload
-from src.utils import safe_filename
-from src.batch_processor import process_batch
+from src.url_resolver import resolve_url, generate_filename
+from src.job_registry import job_registry, job_key
+from src.output_writer import init_umask
+from src.results_catalog import catalog, save_summaries
+from src.search_index import search_index, RANK_CANDIDATES
 from src.config import config_manager, get_api_key, set_api_key
+from src.instrumentation import JobTrace, span, rollup
+from src import metrics
 
 app = FastAPI(title="音频/视频总结工具 Web UI", version="1.0.0")
 
@@ -41,81 +48,124 @@ os.makedirs("transcriptions", exist_ok=True)
 os.makedirs("static", exist_ok=True)
 os.makedirs("templates", exist_ok=True)
 
+# 监视 config.json，手动编辑或在其他进程中修改后无需重启即可生效
+config_manager.start_watching()
+
 # 模拟任务状态存储
 task_status = {}
 
 # 任务历史记录
 task_history = []
 
-def generate_filename(url_or_path: str, has_summary: bool = True, is_local: bool = False) -> str:
-    """根据URL或文件路径和是否有总结生成文件名"""
-    # 生成时间戳，使用UTC时间并转换为本地时区
-    utc_now = datetime.utcnow()
-    local_tz = pytz.timezone('Asia/Shanghai')  # 使用中国时区
-    local_time = utc_now.replace(tzinfo=pytz.utc).astimezone(local_tz)
-    timestamp = local_time.strftime("%Y%m%d_%H%M%S")
-
-    if is_local:
-        # 本地文件处理
-        file_stem = Path(url_or_path).stem
-        # 清理文件名中的特殊字符
-        safe_stem = safe_filename(file_stem)
-        platform = "local"
-        video_id = safe_stem[:10]  # 取前10个字符作为ID
-    else:
-        # 从URL中提取视频ID
-        if "bilibili.com" in url_or_path:
-            # B站视频ID格式：BV1xx411c7mu
-            if "BV" in url_or_path:
-                video_id = url_or_path.split("BV")[1].split("?")[0][:10]
-                platform = "bilibili"
-            else:
-                video_id = "unknown"
-                platform = "bilibili"
-        elif "youtube.com" in url_or_path:
-            # YouTube视频ID格式：dQw4w9WgXcQ
-            if "v=" in url_or_path:
-                video_id = url_or_path.split("v=")[1].split("&")[0][:11]
-                platform = "youtube"
-            else:
-                video_id = "unknown"
-                platform = "youtube"
-        elif "douyin.com" in url_or_path or "v.douyin.com" in url_or_path:
-            # 抖音视频ID提取
-            import re
-            # 尝试从URL中提取视频ID
-            match = re.search(r'/video/(\d+)', url_or_path)
-            if match:
-                video_id = match.group(1)[:10]
-            else:
-                # 尝试从短链接或其他格式提取
-                video_id = url_or_path.split('/')[-1].split('?')[0][:10]
-            platform = "douyin"
-        elif "tiktok.com" in url_or_path:
-            # TikTok视频ID提取
-            import re
-            # 尝试从URL中提取视频ID
-            match = re.search(r'/video/(\d+)', url_or_path)
-            if match:
-                video_id = match.group(1)[:11]
-            else:
-                # 尝试从短链接或其他格式提取
-                video_id = url_or_path.split('/')[-1].split('?')[0][:11]
-            platform = "tiktok"
-        else:
-            video_id = "unknown"
-            platform = "other"
-
-    # 生成文件名
-    if has_summary:
-        filename = f"{platform}_{video_id}_{timestamp}_总结.md"
+# 任务分阶段计时记录
+task_traces = {}
+
+# 事件循环上运行的后台任务（task_id -> asyncio.Task），用于取消
+running_tasks = {}
+
+
+def traced_task(task_type: str):
+    """为后台任务绑定分阶段计时记录（/task-status 可实时查看），并更新 /metrics 任务指标；支持普通函数与协程"""
+    def decorator(func):
+        def begin(task_id):
+            trace = JobTrace(job_id=task_id)
+            task_traces[task_id] = trace
+            metrics.tasks_in_flight.inc(type=task_type)
+            return trace, time.perf_counter()
+
+        def end(task_id, start):
+            metrics.tasks_in_flight.dec(type=task_type)
+            record_task_outcome(task_id, task_type, time.perf_counter() - start)
+            job_registry.finish(task_id, task_status.get(task_id, {}))
+
+        if asyncio.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(task_id, *args, **kwargs):
+                trace, start = begin(task_id)
+                try:
+                    with trace:
+                        return await func(task_id, *args, **kwargs)
+                finally:
+                    running_tasks.pop(task_id, None)
+                    end(task_id, start)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(task_id, *args, **kwargs):
+            trace, start = begin(task_id)
+            try:
+                with trace:
+                    return func(task_id, *args, **kwargs)
+            finally:
+                end(task_id, start)
+        return wrapper
+    return decorator
+
+
+def start_async_task(task_id: str, coro) -> asyncio.Task:
+    """在当前事件循环上启动后台任务，并登记以便取消"""
+    task = asyncio.create_task(coro)
+    running_tasks[task_id] = task
+    return task
+
+
+def coalesce_submission(task_id: str, key: str, task_type: str) -> Optional[dict]:
+    """
+    合并重复请求：相同请求正在处理时返回已有任务ID，已完成时直接返回已保存的结果
+    :return: 需要直接返回给前端的响应；None表示应启动新任务
+    """
+    claim = job_registry.claim(key, task_id)
+    if claim["state"] == "in_flight":
+        metrics.tasks_coalesced.inc(type=task_type, state="in_flight")
+        print(f"[{claim['task_id']}] 相同请求正在处理，合并到该任务")
+        return {"task_id": claim["task_id"], "coalesced": True}
+    if claim["state"] == "completed":
+        result = claim["result"]
+        metrics.tasks_coalesced.inc(type=task_type, state="completed")
+        task_status[task_id] = {"status": "completed", "progress": 100, "message": "相同请求已处理过，直接返回已保存的结果",
+                                "result_path": result["result_path"],
+                                "result_paths": result.get("result_paths") or [result["result_path"]],
+                                "model_choice": result.get("model_choice"),
+                                "cached": True}
+        return {"task_id": task_id, "cached": True}
+    return None
+
+
+def record_task_outcome(task_id: str, task_type: str, duration: float):
+    """根据任务最终状态更新完成/失败计数和耗时直方图"""
+    status = task_status.get(task_id, {}).get("status")
+    if status == "completed":
+        metrics.tasks_completed.inc(type=task_type)
     else:
-        filename = f"{platform}_{video_id}_{timestamp}_转录.txt"
-
-    return filename
+        metrics.tasks_failed.inc(type=task_type)
+    metrics.task_duration.observe(duration, type=task_type, status=status or "unknown")
 
 
-def process_local_audio_task(task_id: str, audio_file_path: str, model: str, prompt_to_use: str, output_path: str, language: str = None):
+def save_task_outputs(transcription: dict, summaries: dict, prompts: dict, output_path: str) -> list:
+    """
+    保存转录文本、分段时间戳和各模板的总结，并登记到结果目录和全文索引
+    :return: 总结文件路径列表（与 prompts 顺序一致）
+    """
+    # 确保输出目录存在
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    transcript_path = transcript_path_for_summary(output_path)
+    with span("write") as record:
+        segments_path = save_transcript(transcription, transcript_path)
+        record["bytes"] = os.path.getsize(transcript_path) + os.path.getsize(segments_path)
+    paths = save_summaries(summaries, output_path, model=transcription["model"], transcript_path=transcript_path)
+    return list(paths.values())
+
+
+def describe_prompts(prompts: dict) -> str:
+    """任务历史中显示的模板：自定义提示词只保存前50个字符，否则为模板名列表"""
+    if "custom" in prompts:
+        prompt = prompts["custom"]
+        return prompt[:50] + "..." if len(prompt) > 50 else prompt
+    return ", ".join(prompts)
+
+
+@traced_task("local_audio")
+def process_local_audio_task(task_id: str, audio_file_path: str, model: str, prompts: dict, output_path: str, language: str = None):
     """处理本地音频文件的后台任务"""
     # 记录任务开始时间
     start_time = datetime.now()
@@ -126,7 +176,7 @@ def process_local_audio_task(task_id: str, audio_file_path: str, model: str, pro
         "type": "local_audio",
         "input": audio_file_path,
         "model": model,
-        "prompt_template_used": prompt_to_use[:50] + "..." if len(prompt_to_use) > 50 else prompt_to_use,  # 只保存前50个字符
+        "prompt_template_used": describe_prompts(prompts),
         "language": language,
         "start_time": start_time,
         "end_time": None,
@@ -151,29 +201,31 @@ def process_local_audio_task(task_id: str, audio_file_path: str, model: str, pro
 
         print(f"[{task_id}] 转录音频 (使用模型: {model})...")
         print(f"[{task_id}] 提示：转录过程可能需要几分钟时间，请耐心等待...")
-        transcript = transcribe_local_audio(processed_audio_path, model=model, language=language)
+        transcription = transcribe_local_audio_segments(processed_audio_path, model=model, language=language)
         print(f"[{task_id}] 转录完成！")
         task_status[task_id] = {"status": "processing", "progress": 70, "message": "生成AI总结..."}
 
         print(f"[{task_id}] 结构化总结...")
-        summary = summarize_text(transcript, prompt=prompt_to_use)
+        summaries = summarize_many(transcription["text"], prompts, model=config_manager.get_default_model(),
+                                   provider=config_manager.get_default_provider(), segments=transcription["segments"],
+                                   language=transcription.get("language"))
         print(f"[{task_id}] 摘要完成！")
         task_status[task_id] = {"status": "processing", "progress": 90, "message": "保存结果..."}
 
-        # 确保输出目录存在
-        os.makedirs(os.path.dirname(output_path), exist_ok=True)
-
-        # 保存到总结文件夹
-        with open(output_path, "w", encoding="utf-8") as f:
-            f.write(summary)
-        print(f"[{task_id}] 结果已保存到: {output_path}")
+        # 保存转录文本及分段时间戳（可随时导出字幕），再保存总结
+        result_paths = save_task_outputs(transcription, summaries, prompts, output_path)
+        print(f"[{task_id}] 结果已保存到: {', '.join(result_paths)}")
 
         # 更新任务历史记录
         task_info["end_time"] = datetime.now()
         task_info["status"] = "completed"
-        task_info["result_path"] = output_path
+        task_info["result_path"] = result_paths[0]
+        task_info["result_paths"] = result_paths
+        task_info["model_choice"] = transcription["model_choice"]
 
-        task_status[task_id] = {"status": "completed", "progress": 100, "message": "处理完成！", "result_path": output_path}
+        task_status[task_id] = {"status": "completed", "progress": 100, "message": "处理完成！",
+                                "result_path": result_paths[0], "result_paths": result_paths,
+                                "model_choice": transcription["model_choice"]}
     except Exception as e:
         # 更新任务历史记录
         task_info["end_time"] = datetime.now()
@@ -184,8 +236,12 @@ def process_local_audio_task(task_id: str, audio_file_path: str, model: str, pro
         print(f"[{task_id}] 处理失败: {str(e)}")
 
 
-def process_video_url_task(task_id: str, video_url: str, model: str, prompt_to_use: str, output_path: str):
-    """处理视频URL的后台任务"""
+@traced_task("video_url")
+async def process_video_url_task(task_id: str, video_url: str, model: str, prompts: dict, output_path: str):
+    """
+    处理视频URL的后台任务，运行在事件循环上：下载阶段是纯异步的（多个任务的下载并发进行），
+    转录、总结和写入这类阻塞步骤交给 asyncio.to_thread
+    """
     # 记录任务开始时间
     start_time = datetime.now()
 
@@ -195,7 +251,7 @@ def process_video_url_task(task_id: str, video_url: str, model: str, prompt_to_u
         "type": "video_url",
         "input": video_url,
         "model": model,
-        "prompt_template_used": prompt_to_use[:50] + "..." if len(prompt_to_use) > 50 else prompt_to_use,  # 只保存前50个字符
+        "prompt_template_used": describe_prompts(prompts),
         "language": None,
         "start_time": start_time,
         "end_time": None,
@@ -209,9 +265,8 @@ def process_video_url_task(task_id: str, video_url: str, model: str, prompt_to_u
 
         print(f"[{task_id}] 验证视频URL: {video_url}")
         
-        # 先尝试清理URL（特别是处理分享链接）
-        from .douyin_handler import clean_douyin_url
-        cleaned_url = clean_douyin_url(video_url)
+        # 先从分享文本中提取链接
+        cleaned_url = resolve_url(video_url)["url"]
         
         if not cleaned_url or not (cleaned_url.startswith('http://') or cleaned_url.startswith('https://')):
             raise ValueError("无效的视频URL")
@@ -219,35 +274,45 @@ def process_video_url_task(task_id: str, video_url: str, model: str, prompt_to_u
         task_status[task_id] = {"status": "processing", "progress": 10, "message": "下载并提取音频..."}
 
         print(f"[{task_id}] 下载并提取音频...")
-        audio_path = download_audio(cleaned_url)
+        audio_path = await download_audio_async(cleaned_url)
         print(f"[{task_id}] 音频已保存: {audio_path}")
         task_status[task_id] = {"status": "processing", "progress": 20, "message": "开始转录..."}
 
         print(f"[{task_id}] 转录音频 (使用模型: {model})...")
         print(f"[{task_id}] 提示：转录过程可能需要几分钟时间，请耐心等待...")
-        transcript = transcribe_audio(audio_path, model=model)
+        transcription = await asyncio.to_thread(transcribe_audio_segments, audio_path, model=model)
         print(f"[{task_id}] 转录完成！")
         task_status[task_id] = {"status": "processing", "progress": 70, "message": "生成AI总结..."}
 
         print(f"[{task_id}] 结构化总结...")
-        summary = summarize_text(transcript, prompt=prompt_to_use)
+        summaries = await asyncio.to_thread(summarize_many, transcription["text"], prompts,
+                                            model=config_manager.get_default_model(),
+                                            provider=config_manager.get_default_provider(),
+                                            segments=transcription["segments"],
+                                            language=transcription.get("language"))
         print(f"[{task_id}] 摘要完成！")
         task_status[task_id] = {"status": "processing", "progress": 90, "message": "保存结果..."}
 
-        # 确保输出目录存在
-        os.makedirs(os.path.dirname(output_path), exist_ok=True)
-
-        # 保存到总结文件夹
-        with open(output_path, "w", encoding="utf-8") as f:
-            f.write(summary)
-        print(f"[{task_id}] 结果已保存到: {output_path}")
+        # 保存转录文本及分段时间戳（可随时导出字幕），再保存总结
+        result_paths = await asyncio.to_thread(save_task_outputs, transcription, summaries, prompts, output_path)
+        print(f"[{task_id}] 结果已保存到: {', '.join(result_paths)}")
 
         # 更新任务历史记录
         task_info["end_time"] = datetime.now()
         task_info["status"] = "completed"
-        task_info["result_path"] = output_path
-
-        task_status[task_id] = {"status": "completed", "progress": 100, "message": "处理完成！", "result_path": output_path}
+        task_info["result_path"] = result_paths[0]
+        task_info["result_paths"] = result_paths
+        task_info["model_choice"] = transcription["model_choice"]
+
+        task_status[task_id] = {"status": "completed", "progress": 100, "message": "处理完成！",
+                                "result_path": result_paths[0], "result_paths": result_paths,
+                                "model_choice": transcription["model_choice"]}
+    except asyncio.CancelledError:
+        task_info["end_time"] = datetime.now()
+        task_info["status"] = "cancelled"
+        task_status[task_id] = {"status": "cancelled", "progress": 0, "message": "任务已取消"}
+        print(f"[{task_id}] 任务已取消")
+        raise
     except Exception as e:
         # 更新任务历史记录
         task_info["end_time"] = datetime.now()
@@ -918,9 +983,10 @@ async def read_root():
                 <div class="form-group">
                     <label for="whisperModel">Whisper模型大小 <span class="tooltip"><span class="tooltip-trigger"><i class="fas fa-question"></i></span><span class="tooltip-text">tiny: 最快但准确性最低 | small: 平衡速度和准确性 | large: 最准确但最慢</span></span></label>
                     <select id="whisperModel" name="whisperModel">
+                        <option value="auto" selected>Auto (按音频时长与排队情况自动选择)</option>
                         <option value="tiny">Tiny (最快，准确性最低)</option>
                         <option value="base">Base (快速且准确)</option>
-                        <option value="small" selected>Small (平衡速度和准确性)</option>
+                        <option value="small">Small (平衡速度和准确性)</option>
                         <option value="medium">Medium (较慢但更准确)</option>
                         <option value="large">Large (最准确但最慢)</option>
                     </select>
@@ -928,8 +994,8 @@ async def read_root():
 
                 <div class="form-group">
                     <label for="promptTemplate">摘要模板</label>
-                    <select id="promptTemplate" name="promptTemplate">
-                        <option value="default课堂笔记">default课堂笔记 - 通用课堂笔记格式</option>
+                    <select id="promptTemplate" name="promptTemplate" multiple size="4">
+                        <option value="default课堂笔记" selected>default课堂笔记 - 通用课堂笔记格式</option>
                         <option value="youtube_英文笔记">youtube_英文笔记 - 英文视频双语笔记格式</option>
                         <option value="youtube_结构化提取">youtube_结构化提取 - 结构化提取要点</option>
                         <option value="youtube_精炼提取">youtube_精炼提取 - 提取核心要点和精华</option>
@@ -937,6 +1003,7 @@ async def read_root():
                         <option value="爆款短视频文案">爆款短视频文案 - 短视频内容文案风格</option>
                         <option value="youtube_视频总结">youtube_视频总结 - 综合性视频总结模板</option>
                     </select>
+                    <small class="input-hint">按住 Ctrl/⌘ 可多选，只转录一次，每个模板各生成一份总结</small>
                 </div>
 
                 <div class="form-group">
@@ -969,9 +1036,10 @@ async def read_root():
                 <div class="form-group">
                     <label for="audioWhisperModel">Whisper模型大小</label>
                     <select id="audioWhisperModel" name="audioWhisperModel">
+                        <option value="auto" selected>Auto (按音频时长与排队情况自动选择)</option>
                         <option value="tiny">Tiny (最快，准确性最低)</option>
                         <option value="base">Base (快速且准确)</option>
-                        <option value="small" selected>Small (平衡速度和准确性)</option>
+                        <option value="small">Small (平衡速度和准确性)</option>
                         <option value="medium">Medium (较慢但更准确)</option>
                         <option value="large">Large (最准确但最慢)</option>
                     </select>
@@ -995,8 +1063,8 @@ async def read_root():
 
                 <div class="form-group">
                     <label for="audioPromptTemplate">摘要模板</label>
-                    <select id="audioPromptTemplate" name="audioPromptTemplate">
-                        <option value="default课堂笔记">default课堂笔记 - 通用课堂笔记格式</option>
+                    <select id="audioPromptTemplate" name="audioPromptTemplate" multiple size="4">
+                        <option value="default课堂笔记" selected>default课堂笔记 - 通用课堂笔记格式</option>
                         <option value="youtube_英文笔记">youtube_英文笔记 - 英文视频双语笔记格式</option>
                         <option value="youtube_结构化提取">youtube_结构化提取 - 结构化提取要点</option>
                         <option value="youtube_精炼提取">youtube_精炼提取 - 提取核心要点和精华</option>
@@ -1004,6 +1072,7 @@ async def read_root():
                         <option value="爆款短视频文案">爆款短视频文案 - 短视频内容文案风格</option>
                         <option value="youtube_视频总结">youtube_视频总结 - 综合性视频总结模板</option>
                     </select>
+                    <small class="input-hint">按住 Ctrl/⌘ 可多选，只转录一次，每个模板各生成一份总结</small>
                 </div>
 
                 <div class="form-group">
@@ -1038,9 +1107,10 @@ async def read_root():
                 <div class="form-group">
                     <label for="batchWhisperModel">Whisper模型大小</label>
                     <select id="batchWhisperModel" name="batchWhisperModel">
+                        <option value="auto" selected>Auto (按音频时长与排队情况自动选择)</option>
                         <option value="tiny">Tiny (最快，准确性最低)</option>
                         <option value="base">Base (快速且准确)</option>
-                        <option value="small" selected>Small (平衡速度和准确性)</option>
+                        <option value="small">Small (平衡速度和准确性)</option>
                         <option value="medium">Medium (较慢但更准确)</option>
                         <option value="large">Large (最准确但最慢)</option>
                     </select>
@@ -1048,8 +1118,8 @@ async def read_root():
 
                 <div class="form-group">
                     <label for="batchPromptTemplate">摘要模板</label>
-                    <select id="batchPromptTemplate" name="batchPromptTemplate">
-                        <option value="default课堂笔记">default课堂笔记 - 通用课堂笔记格式</option>
+                    <select id="batchPromptTemplate" name="batchPromptTemplate" multiple size="4">
+                        <option value="default课堂笔记" selected>default课堂笔记 - 通用课堂笔记格式</option>
                         <option value="youtube_英文笔记">youtube_英文笔记 - 英文视频双语笔记格式</option>
                         <option value="youtube_结构化提取">youtube_结构化提取 - 结构化提取要点</option>
                         <option value="youtube_精炼提取">youtube_精炼提取 - 提取核心要点和精华</option>
@@ -1057,6 +1127,7 @@ async def read_root():
                         <option value="爆款短视频文案">爆款短视频文案 - 短视频内容文案风格</option>
                         <option value="youtube_视频总结">youtube_视频总结 - 综合性视频总结模板</option>
                     </select>
+                    <small class="input-hint">按住 Ctrl/⌘ 可多选，只转录一次，每个模板各生成一份总结</small>
                 </div>
 
                 <div class="form-group">
@@ -1147,6 +1218,10 @@ async def read_root():
                 <div class="results-list" id="resultsList">
                     <!-- 结果将通过JavaScript动态加载 -->
                 </div>
+                <div id="resultsPager" style="display:none; text-align:center; margin-top:15px;">
+                    <span id="resultsCount"></span>
+                    <button id="loadMoreResults" onclick="loadResults(true)" class="btn"><i class="fas fa-angle-double-down"></i> 加载更多</button>
+                </div>
             </div>
             <div id="noResultsMessage" class="empty-state">
                 <i class="fas fa-inbox"></i>
@@ -1197,6 +1272,18 @@ async def read_root():
             }
         }
 
+        // 多选的摘要模板，用逗号连接后提交
+        function selectedTemplates(selectId) {
+            const names = Array.from(document.getElementById(selectId).selectedOptions).map(option => option.value);
+            return names.length ? names.join(',') : 'default课堂笔记';
+        }
+
+        // 下载链接：多个模板时每份总结一个链接
+        function resultLinks(paths, label) {
+            return paths.map(path => '<a href="/download-result/' + encodeURIComponent(path) + '" target="_blank" class="btn"><i class="fas fa-download"></i> '
+                + label + (paths.length > 1 ? ' ' + path.split(/[\\\\/]/).pop() : '') + '</a>').join(' ');
+        }
+
         // 加载可用的提示词模板
         async function loadTemplates() {
             try {
@@ -1242,7 +1329,7 @@ async def read_root():
 
             const videoUrl = document.getElementById('videoUrl').value.trim();
             const model = document.getElementById('whisperModel').value;
-            const promptTemplate = document.getElementById('promptTemplate').value;
+            const promptTemplate = selectedTemplates('promptTemplate');
             const customPrompt = document.getElementById('customPrompt').value.trim();
 
             if (!videoUrl) {
@@ -1296,7 +1383,7 @@ async def read_root():
             const audioFile = document.getElementById('audioFile').files[0];
             const model = document.getElementById('audioWhisperModel').value;
             const language = document.getElementById('audioLanguage').value;
-            const promptTemplate = document.getElementById('audioPromptTemplate').value;
+            const promptTemplate = selectedTemplates('audioPromptTemplate');
             const customPrompt = document.getElementById('audioCustomPrompt').value.trim();
 
             if (!audioFile) {
@@ -1371,7 +1458,7 @@ async def read_root():
 
                     if (status.status === 'completed') {
                         statusMessage.className = 'status-message status-success';
-                        statusMessage.innerHTML = status.message + '<br><a href="/download-result/' + encodeURIComponent(status.result_path) + '" target="_blank" class="btn"><i class="fas fa-download"></i> 点击下载结果</a>';
+                        statusMessage.innerHTML = status.message + '<br>' + resultLinks(status.result_paths || [status.result_path], '点击下载结果');
                     } else if (status.status === 'error') {
                         statusMessage.className = 'status-message status-error';
                     } else {
@@ -1387,7 +1474,7 @@ async def read_root():
         async function startBatchProcess() {
             const uploadDir = document.getElementById('batchUploadDir').value.trim() || 'uploads';
             const model = document.getElementById('batchWhisperModel').value;
-            const promptTemplate = document.getElementById('batchPromptTemplate').value;
+            const promptTemplate = selectedTemplates('batchPromptTemplate');
             const customPrompt = document.getElementById('batchCustomPrompt').value.trim();
 
             if (!uploadDir) {
@@ -1433,19 +1520,27 @@ async def read_root():
             }
         }
 
-        // 加载处理结果
-        async function loadResults() {
+        // 加载处理结果（/api/results 分页返回，append 为 true 时加载下一页追加到列表末尾）
+        let resultsPage = 0;
+        let resultsShown = 0;
+        async function loadResults(append = false) {
             try {
-                const response = await fetch('/api/results');
+                const page = append ? resultsPage + 1 : 1;
+                const response = await fetch(`/api/results?page=${page}`);
                 const data = await response.json();
 
                 const resultsList = document.getElementById('resultsList');
                 const resultsSection = document.getElementById('resultsSection');
                 const noResultsMessage = document.getElementById('noResultsMessage');
 
-                if (data.results && data.results.length > 0) {
+                if (!append) {
                     resultsList.innerHTML = '';
-                    data.results.forEach(result => {
+                    resultsShown = 0;
+                }
+                resultsPage = page;
+
+                if (resultsShown + (data.results || []).length > 0) {
+                    (data.results || []).forEach(result => {
                         const resultItem = document.createElement('div');
                         resultItem.className = 'result-item';
 
@@ -1466,6 +1561,13 @@ async def read_root():
 
                         resultsList.appendChild(resultItem);
                     });
+                    resultsShown += (data.results || []).length;
+
+                    // 按返回的 total 显示已加载数量，还有未加载的结果时显示“加载更多”
+                    const resultsPager = document.getElementById('resultsPager');
+                    document.getElementById('resultsCount').textContent = `已显示 ${resultsShown} / ${data.total} 个结果 `;
+                    document.getElementById('loadMoreResults').style.display = resultsShown < data.total ? 'inline-block' : 'none';
+                    resultsPager.style.display = 'block';
 
                     resultsSection.style.display = 'block';
                     noResultsMessage.style.display = 'none';
@@ -1563,9 +1665,10 @@ async def read_root():
                             </div>
                             <div class="result-actions">
                                 ${task.result_path ?
-                                    `<a href="/download-result/${encodeURIComponent(task.result_path)}" target="_blank">
+                                    (task.result_paths || [task.result_path]).map(path =>
+                                    `<a href="/download-result/${encodeURIComponent(path)}" target="_blank">
                                         <button class="btn"><i class="fas fa-download"></i> 下载结果</button>
-                                    </a>` :
+                                    </a>`).join('') :
                                     '<button class="btn" disabled><i class="fas fa-ban"></i> 无结果</button>'
                                 }
                             </div>
@@ -1721,7 +1824,7 @@ async def read_root():
 @app.post("/process-url")
 async def process_video_url_endpoint(
     url: str = Form(None),
-    model: str = Form(default="small"),
+    model: str = Form(default="auto"),
     prompt_template: str = Form(default="default课堂笔记"),
     prompt: Optional[str] = Form(default=None),
     # 为支持JSON请求添加参数
@@ -1743,66 +1846,102 @@ async def process_video_url_endpoint(
         raise HTTPException(status_code=422, detail="URL是必需的")
     task_id = str(uuid.uuid4())
     
-    # 确定使用哪个提示词
-    prompt_to_use = prompt if prompt else prompt_templates.get(prompt_template, prompt_templates["default课堂笔记"])
-    
-    # 生成输出文件路径
-    auto_filename = generate_filename(url, has_summary=True, is_local=False)
-    output_path = os.path.join("summaries", auto_filename)
-    
-    # 初始化任务状态
-    task_status[task_id] = {"status": "processing", "progress": 0, "message": "初始化..."}
-    
-    # 在后台线程中运行处理任务
-    thread = threading.Thread(
-        target=process_video_url_task,
-        args=(task_id, url, model, prompt_to_use, output_path)
-    )
-    thread.start()
-    
+    # 确定使用哪些提示词（模板可用逗号分隔多选，每个模板各生成一份总结）
+    prompts = select_prompts(prompt_template, prompt)
+
+    # 同一视频、相同处理选项的请求合并到已有任务或直接返回已有结果
+    key = job_key("video_url", resolve_url(url)["key"], model=model, prompt=prompts,
+                  provider=config_manager.get_default_provider())
+    response = coalesce_submission(task_id, key, "video_url")
+    if response:
+        return response
+
+    try:
+        # 生成输出文件路径
+        auto_filename = generate_filename(url, has_summary=True, is_local=False)
+        output_path = os.path.join("summaries", auto_filename)
+
+        # 初始化任务状态
+        task_status[task_id] = {"status": "processing", "progress": 0, "message": "初始化..."}
+
+        metrics.tasks_submitted.inc(type="video_url")
+
+        # 在事件循环上运行处理任务（下载与其他任务并发，阻塞步骤在线程中执行）
+        start_async_task(task_id, process_video_url_task(task_id, url, model, prompts, output_path))
+    except BaseException:
+        # 任务未能启动，释放请求键，否则后续相同请求会一直挂到这个不存在的任务上
+        job_registry.release(key)
+        task_status.pop(task_id, None)
+        raise
+
     return {"task_id": task_id}
 
 
 @app.post("/upload-audio")
 async def upload_audio_endpoint(
     file: UploadFile = File(...),
-    model: str = Form(default="small"),
+    model: str = Form(default="auto"),
     language: Optional[str] = Form(default=None),
     prompt_template: str = Form(default="default课堂笔记"),
     prompt: Optional[str] = Form(default=None)
 ):
     task_id = str(uuid.uuid4())
     
-    # 确定使用哪个提示词
-    prompt_to_use = prompt if prompt else prompt_templates.get(prompt_template, prompt_templates["default课堂笔记"])
+    # 确定使用哪些提示词（模板可用逗号分隔多选，每个模板各生成一份总结）
+    prompts = select_prompts(prompt_template, prompt)
     
-    # 保存上传的文件
+    # 分块保存上传的文件，同时计算内容哈希用于合并重复上传
     file_location = os.path.join("downloads", file.filename)
-    with open(file_location, "wb") as f:
-        content = await file.read()
-        f.write(content)
-    
-    # 生成输出文件路径
-    auto_filename = generate_filename(file_location, has_summary=True, is_local=True)
-    output_path = os.path.join("summaries", auto_filename)
-    
-    # 初始化任务状态
-    task_status[task_id] = {"status": "processing", "progress": 0, "message": "初始化..."}
-    
-    # 在后台线程中运行处理任务
-    thread = threading.Thread(
-        target=process_local_audio_task,
-        args=(task_id, file_location, model, prompt_to_use, output_path, language)
-    )
-    thread.start()
-    
+    partial_location = f"{file_location}.{task_id}.part"
+    digest = hashlib.sha256()
+    with open(partial_location, "wb") as f:
+        while True:
+            chunk = await file.read(1024 * 1024)
+            if not chunk:
+                break
+            digest.update(chunk)
+            f.write(chunk)
+
+    key = job_key("local_audio", digest.hexdigest(), model=model, prompt=prompts, language=language,
+                  provider=config_manager.get_default_provider())
+    response = coalesce_submission(task_id, key, "local_audio")
+    if response:
+        os.remove(partial_location)
+        return response
+
+    try:
+        os.replace(partial_location, file_location)
+
+        # 生成输出文件路径
+        auto_filename = generate_filename(file_location, has_summary=True, is_local=True)
+        output_path = os.path.join("summaries", auto_filename)
+
+        # 初始化任务状态
+        task_status[task_id] = {"status": "processing", "progress": 0, "message": "初始化..."}
+
+        metrics.tasks_submitted.inc(type="local_audio")
+
+        # 在后台线程中运行处理任务
+        thread = threading.Thread(
+            target=process_local_audio_task,
+            args=(task_id, file_location, model, prompts, output_path, language)
+        )
+        thread.start()
+    except BaseException:
+        # 任务未能启动，释放请求键，否则后续相同上传会一直挂到这个不存在的任务上
+        job_registry.release(key)
+        task_status.pop(task_id, None)
+        if os.path.exists(partial_location):
+            os.remove(partial_location)
+        raise
+
     return {"task_id": task_id}
 
 
 @app.post("/batch-process")
 async def batch_process_endpoint(
     upload_dir: str = Form(None),
-    model: str = Form(default="small"),
+    model: str = Form(default="auto"),
     prompt_template: str = Form(default="default课堂笔记"),
     prompt: Optional[str] = Form(default=None),
     # 为支持JSON请求添加参数
@@ -1824,9 +1963,6 @@ async def batch_process_endpoint(
         upload_dir = "uploads"
     task_id = str(uuid.uuid4())
     
-    # 确定使用哪个提示词
-    prompt_to_use = prompt if prompt else prompt_templates.get(prompt_template, prompt_templates["default课堂笔记"])
-    
     # 初始化任务状态
     task_status[task_id] = {"status": "processing", "progress": 0, "message": "初始化批量处理..."}
     
@@ -1848,7 +1984,13 @@ async def batch_process_endpoint(
     }
     task_history.append(task_info)
 
+    metrics.tasks_submitted.inc(type="batch_process")
+
     def run_batch_process():
+        from src.batch_processor import process_batch
+
+        metrics.tasks_in_flight.inc(type="batch_process")
+        batch_start = time.perf_counter()
         try:
             task_status[task_id] = {"status": "processing", "progress": 5, "message": "正在验证上传目录..."}
 
@@ -1860,17 +2002,21 @@ async def batch_process_endpoint(
             task_status[task_id] = {"status": "processing", "progress": 20, "message": "开始批量处理..."}
             print(f"[{task_id}] 开始批量处理目录: {upload_dir}")
 
-            process_batch(
+            batch_results = process_batch(
                 upload_dir=upload_dir,
                 model=model,
-                prompt_to_use=prompt_to_use,
-                prompt_template=prompt_template
+                prompt_to_use=prompt,
+                prompt_template=prompt_template,
+                provider=config_manager.get_default_provider()
             )
             # 更新任务历史记录
             task_info["end_time"] = datetime.now()
             task_info["status"] = "completed"
 
-            task_status[task_id] = {"status": "completed", "progress": 100, "message": "批量处理完成！"}
+            task_status[task_id] = {
+                "status": "completed", "progress": 100, "message": "批量处理完成！",
+                "performance": rollup([r["timing"] for r in batch_results if r.get("timing")])
+            }
             print(f"[{task_id}] 批量处理完成")
         except Exception as e:
             # 更新任务历史记录
@@ -1880,6 +2026,9 @@ async def batch_process_endpoint(
 
             task_status[task_id] = {"status": "error", "progress": 0, "message": f"批量处理失败: {str(e)}", "error": str(e)}
             print(f"[{task_id}] 批量处理失败: {str(e)}")
+        finally:
+            metrics.tasks_in_flight.dec(type="batch_process")
+            record_task_outcome(task_id, "batch_process", time.perf_counter() - batch_start)
     
     # 在后台线程中运行批量处理
     thread = threading.Thread(target=run_batch_process)
@@ -1892,7 +2041,27 @@ async def batch_process_endpoint(
 async def get_task_status(task_id: str):
     if task_id not in task_status:
         raise HTTPException(status_code=404, detail="任务不存在")
-    return task_status[task_id]
+    status = dict(task_status[task_id])
+    trace = task_traces.get(task_id)
+    if trace is not None:
+        status.update(trace.to_dict())
+    return status
+
+
+@app.post("/cancel-task/{task_id}")
+async def cancel_task(task_id: str):
+    """取消事件循环上运行的任务：正在进行的下载会立即中断（结束 yt-dlp/ffmpeg、关闭连接）"""
+    task = running_tasks.get(task_id)
+    if task is None or task.done():
+        raise HTTPException(status_code=409, detail="任务不存在或已结束，无法取消")
+    task.cancel()
+    return {"task_id": task_id, "cancelled": True}
+
+
+@app.get("/metrics")
+async def get_metrics():
+    """Prometheus 指标（任务、阶段耗时、模型缓存、LLM调用、下载字节、队列利用率）"""
+    return Response(content=metrics.render(), media_type=metrics.CONTENT_TYPE)
 
 
 @app.get("/download-result/{file_path:path}")
@@ -1931,9 +2100,10 @@ async def get_prompt_templates():
 async def get_models():
     """获取所有可用的Whisper模型"""
     return {"models": [
+        {"name": "auto", "description": "按音频时长、语言和排队情况自动选择 - 默认值"},
         {"name": "tiny", "description": "最快但准确性最低 (约32x实时速度)"},
         {"name": "base", "description": "快速且准确 (约16x实时速度)"},
-        {"name": "small", "description": "平衡速度和准确性 (约6x实时速度) - 默认值"},
+        {"name": "small", "description": "平衡速度和准确性 (约6x实时速度)"},
         {"name": "medium", "description": "较慢但更准确 (约2x实时速度)"},
         {"name": "large", "description": "最准确但最慢 (接近实时速度)"},
         {"name": "large-v1", "description": "大模型版本1"},
@@ -1942,37 +2112,61 @@ async def get_models():
     ]}
 
 
-@app.get("/api/results")
-async def get_results():
-    """获取所有生成的总结结果"""
-    import glob
-    summary_files = glob.glob("summaries/*.md")
-    results = []
-    for file_path in summary_files:
-        try:
-            # 获取文件修改时间
-            mod_time = os.path.getmtime(file_path)
-            mod_datetime = datetime.fromtimestamp(mod_time)
-            
-            # 转换为本地时区
-            local_tz = pytz.timezone('Asia/Shanghai')  # 使用中国时区
-            local_time = mod_datetime.replace(tzinfo=pytz.utc).astimezone(local_tz)
-            mod_date = local_time.strftime('%Y-%m-%d %H:%M:%S')
+# 结果列表显示使用的时区
+LOCAL_TZ = pytz.timezone('Asia/Shanghai')
 
-            # 获取文件大小
-            size = os.path.getsize(file_path)
 
-            results.append({
-                "filename": os.path.basename(file_path),
-                "path": file_path,
-                "size": size,
-                "modified": mod_date
-            })
-        except Exception:
-            # 如果无法获取文件信息，跳过该文件
-            continue
+def _parse_date(value: Optional[str], end_of_day: bool = False) -> Optional[float]:
+    """解析 YYYY-MM-DD（中国时区）为时间戳，end_of_day 时取次日零点"""
+    if not value:
+        return None
+    try:
+        day = LOCAL_TZ.localize(datetime.strptime(value, "%Y-%m-%d"))
+    except ValueError:
+        raise HTTPException(status_code=422, detail=f"日期格式应为 YYYY-MM-DD: {value}")
+    return day.timestamp() + (86400 if end_of_day else 0)
+
+
+@app.get("/api/results")
+async def get_results(page: int = 1, page_size: int = 50, sort: str = "modified", order: str = "desc",
+                      platform: Optional[str] = None, template: Optional[str] = None,
+                      date_from: Optional[str] = None, date_to: Optional[str] = None):
+    """分页获取生成的总结结果（来自结果目录，支持按平台/模板/日期过滤）"""
+    data = catalog.query(page=page, page_size=page_size, sort=sort, order=order, platform=platform,
+                         template=template, date_from=_parse_date(date_from), date_to=_parse_date(date_to, True))
+    results = [{
+        "filename": row["filename"],
+        "path": row["path"],
+        "size": row["size"],
+        "modified": datetime.fromtimestamp(row["mtime"], LOCAL_TZ).strftime('%Y-%m-%d %H:%M:%S'),
+        "platform": row["platform"],
+        "template": row["template"],
+        "model": row["model"],
+    } for row in data["results"]]
+    return {"results": results, "total": data["total"], "page": data["page"], "page_size": data["page_size"]}
+
+
+@app.get("/api/search")
+async def search_results(q: str, kind: Optional[str] = None, limit: int = 20, offset: int = 0):
+    """
+    全文检索转录与总结，按相关度返回带摘录的命中（转录命中带时间点）。
+    只在最近索引的 rank_limit 条命中内按相关度排序：total 为全部命中数，ranked 为参与排序的命中数，
+    offset 最大为 ranked，total 大于 ranked 时应缩小检索范围（增加检索词或指定 kind）
+    """
+    if kind and kind not in ("transcript", "summary"):
+        raise HTTPException(status_code=422, detail="kind 只能是 transcript 或 summary")
+    start = time.perf_counter()
+    total = search_index.count(q, kind=kind)
+    ranked = min(total, RANK_CANDIDATES)
+    hits = search_index.search(q, kind=kind, limit=limit, offset=min(max(0, offset), ranked))
+    return {"query": q, "hits": hits, "total": total, "ranked": ranked, "rank_limit": RANK_CANDIDATES,
+            "took_ms": round((time.perf_counter() - start) * 1000, 2)}
 
-    return {"results": results}
+
+@app.post("/api/results/rescan")
+async def rescan_results():
+    """与 summaries/ 目录做一致性重扫"""
+    return await asyncio.to_thread(catalog.rescan)
 
 
 @app.get("/api/task-history")
@@ -2021,7 +2215,11 @@ async def get_config():
             "external_apis": {
                 "douyin_api_endpoint": config_manager.config.get("external_apis", {}).get("douyin_api_endpoint", "https://api.douyin.wtf")
             },
-            "default_model": config_manager.get_default_model()
+            "default_model": config_manager.get_default_model(),
+            "default_provider": config_manager.get_default_provider(),
+            "local_llm": {
+                key: value for key, value in config_manager.get_local_llm_config().items() if key != "api_key"
+            }
         }
         return config_data
     except Exception as e:
@@ -2043,18 +2241,20 @@ async def update_config(request: Request):
         # 更新外部API配置
         external_apis = data.get("external_apis", {})
         if "douyin_api_endpoint" in external_apis:
-            # 确保配置字典存在
-            if "external_apis" not in config_manager.config:
-                config_manager.config["external_apis"] = {}
-            config_manager.config["external_apis"]["douyin_api_endpoint"] = external_apis["douyin_api_endpoint"]
+            config_manager.update_section("external_apis", {"douyin_api_endpoint": external_apis["douyin_api_endpoint"]})
         
         # 更新默认模型
         default_model = data.get("default_model")
         if default_model:
             config_manager.set_default_model(default_model)
 
-        # 保存配置
-        config_manager.save_config()
+        # 更新默认提供商与本地OpenAI兼容服务配置（每项修改都在配置锁内完成并原子保存）
+        default_provider = data.get("default_provider")
+        if default_provider:
+            config_manager.set_default_provider(default_provider)
+        local_llm = data.get("local_llm")
+        if isinstance(local_llm, dict):
+            config_manager.update_section("local_llm", local_llm)
 
         return {"message": "配置更新成功"}
     except Exception as e:
@@ -2062,4 +2262,5 @@ async def update_config(request: Request):
 
 
 if __name__ == "__main__":
+    init_umask()
     uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file